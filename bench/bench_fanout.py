@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compares the cost of handing one on_message event to many listeners when every listener gets a
+deep copy of the message (the old behaviour) to sharing one frozen message between them.
+
+Handlers are run inline so only the fan-out itself is measured.
+
+Usage: python3 bench/bench_fanout.py [listeners ...]
+"""
+
+import sys
+import time
+import timeit
+
+sys.path.append(".")
+sys.path.append("..")
+
+from concurrent.futures import Future
+
+from libs.eventhost import EventHost
+from libs.jantemessage import JanteMessage
+
+class InlineExecutor:
+    def submit(self, key, fn, kwargs=None, block=True, timeout=None):
+        f = Future()
+        f.set_result(fn(**kwargs))
+        return f
+
+class DeepCopyEventHost(EventHost):
+    """
+    Copies every keyword for every listener, like fire_event used to.
+    """
+    def _share_keywords(self, kwargs):
+        return dict(kwargs), list(kwargs.keys())
+
+def build(host_class, listeners):
+    host = host_class(executor=InlineExecutor())
+
+    def on_message(message): pass
+    host.create_event("on_message", on_message)
+
+    for i in range(listeners):
+        # Each listener needs a target of its own
+        def listener(message): pass
+        host.add_event_listener("on_message", listener)
+    return host
+
+def message():
+    m = JanteMessage("!dict some key that someone is looking for", sender="someone@example.com",
+                     recipient="Jante", address="#channel@conference.example.com")
+    m.set_alias("@someone@example.com")
+    return m
+
+def measure(host_class, listeners, rounds):
+    host = build(host_class, listeners)
+    timer = timeit.Timer(lambda: host.fire_event("on_message", _eventLogEnabled=False, message=message()))
+    # Best of five to keep the noise of the machine out
+    return min(timer.repeat(repeat=5, number=rounds)) / rounds
+
+def main(argv):
+    counts = [int(a) for a in argv] or [1, 10, 50, 100]
+    rounds = 200
+
+    print("{:>10} {:>16} {:>16} {:>8}".format("listeners", "deepcopy (us)", "shared (us)", "speedup"))
+    for n in counts:
+        old = measure(DeepCopyEventHost, n, rounds)
+        new = measure(EventHost, n, rounds)
+        print("{:>10} {:>16.1f} {:>16.1f} {:>7.1f}x".format(n, old * 1e6, new * 1e6, old / new))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
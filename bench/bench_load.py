@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Boots a Bot with the TestingIO and sends it a mix of messages at a target rate, as if they were read
+from the IO. Reports the throughput, the latency from reading a message to on_message_sent for its
+response, the number of threads and the memory used.
+
+Messages are sent open loop: the i:th message is sent at start + i / rate whether or not the bot
+has kept up, so a bot that falls behind shows it in the latencies. The mix is drawn from a seeded
+random generator and the first seconds are not measured, so runs of different commits can be compared.
+With --repeat the median of the runs is reported as well.
+
+Usage: python3 bench/bench_load.py [--rate 200] [--duration 10] [--mix echo=2,chatter=4] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import statistics
+import configparser
+import concurrent.futures
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(ROOT)
+
+from libs.jantemessage import JanteMessage
+import bot
+
+# Number of keys added to the dict before the run, for !dict hits
+DICT_KEYS = 100
+
+MIXES = {
+    'dict_hit': lambda r: "!dict benchkey{}".format(r.randrange(DICT_KEYS)),
+    'dict_miss': lambda r: "!dict missingkey{}".format(r.randrange(1000000)),
+    'roll': lambda r: "!roll {}".format(r.randint(2, 100)),
+    'echo': lambda r: "!echo message number {}".format(r.randrange(1000000)),
+    'unknown': lambda r: "!nosuchcommand{} with arguments".format(r.randrange(100)),
+    'chatter': lambda r: "just talking about number {} with nobody in particular".format(r.randrange(1000000)),
+}
+
+DEFAULT_MIX = "dict_hit=3,dict_miss=1,roll=1,echo=2,unknown=1,chatter=4"
+
+def parse_mix(text):
+    mix = dict()
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if not name in MIXES:
+            raise argparse.ArgumentTypeError('Unknown message kind "{}", one of {}.'.format(name, ", ".join(MIXES)))
+        mix[name] = float(weight)
+    return mix
+
+def rss_kb():
+    """
+    Returns the resident set size of the process in kB.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def percentile(values, p):
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+class Run:
+    def __init__(self, settings, keep_rate_limits=False, data=None):
+        """
+        data - Folder whose files are copied to the data folder of the bot before it starts.
+        """
+        self._datapath = tempfile.mkdtemp(prefix="jante-bench-")
+        if data != None:
+            shutil.copytree(data, self._datapath, dirs_exist_ok=True)
+
+        config = configparser.ConfigParser()
+        config.read(settings)
+        config.set('global', 'datapath', self._datapath + "/")
+        config.set('logging', 'level', 'error')
+        if not keep_rate_limits:
+            config.set('sender', 'address_rate', '0')
+            config.set('sender', 'protocol_rate', '0')
+
+        self._bot = bot.Bot(None, config, testing=True)
+        threading.Thread(target=self._bot.start, daemon=True).start()
+
+        self._mutex = threading.Lock()
+        self._measuring = False
+        self._latencies = []
+        self._sent = 0
+        self._threads = []
+        self._inflight = []
+
+        self._bot.add_event_listener('on_message_sent', self._message_sent)
+
+        # Keys for the !dict hits, added before anything is measured
+        for i in range(DICT_KEYS):
+            m = JanteMessage("!dict benchkey{} := value {}".format(i, i), sender="bencher", address=("bench", "setup"))
+            concurrent.futures.wait(self._bot.fire_event('on_message', message=m))
+
+    def _message_sent(self, message):
+        received = message.get_received()
+        if received == None:
+            return
+        latency = time.monotonic() - received
+        with self._mutex:
+            if self._measuring:
+                self._latencies.append(latency)
+
+    def _sample(self, stop):
+        while not stop.wait(0.1):
+            with self._mutex:
+                self._threads.append(threading.active_count())
+                self._inflight.append(self._bot.number_of_threads())
+
+    def _wait_until_idle(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._bot._admission.qsize() == 0 and self._bot._sender.qsize() == 0 and self._bot.number_of_threads() == 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def run(self, mix, rate, duration, warmup, seed):
+        r = random.Random(seed)
+        kinds = list(mix.keys())
+        weights = [mix[k] for k in kinds]
+
+        def messages():
+            for i in range(int(rate * (warmup + duration))):
+                kind = r.choices(kinds, weights)[0]
+                sender = "bencher{}".format(r.randrange(50))
+                yield i / rate, JanteMessage(MIXES[kind](r), sender=sender, address="#bench")
+
+        return self.drive(messages(), int(rate * warmup))
+
+    def drive(self, messages, warmup_count=0):
+        """
+        Hands the bot each message of (offset in seconds, JanteMessage) at its offset from now, or
+        right away if the offset is None. The first <warmup_count> messages are not measured.
+        Returns the results once the bot has handled everything.
+        """
+        stop = threading.Event()
+        threading.Thread(target=self._sample, args=(stop,), daemon=True).start()
+
+        start = time.monotonic()
+        measure_start = start
+
+        for i, (offset, message) in enumerate(messages):
+            if i == warmup_count:
+                with self._mutex:
+                    self._measuring = True
+                    self._threads = []
+                    self._inflight = []
+                measure_start = time.monotonic()
+
+            if offset != None:
+                delay = start + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self._bot._handle_inbound(message)
+            if i >= warmup_count:
+                self._sent += 1
+
+        drained = self._wait_until_idle(30.0)
+        elapsed = time.monotonic() - measure_start
+        stop.set()
+
+        with self._mutex:
+            self._measuring = False
+            latencies = list(self._latencies)
+            threads = list(self._threads)
+            inflight = list(self._inflight)
+
+        return {
+            'sent': self._sent,
+            'replies': len(latencies),
+            'seconds': elapsed,
+            'throughput': self._sent / elapsed,
+            'reply_throughput': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000 if len(latencies) > 0 else None,
+            'p99_ms': percentile(latencies, 99) * 1000 if len(latencies) > 0 else None,
+            'max_threads': max(threads, default=threading.active_count()),
+            'max_inflight': max(inflight, default=0),
+            'rss_kb': rss_kb(),
+            'shed': self._bot._admission.get_shed_counts(),
+            'drained': drained,
+        }
+
+    def shutdown(self):
+        self._bot._shutdown()
+        shutil.rmtree(self._datapath, ignore_errors=True)
+
+def format_result(result):
+    def ms(value):
+        return "-" if value == None else "{:.2f}".format(value)
+    return ("{sent:>7} sent {replies:>7} replies {throughput:>8.1f} msg/s {reply_throughput:>8.1f} replies/s "
+            "p50 {p50} ms p99 {p99} ms threads {max_threads:>3} in flight {max_inflight:>3} rss {rss_kb} kB{dropped}").format(
+                p50=ms(result['p50_ms']), p99=ms(result['p99_ms']),
+                dropped=" shed {}".format(result['shed']) if len(result['shed']) > 0 else "",
+                **result)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Load benchmark of the bot.", prog="bench_load")
+    parser.add_argument("--rate", type=float, default=200.0, help="Messages sent per second.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds that are measured.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds sent before measuring.")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help="Weights of the kinds of messages, default {}. Kinds: {}.".format(DEFAULT_MIX, ", ".join(MIXES)))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs, each with a newly booted bot.")
+    parser.add_argument("--settings", default=os.path.join(ROOT, "test", "util", "test-settings.ini"))
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep the rate limits of the sender.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    # The plugins read their settings relative to the root of the repository
+    os.chdir(ROOT)
+
+    results = []
+    for i in range(args.repeat):
+        run = Run(args.settings, args.keep_rate_limits)
+        try:
+            results.append(run.run(args.mix, args.rate, args.duration, args.warmup, args.seed))
+        finally:
+            run.shutdown()
+        if not args.json:
+            print("run {}: {}".format(i + 1, format_result(results[-1])))
+
+    median = {key: statistics.median(r[key] for r in results)
+              for key in ('throughput', 'reply_throughput', 'max_threads', 'max_inflight', 'rss_kb')}
+    for key in ('p50_ms', 'p99_ms'):
+        values = [r[key] for r in results if r[key] != None]
+        median[key] = statistics.median(values) if len(values) > 0 else None
+
+    if args.json:
+        print(json.dumps({'runs': results, 'median': median}, indent=2))
+    elif args.repeat > 1:
+        print("median: {:.1f} msg/s {:.1f} replies/s p50 {:.2f} ms p99 {:.2f} ms".format(
+            median['throughput'], median['reply_throughput'], median['p50_ms'] or 0, median['p99_ms'] or 0))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
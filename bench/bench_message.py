@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measures the time it takes to create, respond to and clone a JanteMessage, and the memory
+used per message.
+
+Usage: python3 bench/bench_message.py
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+sys.path.append(".")
+sys.path.append("..")
+
+from libs.jantemessage import JanteMessage
+
+def make():
+    return JanteMessage("!dict some key", sender="someone@example.com", recipient="Jante",
+                        address="#channel@conference.example.com")
+
+def main():
+    m = make()
+    rounds = 100000
+
+    for name, fn in [("construct", make), ("respond", lambda: m.respond("reply", "Jante")), ("clone", m.clone)]:
+        t = min(timeit.repeat(fn, number=rounds, repeat=5)) / rounds
+        print("{:>10}: {:.3f} us".format(name, t * 1e6))
+
+    count = 10000
+    tracemalloc.start()
+    messages = [make() for _ in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:>10}: {:.1f} bytes per message".format("memory", current / count))
+
+if __name__ == "__main__":
+    main()
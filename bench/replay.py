@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replays recorded traffic (see [recording] in the settings and libs/traffic.py) through a Bot with
+the TestingIO and reports the same numbers as bench_load.py.
+
+The messages are sent at the pace they were recorded (--speed 1), faster or slower (--speed 10),
+or as fast as possible (--speed 0). Give the data folder of the bot that recorded the traffic with
+--data to replay against the same dict entries.
+
+Usage: python3 bench/replay.py traffic.log.gz [--speed 0] [--data data/] [--json]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_load import ROOT, Run, format_result
+from libs.traffic import read_traffic
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replays recorded traffic through the bot.", prog="replay")
+    parser.add_argument("log", help="Recorded traffic.")
+    parser.add_argument("--speed", type=float, default=1.0, help="How many times faster than recorded, 0 for as fast as possible.")
+    parser.add_argument("--warmup", type=int, default=0, help="Messages that are not measured.")
+    parser.add_argument("--limit", type=int, default=None, help="Most messages replayed.")
+    parser.add_argument("--data", default=None, help="Folder copied to the data folder of the bot.")
+    parser.add_argument("--settings", default=os.path.join(ROOT, "test", "util", "test-settings.ini"))
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep the rate limits of the sender.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    log = os.path.abspath(args.log)
+    data = os.path.abspath(args.data) if args.data != None else None
+    # The plugins read their settings relative to the root of the repository
+    os.chdir(ROOT)
+
+    def messages():
+        for i, (offset, message) in enumerate(read_traffic(log)):
+            if args.limit != None and i >= args.limit:
+                return
+            yield (offset / args.speed if args.speed > 0 else None), message
+
+    run = Run(args.settings, args.keep_rate_limits, data=data)
+    try:
+        result = run.drive(messages(), args.warmup)
+    finally:
+        run.shutdown()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(format_result(result))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -19,19 +19,47 @@ import traceback
 import threading
 
 import inspect
+import functools
+import concurrent.futures
+import math
+import importlib
+import os
 #import os
 # Parses settings.ini
 import configparser
 
 import queue
+import json
+import urllib.parse
+
 
 # All user made plugins
 import plugins
+import plugins.plugintemplate
+import plugins.parsingplugintemplate
 
 # Helpful jantespecific libraries
 from libs.jantehttpd import JanteHTTPD
 from libs.jantemessage import JanteMessage
 from libs.eventhost import EventHost
+from libs.workerpool import WorkerPool
+from libs.jantesender import JanteSender
+from libs.coalescing import Coalescer
+from libs import outboundqueue
+from libs.outboundqueue import OutboundQueue
+from libs.asynccore import AsyncCore
+from libs.scheduler import Scheduler
+from libs.clock import Clock
+from libs.inflight import InFlight, run_in_thread
+from libs.pluginmanifest import read_manifest
+from libs.admission import AdmissionQueue
+from libs.processpool import ProcessPool, AliasResolver
+from libs import jantelog
+from libs.metrics import Metrics, format_snapshot
+from libs.tracing import Tracer
+from libs.profiler import Profiler
+from libs.traffic import TrafficRecorder
+from libs.lrucache import LRUCache
 from libs.jantetable import get_table 
 from libs.janteio.iomanager import IOManager
 from libs.servicemanager.servicemanager import ServiceManager
@@ -43,28 +71,84 @@ class Bot:
         Used by plugins to offer services like dictionaries. Name is the name of the service and
         "service" is a object of type libs/servicemanager/service
         """
+        self._record_registration(lambda: self._service_manager.withdraw_service(name))
         return self._service_manager.offer_service(name, service)
     def get_service(self, name):
         """
         Returns a service object if it exists.
         """
+        manifest = self._lazy_services.get(name)
+        if manifest != None:
+            self._load_lazy_plugin(manifest)
         return self._service_manager.get_service(name)
 
     # setup connection as defined per settings
-    def __init__(self, iotype, settingsfile, testing=False):
+    def __init__(self, iotype, settingsfile, testing=False, clock=None):
+        """
+        clock - libs.clock.Clock used by the scheduled jobs, the rate limits and the plugins, the real time by default.
+        """
+        self._clock = clock if clock != None else Clock()
         self._shutdown_called = False
         self._muted = False
         self._mutex = threading.Lock()
-        self._threads = []
-        self._threadlimit = 20
-        self._message_queue = queue.Queue()
+        # Counters and latencies, see get_metrics()
+        self._metrics = Metrics()
+        # Event handlers and scheduled jobs that are running
+        self._inflight = InFlight(metrics=self._metrics)
+        # Threads that run as long as the bot does (sender, scheduler)
+        self._service_threads = []
         self._commands = dict()
         self._config = settingsfile 
+        # Messages waiting to be sent, in lanes by kind of message
+        self._message_queue = OutboundQueue(weights=outboundqueue.parse_weights(self._config.get('sender', 'lane_weights', fallback='')),
+                                            metrics=self._metrics, clock=self._clock)
+        # Recent traces of inbound messages, see get_tracer()
+        self._tracer = Tracer(size=self._config.getint('tracing', 'size', fallback=128))
+        # Profiles the handlers of a plugin on demand, see !profile
+        self._profiler = Profiler()
+        # Records the messages read from the IO for bench/replay.py, if configured
+        recording = self._config.get('recording', 'file', fallback='').strip()
+        self._recorder = TrafficRecorder(recording) if recording != '' else None
+        # Resolved aliases by sender, the alias plugin invalidates them when they change
+        self._alias_cache = LRUCache(size=self._config.getint('global', 'alias_cache_size', fallback=1024))
+        # Kept unresolved by messages handed to worker processes, see libs/processpool.py
+        self._alias_resolver = AliasResolver(self.resolve_alias)
+
+        # What each plugin has registered (listeners, commands, services, web routes and scheduled jobs),
+        # as functions that undo the registrations. Used to unload a plugin when it is reloaded.
+        # _registering.plugin is the name of the plugin that is being constructed by the current thread.
+        self._registrations = dict()
+        self._registering = threading.local()
+        self._reload_mutex = threading.Lock()
         
 
-        plugins.import_all(self._config)
+        # Plugins that are declared by a manifest but not yet imported, see _load_lazy_plugin.
+        # The indexes map commands, services and web routes to a manifest and events to a list of manifests.
+        # They are changed under _lazy_mutex by replacing them, so they can be read without it.
+        self._lazy_mutex = threading.RLock()
+        self._lazy_plugins = dict()
+        self._lazy_commands = dict()
+        self._lazy_events = dict()
+        self._lazy_services = dict()
+        self._lazy_routes = dict()
+
+        if self._config.getboolean('plugins', 'lazy', fallback=False):
+            for manifest in self._read_manifests():
+                self._add_lazy_plugin(manifest)
+
+        plugins.import_all(self._config, skip=self._lazy_plugins.keys())
 
         self._io = IOManager(iotype, self)
+
+        self._sender = JanteSender(self, self._io, self._message_queue,
+                                   address_rate=self._config.getfloat('sender', 'address_rate', fallback=2.0),
+                                   address_burst=self._config.getint('sender', 'address_burst', fallback=5),
+                                   protocol_rate=self._config.getfloat('sender', 'protocol_rate', fallback=20.0),
+                                   protocol_burst=self._config.getint('sender', 'protocol_burst', fallback=20),
+                                   metrics=self._metrics, tracer=self._tracer, clock=self._clock,
+                                   coalescer=Coalescer(self._config.getfloat('sender', 'coalesce_window', fallback=0.0),
+                                                       max_length=self._config.getint('sender', 'coalesce_max_length', fallback=400),
+                                                       paste=self.paste, on_error=self.error))
         
         self._httpd = None
         self._httpd_routes = dict()
@@ -76,10 +160,63 @@ class Bot:
             def __init__(self, io):
                 self.io = io
 
-            def write(self, message):
-                self.io.log(message)
+            def write(self, message, *args):
+                self.io.log(message, *args)
+
+        # The core is either threads only, or an asyncio event loop running the IO, the sender,
+        # the dispatch of received messages, the timer and coroutine event handlers
+        self._core_mode = self._config.get('global', 'core', fallback='threads')
+
+        # Event handlers either get a thread each or run in a fixed pool of workers.
+        # The asyncio core always runs synchronous handlers in the pool.
+        self._dispatch_mode = self._config.get('events', 'dispatch', fallback='threads')
+        if self._core_mode == 'asyncio':
+            self._dispatch_mode = 'pool'
+        if self._dispatch_mode == 'pool':
+            executor = WorkerPool(workers=self._config.getint('events', 'workers', fallback=8),
+                                  queue_size=self._config.getint('events', 'queue_size', fallback=256),
+                                  max_per_key=self._config.getint('events', 'max_per_event', fallback=0),
+                                  name="EventWorkerPool")
+            submit_timeout = self._config.getfloat('events', 'submit_timeout', fallback=None)
+        else:
+            executor = None
+            submit_timeout = None
+
+        self._executor = executor
+        self._events = EventHost(IOLoggerAdapter(self._io), executor=executor, submit_timeout=submit_timeout,
+                                 validate=self._config.getboolean('events', 'validate', fallback=__debug__),
+                                 inflight=self._inflight, profiler=self._profiler)
+
+        # Jobs that plugins want to run at given times. Due jobs are run like event handlers.
+        self._scheduler = Scheduler(executor=self._run_scheduled_job, logger=IOLoggerAdapter(self._io), clock=self._clock)
+        # The job firing on_timer_tick, only scheduled while someone listens to it, see _update_timer_tick
+        self._timer_tick = None
+        self._timer_tick_mutex = threading.Lock()
+
+        # Received messages wait here until they are handled. Under overload chatter is shed, see _dispatch_message
+        self._admission = AdmissionQueue(size=self._config.getint('admission', 'queue_size', fallback=256),
+                                         max_per_sender=self._config.getint('admission', 'max_per_sender', fallback=16),
+                                         max_per_channel=self._config.getint('admission', 'max_per_channel', fallback=64))
+        self._overload_handlers = self._config.getint('admission', 'overload_handlers', fallback=128)
+        # With dispatch = threads nothing else bounds the handler threads, see _wait_for_handler_slot
+        self._max_handlers = self._config.getint('admission', 'max_handlers', fallback=256)
+        self._overloaded = False
+
+        if self._core_mode == 'asyncio':
+            self._core = AsyncCore(self._io, self._sender, self._events, self._handle_inbound,
+                                   dispatch_next=lambda: self._dispatch_next(0), scheduler=self._scheduler)
+        else:
+            self._core = None
+
+        self._metrics.set_gauge('message_queue', self._sender.qsize)
+        for lane in outboundqueue.LANES:
+            self._metrics.set_gauge('outbound_queue.' + lane, functools.partial(self._message_queue.depth, lane))
+        self._metrics.set_gauge('admission_queue', self._admission.qsize)
+        self._metrics.set_gauge('inflight', lambda: len(self._inflight))
+        self._metrics.set_gauge('shed', self._admission.get_shed_counts)
 
-        self._events = EventHost(IOLoggerAdapter(self._io))
+        # Worker processes for handlers that are heavy on the CPU, see add_event_listener
+        self._processes = ProcessPool(self, workers=self._config.getint('processes', 'workers', fallback=2))
         # function call prototype (keyword spec) for stock events
         def on_message(message): pass
         def on_message_sent(message): pass
@@ -87,7 +224,10 @@ class Bot:
         def should_save(): pass
         def on_timer_tick(timeval): pass
 
-        self._events.create_event("on_message", on_message)
+        # Commands are looked up once per message instead of once per command listener
+        self._command_regex = re.compile(r'{prefix}(\S+)'.format(prefix=re.escape(self.get_command_prefix())))
+
+        self._events.create_event("on_message", on_message, router=self._command_route)
         self._events.create_event("on_message_sent", on_message_sent)
         self._events.create_event("on_plugins_loaded", on_plugins_loaded)
         self._events.create_event("should_save", should_save)
@@ -96,8 +236,9 @@ class Bot:
         def show_commands(message):
             self.add_message(message.respond("{}.".format(', '.join(list(sorted(self._commands)))), self.get_nick()))
         def reload_IO(message):
-            self.add_message(jantemessage("Started reloading, this might take a while.", address=message.get_address(), sender=self.get_nick(), is_in_group=message.isInGroup()))
-            self.add_message(jantemessage(self._reload(), address = message.get_address(), isInGroup = message.isInGroup(), recipient=message.get_sender(), sender=self.get_nick()))
+            names = message.get_text().split()
+            self.add_message(message.respond("Started reloading, this might take a while.", self.get_nick()))
+            self.add_message(message.respond(self._reload(names if len(names) > 0 else None), self.get_nick()))
         # Client requests a list of plugins
         def plugins_IO(message):
             with self._mutex:
@@ -110,36 +251,187 @@ class Bot:
             """
             self.add_message(message.respond("Telling all plugins to save...", self.get_nick()))
             self.fire_event("should_save")
+        def stats_command(message):
+            """
+            !stats shows the latencies of the commands and the gauges, !stats <prefix> everything starting with <prefix>
+            (e.g "listener.", "event." or "errors.").
+            """
+            prefix = message.get_text().strip()
+            if prefix != "":
+                snapshot = self._metrics.snapshot(prefix)
+            else:
+                snapshot = self._metrics.snapshot()
+                snapshot['latencies'] = {k: v for k, v in snapshot['latencies'].items()
+                                         if k.startswith('command.') or k == 'receive_to_send'}
+                snapshot['counters'] = dict()
+            self.add_message(message.respond(format_snapshot(snapshot), self.get_nick()))
+        def trace_command(message):
+            """
+            !trace shows the slowest recent traces, !trace <id> one trace.
+            """
+            text = message.get_text().strip()
+            if text.isdigit():
+                trace = self._tracer.get(int(text))
+                ans = str(trace) if trace != None else "Trace {} is not kept.".format(text)
+            else:
+                traces = self._tracer.slowest(3)
+                ans = "\n".join(map(str, traces)) if len(traces) > 0 else "No traces."
+            self.add_message(message.respond(ans, self.get_nick()))
+        def trace_route(req):
+            req.send_http_response_code(200)
+            req.send_http_header('Content-type', 'application/json')
+            req.send_http_output(json.dumps([t.to_dict() for t in self._tracer.slowest(20)]))
+        def profile_command(message):
+            """
+            !profile <plugin> [<n> [seconds|messages]] profiles the handlers of a plugin for n seconds (30 by default)
+            or n messages and responds with a report, pasted if it is long. Only for the admins.
+            """
+            if not self.is_admin(message):
+                self.add_message(message.respond("Only admins may profile.", self.get_nick()))
+                return
+
+            parts = message.get_text().split()
+            try:
+                name = parts[0]
+                n = Bot._profile_amount(parts[1]) if len(parts) > 1 else 30.0
+                unit = parts[2] if len(parts) > 2 else "seconds"
+                assert unit in ("seconds", "messages")
+            except (IndexError, ValueError, AssertionError):
+                self.add_message(message.respond("Usage: profile <plugin> [<n> [seconds|messages]]", self.get_nick()))
+                return
+
+            def done(report):
+                self.add_message(message.respond(self.get_service("paste").paste(report), self.get_nick()))
+
+            try:
+                self._start_profiling(name, n, unit, done)
+            except RuntimeError as e:
+                self.add_message(message.respond(str(e), self.get_nick()))
+                return
+            self.add_message(message.respond('Profiling "{}" for {:g} {}.'.format(name, n, unit), self.get_nick()))
+        def profile_route(req):
+            """
+            /profile?plugin=<plugin>&seconds=<n> or &messages=<n>, responds with the report when done.
+            """
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(req.path).query)
+            unit = "messages" if "messages" in query else "seconds"
+            try:
+                name = query["plugin"][0]
+                n = Bot._profile_amount(query.get(unit, ["30"])[0])
+            except (KeyError, ValueError):
+                req.send_http_response_code(400)
+                req.send_http_header('Content-type', 'text/plain')
+                req.send_http_output('Usage: /profile?plugin=<plugin>&seconds=<n> or &messages=<n>')
+                return
+
+            reports = queue.Queue()
+            try:
+                self._start_profiling(name, n, unit, reports.put)
+                # Profiling stops after MAX_PROFILE_SECONDS at the latest. Requests are served in threads
+                # of their own (see libs/jantehttpd.py), so the other routes do not wait for this one.
+                report = reports.get(timeout=Bot.MAX_PROFILE_SECONDS + 10)
+            except RuntimeError as e:
+                report = str(e)
+            except queue.Empty:
+                req.send_http_response_code(504)
+                req.send_http_header('Content-type', 'text/plain')
+                req.send_http_output('The profile did not finish in time.')
+                return
+            req.send_http_response_code(200)
+            req.send_http_header('Content-type', 'text/plain')
+            req.send_http_output(report)
+        def stats_route(req):
+            req.send_http_response_code(200)
+            req.send_http_header('Content-type', 'application/json')
+            req.send_http_output(json.dumps(self._metrics.snapshot()))
 
         self.add_command_listener('commands', show_commands)
-        self.add_command_listener('reload', reload_IO)
+        self.add_command_listener('reload', reload_IO, strip_preamble=True)
         self.add_command_listener('plugins', plugins_IO)
         self.add_command_listener('save', save_command)
+        self.add_command_listener('stats', stats_command, strip_preamble=True)
+        self.register_web_route('/stats', stats_route)
+        self.add_command_listener('trace', trace_command, strip_preamble=True)
+        self.register_web_route('/trace', trace_route)
+        self.add_command_listener('profile', profile_command, strip_preamble=True)
+        self.register_web_route('/profile', profile_route)
 
 
         self._loadplugins()
 
 
 
-        def timerThread():
-            while not self._shutdown_called:
-                time.sleep(1.0)
-                t = time.time()
-                self.fire_event('on_timer_tick', _eventLogEnabled=False, timeval=t)
+        # Lazy plugins that listen to on_timer_tick are loaded by the first tick
+        self._update_timer_tick()
 
-        t = threading.Thread(target=timerThread, name="TimerThreadMain - Sends on_timer_tick events")
-        t.start()
-        
-        with self._mutex:
-            self._threads.append(t)
+        # Tells how much has been shed, once a minute if anything new has
+        reported = dict()
+        def report_shed():
+            counts = self._admission.get_shed_counts()
+            if counts != reported:
+                self.log("Shed because of overload so far: {}.".format(counts))
+                reported.update(counts)
+
+        self._scheduler.every(60.0, report_shed, name="report_shed", inline=True)
+
+        if self._recorder != None:
+            self._scheduler.every(60.0, self._recorder.flush, name="flush_recording", inline=True)
+
+        # The asyncio core runs the scheduler on its loop
+        if self._core == None:
+            t = self._scheduler.start(name="SchedulerMain - Runs scheduled jobs and sends on_timer_tick events")
+            self._service_threads.append(t)
+
+    def _run_scheduled_job(self, job):
+        def run():
+            try:
+                job.run()
+            except:
+                self.error('Scheduled job "{}" failed:\n{}'.format(job.get_name(), traceback.format_exc()))
+
+        if self._executor != None:
+            work = self._executor.submit('scheduler', run)
+        else:
+            work = run_in_thread(run, {}, "Scheduled job - {}".format(job.get_name()))
+
+        self._inflight.add(work, 'scheduler', name=job.get_name())
+
+    def schedule_once(self, delay, callback, name=None):
+        """
+        Runs callback() once after <delay> seconds. Returns a job that can be cancelled with job.cancel().
+        """
+        job = self._scheduler.call_later(delay, callback, name=name)
+        self._record_registration(job.cancel)
+        return job
+
+    def schedule_interval(self, interval, callback, first_delay=None, name=None):
+        """
+        Runs callback() every <interval> seconds, the first time after <first_delay> seconds
+        (defaults to <interval>). Returns a job that can be cancelled with job.cancel().
+        """
+        job = self._scheduler.every(interval, callback, first_delay=first_delay, name=name)
+        self._record_registration(job.cancel)
+        return job
+
+    def schedule_cron(self, spec, callback, name=None):
+        """
+        Runs callback() at the times matching the cron-like specification
+        "minute hour day-of-month month day-of-week", e.g "0 12 * * 1-5" for noon on weekdays.
+        Returns a job that can be cancelled with job.cancel().
+        """
+        job = self._scheduler.cron(spec, callback, name=name)
+        self._record_registration(job.cancel)
+        return job
 
     def register_command(self, owner, command, description="No description"):
         with self._mutex:
-            if not command in self._commands:
-                self._commands[command] = {'owner':owner, 'description':description}
-                return True
-            else:
+            # The placeholder of a lazy plugin is replaced by the plugin's own registration
+            if command in self._commands and not self._commands[command].get('lazy', False):
                 return False
+            self._commands[command] = {'owner':owner, 'description':description}
+
+        self._record_registration(lambda: self.unregister_command(owner, command))
+        return True
 
     def unregister_command(self, owner, command):
         with self._mutex:
@@ -158,6 +450,9 @@ class Bot:
             except KeyError:
                 return dict()
 
+    def is_muted(self):
+        return self._muted
+
     def get_nick(self):
         return self._config['global']['nick']
 
@@ -181,31 +476,207 @@ class Bot:
     def destroy_event(self, event_name):
         self._events.destroy_event(event_name)
 
-    def add_event_listener(self, event_name, target, prefilter=None, preprocessor=None):
-        self._events.add_event_listener(event_name, target, prefilter, preprocessor)
+    def add_event_listener(self, event_name, target, prefilter=None, preprocessor=None, route=None, process=False):
+        """
+        If process is True target is run in a worker process, see libs/processpool.py.
+        The prefilter and preprocessor are still run in the bot process.
+        """
+        if process:
+            target = self._processes.wrap(target)
+
+        plugin = self._owner_of(target)
+        self._events.add_event_listener(event_name, target, prefilter, preprocessor, route, owner=plugin)
+        self._record_registration(lambda: self.remove_event_listener(event_name, target, prefilter, preprocessor, route), plugin)
+        if event_name == 'on_timer_tick':
+            self._update_timer_tick()
 
-    def remove_event_listener(self, event_name, target, prefilter=None, preprocessor=None):
-        self._events.remove_event_listener(event_name, target, prefilter, preprocessor)
+    def remove_event_listener(self, event_name, target, prefilter=None, preprocessor=None, route=None):
+        self._events.remove_event_listener(event_name, target, prefilter, preprocessor, route)
+        if event_name == 'on_timer_tick':
+            self._update_timer_tick()
+
+    def _update_timer_tick(self):
+        """
+        on_timer_tick is kept for plugins that poll, it is only fired every second while someone listens to it.
+        Plugins should rather schedule jobs of their own, see schedule_once, schedule_interval and schedule_cron.
+        """
+        def timer_tick():
+            self.fire_event('on_timer_tick', _eventLogEnabled=False, timeval=self._clock.time())
+
+        with self._timer_tick_mutex:
+            listened = self._events.has_listeners('on_timer_tick') or 'on_timer_tick' in self._lazy_events
+            if listened and self._timer_tick == None:
+                self._timer_tick = self._scheduler.every(1.0, timer_tick, name="on_timer_tick", inline=True)
+            elif not listened and self._timer_tick != None:
+                self._timer_tick.cancel()
+                self._timer_tick = None
 
     def fire_event(self, event_name, **kwargs):
-        self._threads += self._events.fire_event(event_name, **kwargs)
+        """
+        Fires an event and returns the futures of its handlers.
+        """
+        # The indexes are replaced when they change, each one read is a consistent snapshot
+        lazy_events, lazy_commands = self._lazy_events, self._lazy_commands
+        if event_name in lazy_events or (event_name == 'on_message' and len(lazy_commands) > 0):
+            self._load_plugins_for(event_name, kwargs)
+
+        # Every event is only logged at the debug level
+        kwargs.setdefault('_eventLogEnabled', self._io.is_logging(jantelog.DEBUG))
+        self._metrics.increment('fired.{}'.format(event_name))
+
+        message = kwargs.get('message')
+        trace = message.get_trace() if isinstance(message, JanteMessage) else None
+        if trace != None:
+            return self._fire_traced_event(trace, event_name, kwargs)
+
+        try:
+            return self._events.fire_event(event_name, **kwargs)
+        except queue.Full:
+            self.error('Event queue is full, dropped "{}".'.format(event_name))
+            return []
     
-    def number_of_threads(self):
-        self._pruneThreads()
-        with self._mutex:
-            n = len(self._threads)
+    def _fire_traced_event(self, trace, event_name, kwargs):
+        """
+        fire_event for an event about a traced message. Firing the event (prefilters, preprocessors and
+        starting the handlers) and each handler are recorded as spans.
+        """
+        start = time.monotonic()
+        try:
+            futures = self._events.fire_event(event_name, **kwargs)
+        except queue.Full:
+            self.error('Event queue is full, dropped "{}".'.format(event_name))
+            return []
+        self._tracer.record(trace, 'fire_event {}'.format(event_name), start)
+
+        for future in futures:
+            work = self._inflight.get(future)
+            if work != None:
+                name, started = work.handler, work.started
+            else:
+                name, started = event_name, start
+            future.add_done_callback(lambda f, name=name, started=started:
+                                     self._tracer.record(trace, 'handler {}'.format(name), started))
+        return futures
+
+    # Longest time a profiling session runs, also when it is waiting for a number of messages
+    MAX_PROFILE_SECONDS = 600
+
+    @staticmethod
+    def _profile_amount(text):
+        """
+        Parses the number of seconds or messages to profile. Raises ValueError unless it is finite and positive.
+        """
+        n = float(text)
+        if not math.isfinite(n) or n <= 0:
+            raise ValueError("The amount must be a positive number.")
         return n
 
+    def _start_profiling(self, name, n, unit, on_done):
+        """
+        Profiles the handlers of plugin <name> for n seconds or n messages, on_done(report) is called when done.
+        Raises RuntimeError if something is already being profiled.
+        """
+        if unit == "messages":
+            calls, seconds = max(1, int(n)), Bot.MAX_PROFILE_SECONDS
+        else:
+            calls, seconds = None, min(n, Bot.MAX_PROFILE_SECONDS)
+
+        jobs = []
+        def done(report):
+            for job in jobs:
+                job.cancel()
+            on_done(report)
+
+        session = self._profiler.start(name, lambda target: self._listener_plugin(target) == name,
+                                       calls=calls, on_done=done)
+        jobs.append(self.schedule_once(seconds, lambda: self._profiler.stop(session), name="profile {}".format(name)))
+
+    def _listener_plugin(self, target):
+        """
+        Returns the name of the plugin a listener belongs to. Wrappers made with functools.wraps are looked through.
+        """
+        target = inspect.unwrap(target)
+        owner = getattr(target, '__self__', None)
+        if owner != None:
+            target = type(owner)
+        if getattr(target, '__module__', None) == None:
+            return None
+        return self._plugin_name(target)
+
+    def is_admin(self, message):
+        """
+        Returns True if the sender of the message is listed in admins in the global settings.
+        """
+        admins = self._config.get('global', 'admins', fallback='').replace(",", " ").split()
+        return message.get_sender() in admins
+
+    def get_tracer(self):
+        """
+        Returns the libs.tracing.Tracer of the bot. Plugins may record spans of their own.
+        """
+        return self._tracer
+
+    def number_of_threads(self):
+        """
+        Returns the number of event handlers and scheduled jobs that are running.
+        """
+        return len(self._inflight)
+
+    def get_clock(self):
+        """
+        Returns the libs.clock.Clock of the bot. Plugins should use it for timers and expiry instead of the time module.
+        """
+        return self._clock
+
+    def get_scheduler(self):
+        return self._scheduler
+
+    def get_metrics(self):
+        """
+        Returns the libs.metrics.Metrics of the bot. Plugins may record metrics of their own.
+        """
+        return self._metrics
+
+    def get_inflight(self):
+        """
+        Returns the libs.inflight.InFlight registry of running event handlers and scheduled jobs.
+        """
+        return self._inflight
+
     def get_commands(self):
         return copy.copy(self._commands)
 
-    def add_command_listener(self, command, callback, strip_preamble=False, direct_reply=False):
+    def _command_route(self, message):
+        """
+        Returns the command a message is calling, or None if the message is not a command.
+        Used to route on_message to the listeners of that command only.
+        """
+        text = message.get_text()
+        if type(text) != str:
+            return None
+
+        m = self._command_regex.match(text)
+        if m == None:
+            return None
+        return m.group(1)
+
+    def _is_command(self, message):
+        """
+        Returns True if the message calls a command that exists, loaded or declared by a lazy plugin.
+        """
+        # The commands of lazy plugins are registered until the plugin has registered them itself
+        command = self._command_route(message)
+        with self._mutex:
+            return command != None and command in self._commands
+
+    def add_command_listener(self, command, callback, strip_preamble=False, direct_reply=False, process=False):
         """
         Convenience method for creating an event listener that listens to basic chat commands.
 
         Args:
         command (str): The textual part of the command (i.e without any command prefix symbol)
         callback (callable): Target function to call upon the bot seeing the command.
+                             May be a coroutine function (async def).
 
         Keyword args:
         strip_preamble (bool): Whether or not to strip the command prefix symbol and command text
@@ -216,126 +687,311 @@ class Bot:
                                string intended to be sent as a chat message. If True, the given
                                target function will be wrapped in a closure that will receive said
                                string and automatically perform the actual sending of the message.
+        process (bool):        Whether or not to run the target function in a worker process, for
+                               functions that are heavy on the CPU. The function must be defined at
+                               module level, see libs/processpool.py. The reply is sent by the bot process.
         """
+        if process:
+            callback = self._processes.wrap(callback)
+
         target = callback
 
         self.register_command('bot.add_command_listener', command)
 
-        def command_listener_filter(message):
-            if re.match(r'{prefix}{command}($|\s)'.format(
-                prefix = re.escape(self._config.get('global', 'prefix')),
-                command = re.escape(command)), message.get_text()):
-                return True
-            else:
-                return False
-
         if direct_reply:
-            def command_listener_wrapper(message):
-                try:
-                    reply = str(callback(message))
-                    if reply.strip() == "":
-                        self.add_message(message.respond("Something went wrong. Plugin sent an empty message.", self.get_nick()))
-                    if not type(reply) == str:
-                        self.add_message(message.respond('Something went wrong. Expected string but plugin sent "{}".'.format(type(reply)), self.get_nick()))
-                    self.add_message(message.respond(reply, self.get_nick()))
-                except:
-                    errormsg = traceback.format_exc()
-                    self.error('BOT::{}'.format(errormsg))
-                    self.add_message(message.respond('Error in event handler {}.'.format(str(callback)), self.get_nick()))
+            def send_reply(message, reply):
+                reply = str(reply)
+                if reply.strip() == "":
+                    self.add_message(message.respond("Something went wrong. Plugin sent an empty message.", self.get_nick()))
+                if not type(reply) == str:
+                    self.add_message(message.respond('Something went wrong. Expected string but plugin sent "{}".'.format(type(reply)), self.get_nick()))
+                self.add_message(message.respond(reply, self.get_nick()))
+
+            def report_error(message):
+                errormsg = traceback.format_exc()
+                self.error('BOT::{}'.format(errormsg))
+                self.add_message(message.respond('Error in event handler {}.'.format(str(callback)), self.get_nick()))
+
+            # Coroutine callbacks get a coroutine wrapper so they can run on the asyncio core.
+            # wraps() names the running handler after the callback, see libs.inflight.describe
+            if inspect.iscoroutinefunction(callback):
+                @functools.wraps(callback)
+                async def command_listener_wrapper(message):
+                    try:
+                        send_reply(message, await callback(message))
+                    except:
+                        report_error(message)
+            else:
+                def reply_when_done(message, future, replied):
+                    try:
+                        send_reply(message, future.result())
+                    except:
+                        report_error(message)
+                    replied.set_result(None)
+
+                @functools.wraps(callback)
+                def command_listener_wrapper(message):
+                    try:
+                        reply = callback(message)
+                        if isinstance(reply, concurrent.futures.Future):
+                            # Run in a worker process, the reply is sent when it is done without holding this thread
+                            replied = concurrent.futures.Future()
+                            reply.add_done_callback(lambda future: reply_when_done(message, future, replied))
+                            return replied
+                        send_reply(message, reply)
+                    except:
+                        report_error(message)
 
             target = command_listener_wrapper
 
+        # The time the command takes is observed as "command.<command>"
+        target = self._timed(target, 'command.{}'.format(command))
+
         if strip_preamble:
-            def command_listener_processor(message):
-                regex = r'^{prefix}{command}($|\s)'.format(
-                    prefix = re.escape(self._config.get('global', 'prefix')),
-                    command = re.escape(command))
+            # The route guarantees the text starts with the prefix and the command,
+            # followed by a whitespace or nothing at all
+            preamble_length = len(self.get_command_prefix()) + len(command) + 1
 
+            def command_listener_processor(message):
                 mymessage = message.clone()
-                mymessage.set_text(re.sub(regex, '', message.get_text()))
+                mymessage.set_text(message.get_text()[preamble_length:])
 
                 return {'message': mymessage}
 
-            self._events.add_event_listener('on_message', target, prefilter=command_listener_filter,
-                preprocessor=command_listener_processor)
+            self.add_event_listener('on_message', target, preprocessor=command_listener_processor,
+                route=command)
         else:
-            self._events.add_event_listener('on_message', target, prefilter=command_listener_filter)
+            self.add_event_listener('on_message', target, route=command)
+    def _timed(self, target, name):
+        """
+        Returns a wrapper of the command listener target that observes how long each call takes in the metrics.
+        """
+        if inspect.iscoroutinefunction(target):
+            @functools.wraps(target)
+            async def timed(message):
+                with self._metrics.timer(name):
+                    return await target(message)
+        else:
+            @functools.wraps(target)
+            def timed(message):
+                start = time.monotonic()
+                observe = lambda future=None: self._metrics.observe(name, time.monotonic() - start)
+                result = None
+                try:
+                    result = target(message)
+                    return result
+                finally:
+                    # Handed off to a worker process, it is timed until it is done
+                    if isinstance(result, concurrent.futures.Future):
+                        result.add_done_callback(observe)
+                    else:
+                        observe()
+        return timed
+
     def configure_alias(self, message):
         """
         Sets alias if configured to do so,
         does nothing if alias not configured to be used.
         """
+        # Messages that have been handed to listeners are shared, change a copy instead
+        if message.is_frozen():
+            message = message.clone()
+
         if not self._config.getboolean('global', 'use_aliases', fallback=False):
             message.set_alias(message.get_sender())
             return message
         else:
-            # Add alias to message
-            alias = self._service_manager.get_service("alias").get_alias(message.get_sender()) 
-            message.set_alias(alias)
+            # Add alias to message, it is only looked up if someone asks for it
+            message.set_alias_resolver(self._alias_resolver)
             return message
-    
+
+    def resolve_alias(self, sender):
+        """
+        Returns the alias of the sender, from the cache or the alias service.
+        """
+        return self._alias_cache.get_or_load(sender, self._load_alias)
+
+    def _load_alias(self, sender):
+        return self.get_service("alias").get_alias(sender)
+
+    def invalidate_alias(self, sender=None):
+        """
+        Drops the cached alias of sender, or all cached aliases if sender is None.
+        Called by the alias plugin when an alias is created or changes owners.
+        """
+        self._alias_cache.invalidate(sender)
+
     def add_message(self, message):
-        message = self.configure_alias(message)
-        self.log('enqueued a message: {}'.format(message.get_text()))
+        # Messages that already know their alias (or how to look it up) are sent as they are,
+        # frozen ones are still copied since the sender may change them
+        if message.is_frozen() or not message.has_alias():
+            message = self.configure_alias(message)
+        self.debug('enqueued a message: {}', message.get_text())
+
+        if message.get_trace() != None:
+            now = time.monotonic()
+            self._tracer.record(message.get_trace(), 'add_message', now, now)
 
-        self._message_queue.put(message)
+        self._sender.put(message)
 
-    def _waitForThreads(self, threadsthatshouldlive=2):
+    def _wait_for_handlers(self, report_interval=5.0, plugins=None):
         """
-        Waits for all but <threadsthatshouldlive> threads to die.
+        Waits for all running event handlers and scheduled jobs to finish, or only the handlers of
+        the given plugins (folder names). Logs the ones that are still running every <report_interval> seconds.
         """
+        if self._inflight.join(timeout=0, plugins=plugins):
+            return
 
-        self._pruneThreads()
+        self.log("Waiting for {} running handlers.".format(len(self._inflight.running(plugins))))
 
-        with self._mutex:
-            threadcount = len(self._threads) - threadsthatshouldlive
+        while not self._inflight.join(timeout=report_interval, plugins=plugins):
+            running = self._inflight.running(plugins)
+            self.log("Still waiting for {} handlers:\n\t{}".format(len(running), "\n\t".join(map(str, running))))
 
-        if threadcount > 0:
-            self.log("Waiting for threads to die.")
-            self.log("Currently {} threads active.".format(threadcount))
+        self.log("All handlers have finished. Continuing...")
 
-            while(threadcount > 0):
-                oldthreadcount = threadcount
-                self._pruneThreads()
-                with self._mutex:
-                    threadcount = len(self._threads) - threadsthatshouldlive
-                if not oldthreadcount == threadcount:
-                    self.log("Waiting for {} remaining threads...".format(threadcount))
+    def _record_registration(self, undo, plugin=None):
+        """
+        Remembers how to undo a registration if it is made by a plugin that is being constructed,
+        or by the given plugin.
+        """
+        plugin = getattr(self._registering, 'plugin', None) or plugin
+        if plugin != None:
+            with self._mutex:
+                self._registrations.setdefault(plugin, []).append(undo)
 
-        self.log("All threads have stopped. This is intentional. Continuing...")
+    def _owner_of(self, listener):
+        """
+        Returns the name of the plugin a listener belongs to: the plugin that is being constructed, or
+        else the plugin that defines the listener. None for the listeners of the bot itself.
+        """
+        plugin = getattr(self._registering, 'plugin', None)
+        if plugin != None:
+            return plugin
+
+        # Wrappers made with functools.wraps (process=True, direct_reply) are looked through
+        listener = inspect.unwrap(listener)
+        owner = getattr(listener, '__self__', None)
+        module = type(owner).__module__ if owner != None else getattr(listener, '__module__', None)
+        parts = str(module).split(".")
+        if len(parts) > 2 and parts[0] == "plugins":
+            return parts[1]
+        return None
+
+    @staticmethod
+    def _plugin_name(plugin):
+        """
+        Returns the name of the plugin (its folder) that a plugin class or instance belongs to.
+        """
+        parts = plugin.__module__.split(".")
+        if len(parts) > 2 and parts[0] == "plugins":
+            return parts[1]
+        return plugin.__module__
 
-    def _reload(self):
+    def _reload(self, names=None):
+        """
+        Reloads the given plugins, or all loaded plugins whose code has been altered during runtime.
+        Returns a text telling how it went.
         """
-        Reloads all plugins if their code has been altered during runtime.
-        Waits for all but the necessary threads to be shut down.
-        Fires the "should_save" event and waits for the threads to finish saving before
-        reloading them.
+        if names == None:
+            with self._mutex:
+                loaded = set(self._plugin_name(p) for p in self._plugins)
+            names = sorted(name for name in loaded if self._plugin_changed(name))
+
+            if len(names) == 0:
+                return "No plugin has been changed."
 
-        TODO: Not currently working. Does nothing and takes a while to do it.
+        results = []
+        for name in names:
+            try:
+                results.append(self.reload_plugin(name))
+            except:
+                self.error(traceback.format_exc())
+                results.append('Could not reload "{}", check stacktrace.'.format(name))
+        return "\n".join(results)
+
+    def _plugin_modules(self, name):
+        prefix = "plugins.{}.".format(name)
+        return [m for key, m in list(sys.modules.items()) if key.startswith(prefix)]
+
+    def _plugin_changed(self, name):
+        for module in self._plugin_modules(name):
+            cached = getattr(module, '__cached__', None)
+            try:
+                if cached != None and os.path.getmtime(module.__file__) > os.path.getmtime(cached):
+                    return True
+            except OSError:
+                continue
+        return False
+
+    def reload_plugin(self, name):
         """
+        Reloads the plugin in folder <name> without restarting the bot:
+            - Its commands, event listeners, services, web routes and scheduled jobs are unregistered.
+            - Its running handlers are waited for.
+            - get_handoff_state() is called on the old instance.
+            - Its modules are imported again and it is constructed again.
+            - set_handoff_state() is called on the new instance with the state of the old one.
+        If the new code can not be imported the old code is constructed again.
+        Returns a text telling how it went.
+        """
+        if name in self._lazy_plugins:
+            return '"{}" has not been loaded yet, it will use the new code when it is.'.format(name)
+
+        # Not the lazy mutex, the handlers that are waited for may need to load lazy plugins
+        with self._reload_mutex:
+            with self._mutex:
+                old = [p for p in self._plugins if self._plugin_name(p) == name]
+                if len(old) == 0:
+                    return 'There is no plugin called "{}".'.format(name)
+                self._plugins = [p for p in self._plugins if not p in old]
+                undo = self._registrations.pop(name, [])
 
+            self.log('Reloading plugin "{}".'.format(name))
 
-        self.fire_event("should_save")
+            for u in reversed(undo):
+                u()
 
-        return "Not implemented at this time."
+            # The handlers are tracked under the plugin that added them, see _owner_of
+            self._wait_for_handlers(plugins={name})
 
-        try:
+            states = dict()
+            for p in old:
+                try:
+                    states[type(p).__name__] = p.get_handoff_state()
+                except:
+                    self.error(traceback.format_exc())
+                    self.error('Could not get the state of "{}", it is not handed over.'.format(type(p).__name__))
 
-            #imp.reload(plugins)
-            #reimport.reimport(plugins)
-            #xreload.xreload(plugins)
-            self._loadplugins()
+            # Modules without plugins (helpers) are reloaded first, the plugins may import from them
+            modules = sorted(self._plugin_modules(name), key=lambda m: any(type(p).__module__ == m.__name__ for p in old))
+            try:
+                modules = [importlib.reload(m) for m in modules]
+                result = 'Reloaded "{}".'.format(name)
+            except:
+                self.error(traceback.format_exc())
+                self.error('Could not import the new code of plugin "{}", loading the old code again.'.format(name))
+                result = 'Could not reload "{}", check stacktrace. The old code is still running.'.format(name)
 
-            return "Reloaded all modules."
-        except:
-            errormsg = traceback.format_exc()
-            self.error(errormsg)
-            return "Could not reload all modules, check stacktrace."
+            classes = [getattr(sys.modules[type(p).__module__], type(p).__name__, type(p)) for p in old]
+            for plugin in classes:
+                if not self.__load_plugin(plugin):
+                    result = 'Could not construct "{}", check stacktrace.'.format(plugin.__name__)
+                    continue
+
+                if plugin.__name__ in states:
+                    new = [p for p in self._plugins if type(p) is plugin][-1]
+                    new.set_handoff_state(states[plugin.__name__])
+
+            return result
 
     def __loadSubClasses(self, obj):
         bad_plugins = []
         for o in obj.__subclasses__():
-            if o is not plugins.plugintemplate.PluginTemplate and isinstance(o,type):
+            # Classes replaced by reload_plugin and plugins that are loaded on demand are skipped
+            stale = getattr(sys.modules.get(o.__module__), o.__name__, o) is not o
+            lazy = self._plugin_name(o) in self._lazy_plugins
+            if o is not plugins.plugintemplate.PluginTemplate and isinstance(o,type) and not stale and not lazy:
                 if not self.__load_plugin(o):
                     bad_plugins.append(o.__name__)
                 bad_plugins += self.__loadSubClasses(o)
@@ -352,6 +1008,7 @@ class Bot:
 
         if __debug__:
             self.log('Initializing plugin class "{}".'.format(plugin.__name__))
+        self._registering.plugin = self._plugin_name(plugin)
         try:
             p = plugin(self)
         except:
@@ -359,6 +1016,8 @@ class Bot:
             self.error(errormsg)
             self.error('Fatal error occured initializing plugin "{}". Check stacktrace.'.format(plugin.__name__))
             return False
+        finally:
+            self._registering.plugin = None
 
         with self._mutex:
             self._plugins.append(p)
@@ -366,6 +1025,103 @@ class Bot:
             self.log('Loaded "{}".'.format(plugin.__name__))
         return True
    
+    def _read_manifests(self):
+        """
+        Returns the manifests of the plugins that should be loaded and have one.
+        """
+        manifests = []
+        for name in plugins.plugin_directories(self._config):
+            try:
+                manifest = read_manifest(name, os.path.join(os.path.dirname(plugins.__file__), name))
+            except:
+                self.error(traceback.format_exc())
+                self.error('Could not read the manifest of plugin "{}", loading it right away.'.format(name))
+                continue
+
+            if manifest != None:
+                manifests.append(manifest)
+        return manifests
+
+    def _add_lazy_plugin(self, manifest):
+        """
+        Declares what a plugin provides without importing it.
+        """
+        with self._lazy_mutex:
+            self._lazy_plugins[manifest.name] = manifest
+
+            commands, events = dict(self._lazy_commands), dict(self._lazy_events)
+            services, routes = dict(self._lazy_services), dict(self._lazy_routes)
+            for command in manifest.commands:
+                with self._mutex:
+                    if not command in self._commands:
+                        self._commands[command] = {'owner': manifest.name, 'description': "No description", 'lazy': True}
+                commands[command] = manifest
+            for event in manifest.events:
+                events[event] = events.get(event, []) + [manifest]
+            for service in manifest.services:
+                services[service] = manifest
+            for route in manifest.routes:
+                routes[route] = manifest
+            self._lazy_commands, self._lazy_events = commands, events
+            self._lazy_services, self._lazy_routes = services, routes
+
+    def _load_plugins_for(self, event_name, kwargs):
+        """
+        Loads the lazy plugins that have to see an event before it is fired.
+        """
+        for manifest in list(self._lazy_events.get(event_name, [])):
+            self._load_lazy_plugin(manifest)
+
+        if event_name == 'on_message':
+            manifest = self._lazy_commands.get(self._command_route(kwargs['message']))
+            if manifest != None:
+                self._load_lazy_plugin(manifest)
+
+    def _load_lazy_plugin(self, manifest):
+        """
+        Imports and constructs a plugin declared by its manifest. Does nothing if it is already loaded.
+        Other threads asking for the plugin wait until it is constructed.
+        """
+        with self._lazy_mutex:
+            if self._lazy_plugins.pop(manifest.name, None) == None:
+                return
+
+            self.log('Loading plugin "{}" on demand.'.format(manifest.name))
+
+            for module_name in manifest.modules:
+                try:
+                    module = importlib.import_module('plugins.{}.{}'.format(manifest.name, module_name))
+                except:
+                    self.error(traceback.format_exc())
+                    self.error('Could not import "{}" of plugin "{}". Check stacktrace.'.format(module_name, manifest.name))
+                    continue
+
+                for o in list(vars(module).values()):
+                    if isinstance(o, type) and issubclass(o, plugins.plugintemplate.PluginTemplate) and o.__module__ == module.__name__:
+                        self.__load_plugin(o)
+
+            # The plugin has registered its commands itself, placeholders it did not replace are removed
+            with self._mutex:
+                for command in manifest.commands:
+                    registered = self._commands.get(command)
+                    if registered != None and registered.get('lazy', False) and registered['owner'] == manifest.name:
+                        del self._commands[command]
+
+            # The indexes are updated last so other threads do not skip the plugin while it is constructed
+            self._lazy_commands = {k: m for k, m in self._lazy_commands.items() if not m is manifest}
+            self._lazy_services = {k: m for k, m in self._lazy_services.items() if not m is manifest}
+            self._lazy_routes = {k: m for k, m in self._lazy_routes.items() if not m is manifest}
+            events = dict(self._lazy_events)
+            for event in manifest.events:
+                remaining = [m for m in events[event] if not m is manifest]
+                if len(remaining) > 0:
+                    events[event] = remaining
+                else:
+                    del events[event]
+            self._lazy_events = events
+            if 'on_timer_tick' in manifest.events:
+                self._update_timer_tick()
+
     #Add new plugins to this list and to the 'reload' command
     #inside respond
     def _loadplugins(self):
@@ -374,7 +1130,7 @@ class Bot:
         with self._mutex:
             self._plugins = []
 
-        self._waitForThreads()
+        self._wait_for_handlers()
         bad_plugins = self.__loadSubClasses(plugins.plugintemplate.PluginTemplate)
         if len(bad_plugins):
             self.error(
@@ -386,13 +1142,6 @@ class Bot:
                Plugins that could not be loaded: {}.""".format(len(bad_plugins), ", ".join(bad_plugins)))
         self.log("Done loading plugins.")
 
-    # Removes threads that are not active
-    def _pruneThreads(self):
-        with self._mutex:
-            self._threads = [t for t in self._threads if t.is_alive()]
-
-        return
-
     # Starts the bot so that it starts reading the chat
     def start(self):
         if self._config.getboolean('webjante','enabled'):
@@ -401,92 +1150,160 @@ class Bot:
                             self._config['webjante']['sslkeyfile'], self._config['webjante']['sslcertfile'])
         else:
             self.log("Webjante not configured to start.")
-        self.log("Starting mainbot!")
-        # start the sending thread
-        def send_messages():
-            while not self._shutdown_called:
-                if not self._muted and not self._message_queue.empty():
-                    message_to_send = self._message_queue.get()
-                    if message_to_send.get_address() == None or message_to_send.get_address() == "":
-                        self.error("ATTEMPTED TO SEND MESSAGE WITHOUT ADDRESS.")
-                        time.sleep(0.05)
-                    elif type(message_to_send.get_address()) == tuple:
-                        
-                        # Internal message.
-                        self.log('Internal message sent with id "{}"'.format(message_to_send.get_address()))
-                        self.fire_event('on_message_sent', message=message_to_send)
-                    else:
-                        self.log('Sending message to address "{}"'.format(message_to_send.get_address()))
+        if self._core != None:
+            self._start_asyncio()
 
-                        if issubclass(type(message_to_send.get_text()), BaseException):
-                        # Errors should be formatted correctly before they are sent to external sources
-                            message_to_send.set_text("{}-exception::{}: {}".format(message_to_send.get_sender(), type(message_to_send.get_text()).__name__, message_to_send.get_text().args[0]))
+        t = threading.Thread(target=self._dispatch_inbound, name="DispatchMain - Fires on_message for received messages")
+        t.start()
+        self._service_threads.append(t)
 
-                        self._io.send(message_to_send)
-                        self.fire_event('on_message_sent', message=message_to_send)
-                        time.sleep(0.05)
-                else:
-                    time.sleep(0.1)
-        
-        t = threading.Thread(target=send_messages, name="send_messages_main - Triggers on_message_sent")
+        self.log("Starting mainbot!")
+        # start the sending thread
+        t = threading.Thread(target=self._sender.run, name="send_messages_main - Triggers on_message_sent")
         
         t.start()
         
-        self._threads.append(t)
+        self._service_threads.append(t)
         while not self._shutdown_called:
             message = self._io.recieve()
 
             if message == None:
                 continue
 
-            # TODO: replace this with some proper method of the
-            # TODO: .. IO signalling back to the bot that the IO
-            # TODO: .. is closing down
-            if message.get_text() == message.get_address() == message.get_sender() == 'QUIT':
-                self._shutdown()
+            if not self._handle_inbound(message):
                 return
 
-            # Add alias to message
-            message = self.configure_alias(message)
-            # Prints all read lines into stdout
-            if message.get_text().strip() != "":
+        self._wait_for_handlers()
+        self._events.shutdown()
+        raise SystemExit()
+
+    def _start_asyncio(self):
+        """
+        Runs the IO, the sender, the scheduler and event dispatch on one asyncio event loop.
+        """
+        self.log("Starting mainbot on the asyncio core!")
 
-                ans = ""
+        self._core.run()
 
-                if not message.is_in_group():
-                    ans += "\tPrivate message:\n"
-                else:
-                    ans += "\tGroup message:\n"
-                ans += "\t\tText:\n{}\n\t\tFrom:{}\n\t\tAddress:{}\n".format(message.get_text(), message.get_alias(), message.get_address())
-                self.log(ans)
-
-            # If a client has sent <prefix>pull and the settins allow for it, kill Jante
-            if self._config.getboolean('global', 'allow_git_pull', fallback=False) and message.get_text().strip().startswith("{}pull".format(self._config['global']['prefix'])):
-                self._io.exit("Pulling from git and restarting")
-                sys.stderr.write("Exited in order to perform git pull.\n")
-                self._shutdown()
-
-            # If a normal message is gotten, fire on_message.
-            if not message.get_sender() == "" and not message.get_text() == "" and len(message.get_sender().split(" ")) == 1:
-                self.fire_event('on_message', message=message)
+        self._wait_for_handlers()
+        self._events.shutdown()
+        raise SystemExit()
 
-            # If there are too many threads running, kill them
-            if len(self._threads) > self._threadlimit:
-                self.log("Pruning threads.")
-                self._pruneThreads()
+    def _handle_inbound(self, message):
+        """
+        Handles a message read from the IO by putting it in the admission queue.
+        Returns False if the bot should stop reading right away.
+        """
+        # TODO: replace this with some proper method of the
+        # TODO: .. IO signalling back to the bot that the IO
+        # TODO: .. is closing down
+        if message.get_text() == message.get_address() == message.get_sender() == 'QUIT':
+            self._shutdown()
+            return False
 
-            if len(self._threads) > self._threadlimit:
-                self._io.exit("Too many threads, shutting down")
-                self._shutdown()
+        if self._recorder != None:
+            self._recorder.record(message)
 
+        now = time.monotonic()
+        message.set_received(now)
+        message.set_trace(self._tracer.start(message.get_text()[:60], now))
 
-        self._waitForThreads()
-        raise SystemExit()
+        # Commands are kept flowing under overload, chatter is dropped first
+        self._admission.put(message, message.get_sender(), message.get_address(),
+                            important=self._is_command(message))
+        return True
+
+    def is_overloaded(self):
+        """
+        The bot is overloaded when too many handlers are running or the admission queue is half full.
+        """
+        return (len(self._inflight) >= self._overload_handlers
+                or self._admission.qsize() >= self._admission.get_size() // 2)
+
+    def _dispatch_inbound(self):
+        """
+        Handles the messages in the admission queue until the bot shuts down.
+        """
+        while not self._shutdown_called:
+            self._dispatch_next(0.5)
+
+    def _dispatch_next(self, timeout):
+        """
+        Handles the next message in the admission queue, waiting at most timeout seconds for one.
+        Returns False if there was none.
+        """
+        message = self._admission.get(timeout=timeout)
+        if message == None:
+            return False
+        try:
+            self._dispatch_message(message)
+        except:
+            self.error(traceback.format_exc())
+        return True
+
+    def _report_overload(self, overloaded):
+        if overloaded != self._overloaded:
+            self._overloaded = overloaded
+            if overloaded:
+                self.error("Overloaded, only commands are handled. {} handlers running, {} messages waiting.".format(
+                    len(self._inflight), self._admission.qsize()))
+            else:
+                self.log("No longer overloaded. Shed so far: {}.".format(self._admission.get_shed_counts()))
+
+    def _wait_for_handler_slot(self):
+        """
+        With dispatch = threads, waits until less than max_handlers handlers are running. Meanwhile the
+        received messages wait in the admission queue, which sheds them when it is full.
+        The worker pool bounds the handlers by itself.
+        """
+        if self._dispatch_mode != 'threads' or self._max_handlers <= 0:
+            return
+        while not self._inflight.wait_below(self._max_handlers, 0.5) and not self._shutdown_called:
+            pass
+
+    def _dispatch_message(self, message):
+        trace = message.get_trace()
+        if trace != None and message.get_received() != None:
+            self._tracer.record(trace, 'admission_queue', message.get_received())
+
+        # Add alias to message
+        with self._tracer.span(trace, 'configure_alias'):
+            message = self.configure_alias(message)
+        # Prints all read lines into stdout
+        if message.get_text().strip() != "" and self._io.is_logging(jantelog.INFO):
+            self.log("\t{} message:\n\t\tText:\n{}\n\t\tFrom:{}\n\t\tAddress:{}\n",
+                     "Group" if message.is_in_group() else "Private",
+                     message.get_text(), message.get_alias(), message.get_address())
+
+        # If a client has sent <prefix>pull and the settins allow for it, kill Jante
+        if self._config.getboolean('global', 'allow_git_pull', fallback=False) and message.get_text().strip().startswith("{}pull".format(self._config['global']['prefix'])):
+            self._io.exit("Pulling from git and restarting")
+            sys.stderr.write("Exited in order to perform git pull.\n")
+            self._shutdown()
+
+        # If a normal message is gotten, fire on_message.
+        if not message.get_sender() == "" and not message.get_text() == "" and len(message.get_sender().split(" ")) == 1:
+            overloaded = self.is_overloaded()
+            self._report_overload(overloaded)
+            self._wait_for_handler_slot()
+
+            if not overloaded:
+                self.fire_event('on_message', message=message)
+            elif self._is_command(message):
+                # Only the listeners of the command, not the ones listening to all messages
+                self._admission.record_shed('chatter_listeners')
+                self.fire_event('on_message', _routed_only=True, message=message)
+            else:
+                self._admission.record_shed('chatter')
 
     def start_httpd(self, port, password, keyfile='ssl/key.pem', certfile='ssl/cert.pem'):
         def webresponder(req):
             self.log('httpd: <<< [{}] GET {}'.format(req.client_address[0], req.path))
 
+            for route, manifest in list(self._lazy_routes.items()):
+                if re.match(re.escape(route), req.path):
+                    self._load_lazy_plugin(manifest)
+
             for p in self._httpd_routes.keys():
                 if re.match(re.escape(p), req.path): # TODO: pick longest match
                     self.log('httpd: >>> {} -> {}'.format(req.path, self._httpd_routes[p]))
@@ -515,11 +1332,12 @@ class Bot:
         if __debug__:
             self.log("Registering httpd route {} -> {}".format(route, target))
         self._httpd_routes[route] = target
+        self._record_registration(lambda: self.unregister_web_route(route))
 
     def unregister_web_route(self, route):
         if __debug__:
             self.log("Unregistering httpd route {}".format(route))
-        del self._httpd_routes[route]
+        self._httpd_routes.pop(route, None)
     
     def clear_web_routes(self):
         self.log("Clearing httpd routes")
@@ -529,31 +1347,54 @@ class Bot:
     def _shutdown(self):
         self.fire_event("should_save")
         self._shutdown_called = True
+        self._io.stop()
+        self._sender.stop()
+        self._scheduler.stop()
+        self._processes.shutdown()
+        if self._core != None:
+            self._core.stop()
 
         if self._httpd != None:
             self._httpd.shutdown()
             self._httpd = None
 
+        if self._recorder != None:
+            self._recorder.close()
+
+        self._io.close_log()
+
     def error(self, text):
         self._io.error(text)
 
-    def log(self, text):
-        self._io.log(text)
+    def log(self, text, *args):
+        """
+        Logs text.format(*args). The formatting is done by the log writer, only if it is logged.
+        """
+        self._io.log(text, *args)
+
+    def debug(self, text, *args):
+        self._io.log(text, *args, level=jantelog.DEBUG)
+
+    def is_logging(self, level):
+        """
+        Returns True if messages at <level> (see libs.jantelog) are logged.
+        """
+        return self._io.is_logging(level)
 
 def main(argv):
-    parser = argparse.ArgumentParser(description='The jante-bot. Created to easily integrate various plugins. The bot has a number possible IO types. By default it uses the local IO that is called by -l', prog='jante-bot')
+    parser = argparse.ArgumentParser(description='The jante-bot. Created to easily integrate various plugins. The bot has a number possible IO types. By default it uses the local IO that is called by -l. Several IO types can be given to serve them all from one bot, e.g. -x -i', prog='jante-bot')
 
-    g = parser.add_mutually_exclusive_group()
+    g = parser.add_argument_group('IO types')
 
     # Normal Protocols
-    g.add_argument('-x', '--xmpp', action='store_const', const="xmpp", dest="io", help="Use the XMPP protocol.")
-    g.add_argument('-i', '--irc', action='store_const', const="irc", dest="io", help="Use the IRC protocol.")
-    g.add_argument('-d', '--discord', action='store_const', const="discord", dest="io", help="Use Discord.")
+    g.add_argument('-x', '--xmpp', action='append_const', const="xmpp", dest="io", help="Use the XMPP protocol.")
+    g.add_argument('-i', '--irc', action='append_const', const="irc", dest="io", help="Use the IRC protocol.")
+    g.add_argument('-d', '--discord', action='append_const', const="discord", dest="io", help="Use Discord.")
 
     # Local IO
-    g.add_argument('-b', '--barebones', action='store_const', const="old", dest="io", help="Use a barebones local IO system. Mainly for testing things on a local machine. Less functional than --local.")
-    g.add_argument('-o', '--old', action='store_const', const="old", dest="io", help="Deprecated name for -b.")
-    g.add_argument('-l', '--local', action='store_const', const="local", dest="io", help="Use a curses based local IO system. Mainly for testing things on a local machine.")
+    g.add_argument('-b', '--barebones', action='append_const', const="old", dest="io", help="Use a barebones local IO system. Mainly for testing things on a local machine. Less functional than --local.")
+    g.add_argument('-o', '--old', action='append_const', const="old", dest="io", help="Deprecated name for -b.")
+    g.add_argument('-l', '--local', action='append_const', const="local", dest="io", help="Use a curses based local IO system. Mainly for testing things on a local machine.")
 
 
     # Parse arguments
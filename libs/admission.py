@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A bounded queue for inbound messages.
+
+Messages are queued per sender and handed out round robin between senders, so one user flooding
+the bot does not delay everyone else. There are limits on the number of waiting messages in total,
+per sender and per channel. When a limit is hit an important message (a command) pushes out the
+oldest unimportant message (chatter) in its way, an unimportant message is dropped.
+Everything that is dropped is counted, see get_shed_counts().
+"""
+
+import threading
+import collections
+
+class AdmissionQueue:
+    class entry:
+        def __init__(self, item, sender, channel, important):
+            self.item = item
+            self.sender = sender
+            self.channel = channel
+            self.important = important
+
+    def __init__(self, size=256, max_per_sender=16, max_per_channel=64):
+        self._size = size
+        self._max_per_sender = max_per_sender
+        self._max_per_channel = max_per_channel
+
+        # Waiting entries per (channel, sender), in the order the senders are served
+        self._queues = collections.OrderedDict()
+        self._per_channel = collections.Counter()
+        self._count = 0
+
+        self._shed = collections.Counter()
+        self._condition = threading.Condition()
+
+    def qsize(self):
+        with self._condition:
+            return self._count
+
+    def get_size(self):
+        return self._size
+
+    def record_shed(self, reason, n=1):
+        """
+        Counts work that was dropped for another reason than a full queue, e.g listeners skipped under overload.
+        """
+        with self._condition:
+            self._shed[reason] += n
+
+    def get_shed_counts(self):
+        with self._condition:
+            return dict(self._shed)
+
+    # _condition must be held. Returns the limit that stops the entry from being queued, or None.
+    def _full(self, e):
+        if self._count >= self._size:
+            return lambda other: True
+        if len(self._queues.get((e.channel, e.sender), ())) >= self._max_per_sender:
+            return lambda other: other.channel == e.channel and other.sender == e.sender
+        if self._per_channel[e.channel] >= self._max_per_channel:
+            return lambda other: other.channel == e.channel
+        return None
+
+    # _condition must be held. Removes the oldest unimportant entry matching the limit.
+    def _evict(self, limit):
+        for key, queue in self._queues.items():
+            for other in queue:
+                if not other.important and limit(other):
+                    queue.remove(other)
+                    self._removed(key, other)
+                    return True
+        return False
+
+    # _condition must be held
+    def _removed(self, key, e):
+        self._count -= 1
+        self._per_channel[e.channel] -= 1
+        if self._per_channel[e.channel] == 0:
+            del self._per_channel[e.channel]
+        if len(self._queues[key]) == 0:
+            del self._queues[key]
+
+    def put(self, item, sender, channel, important=False):
+        """
+        Returns True if the item was queued, False if it was dropped.
+        """
+        e = AdmissionQueue.entry(item, sender, channel, important)
+
+        with self._condition:
+            limit = self._full(e)
+            while limit != None:
+                if not important:
+                    self._shed['chatter'] += 1
+                    return False
+                if not self._evict(limit):
+                    self._shed['commands'] += 1
+                    return False
+                self._shed['chatter'] += 1
+                limit = self._full(e)
+
+            key = (channel, sender)
+            if not key in self._queues:
+                self._queues[key] = collections.deque()
+            self._queues[key].append(e)
+            self._per_channel[channel] += 1
+            self._count += 1
+
+            self._condition.notify()
+        return True
+
+    def get(self, timeout=None):
+        """
+        Returns the next item, taking turns between the senders. Returns None if the timeout runs out.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._count > 0, timeout):
+                return None
+
+            key, queue = next(iter(self._queues.items()))
+            e = queue.popleft()
+            self._removed(key, e)
+
+            # The sender goes to the back of the line
+            if key in self._queues:
+                self._queues.move_to_end(key)
+            return e.item
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The asyncio core of the bot.
+
+Runs the receive loop, the dispatch of received messages, the scheduler and the sender on one
+event loop. Event handlers written as coroutines (async def) are run on the same loop, ordinary
+handlers and scheduled jobs are run by the worker pool.
+"""
+
+import asyncio
+
+class AsyncCore:
+    def __init__(self, io, sender, events, handle_inbound, dispatch_next=None, scheduler=None):
+        """
+        handle_inbound  - Called with every received message. Returns False if the core should stop.
+        dispatch_next   - Called to handle the next message that handle_inbound has let in.
+                          Returns False if there is none waiting.
+        scheduler       - Optional libs.scheduler.Scheduler that is run on the loop.
+        """
+        self._io = io
+        self._sender = sender
+        self._events = events
+        self._handle_inbound = handle_inbound
+        self._dispatch_next = dispatch_next
+        self._scheduler = scheduler
+        self._stopped = False
+        # Set when a received message has been let in, created on the loop
+        self._inbound = None
+
+    def run(self):
+        asyncio.run(self._main())
+
+    def stop(self):
+        self._stopped = True
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        self._events.set_loop(loop)
+        self._sender.attach_loop(loop)
+        self._inbound = asyncio.Event()
+
+        services = [loop.create_task(self._sender.run_async())]
+        if self._dispatch_next != None:
+            services.append(loop.create_task(self._dispatch()))
+        if self._scheduler != None:
+            self._scheduler.attach_loop(loop)
+            services.append(loop.create_task(self._scheduler.run_async()))
+
+        try:
+            await self._receive()
+
+            # Let coroutine handlers that are still running finish
+            handlers = asyncio.all_tasks() - set(services) - {asyncio.current_task()}
+            if len(handlers) > 0:
+                await asyncio.wait(handlers)
+        finally:
+            self._sender.stop()
+            for task in services:
+                task.cancel()
+            await asyncio.gather(*services, return_exceptions=True)
+
+            self._events.set_loop(None)
+            self._sender.detach_loop()
+            if self._scheduler != None:
+                self._scheduler.detach_loop()
+
+    async def _receive(self):
+        while not self._stopped:
+            message = await self._io.async_recieve()
+
+            if message == None:
+                await asyncio.sleep(0)
+                continue
+
+            if not self._handle_inbound(message):
+                return
+            self._inbound.set()
+
+    async def _dispatch(self):
+        while not self._stopped:
+            self._inbound.clear()
+            while self._dispatch_next():
+                # Lets the loop receive and send between messages
+                await asyncio.sleep(0)
+            await self._inbound.wait()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Clocks for code that depends on the time: timers, scheduled jobs, rate limits and TTLs.
+
+Clock is the real time. SimulatedClock only moves when it is told to, so tests and benchmarks can
+replay hours of timers and expiring entries in milliseconds:
+
+    clock = SimulatedClock()
+    scheduler = Scheduler(clock=clock)
+    scheduler.every(60, job)
+    clock.advance(24 * 60 * 60, scheduler=scheduler)    # job runs 1440 times, each at its own time
+
+Performance measurements (metrics, traces) always use the real time.
+"""
+
+import time
+import threading
+
+class Clock:
+    def time(self):
+        """
+        Seconds since the epoch, like time.time().
+        """
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, condition, timeout=None):
+        """
+        condition.wait(timeout) where the timeout is measured by this clock. The condition must be held.
+        """
+        return condition.wait(timeout)
+
+class SimulatedClock(Clock):
+    def __init__(self, start=1500000000.0):
+        """
+        start - What time() returns until the clock is advanced. monotonic() starts at 0.
+        """
+        self._start = start
+        self._elapsed = 0.0
+        self._condition = threading.Condition()
+        # Conditions that threads wait on in wait(), notified when the time moves
+        self._waiting = set()
+
+    def time(self):
+        return self._start + self._elapsed
+
+    def monotonic(self):
+        return self._elapsed
+
+    def sleep(self, seconds):
+        """
+        Blocks until the clock has been advanced <seconds>.
+        """
+        with self._condition:
+            deadline = self._elapsed + seconds
+            self._condition.wait_for(lambda: self._elapsed >= deadline)
+
+    def wait(self, condition, timeout=None):
+        """
+        Waits until the condition is notified or the clock is advanced.
+        The caller is expected to check the time again, like it would after a timeout.
+        """
+        with self._condition:
+            self._waiting.add(condition)
+        try:
+            return condition.wait()
+        finally:
+            with self._condition:
+                self._waiting.discard(condition)
+
+    def _set(self, elapsed):
+        with self._condition:
+            self._elapsed = max(self._elapsed, elapsed)
+            self._condition.notify_all()
+            waiting = list(self._waiting)
+
+        for condition in waiting:
+            with condition:
+                condition.notify_all()
+
+    def advance(self, seconds, scheduler=None):
+        """
+        Moves the clock <seconds> forward. If a scheduler is given the clock stops at every deadline on
+        the way and the jobs that are due are run, so repeating jobs run every time they should and not
+        just once. They are run on the calling thread, or on the thread of the scheduler if it gets there first.
+        """
+        end = self._elapsed + seconds
+
+        if scheduler != None:
+            while True:
+                deadline = scheduler.next_deadline()
+                if deadline == None or deadline - self._start > end:
+                    break
+                self._set(deadline - self._start)
+                scheduler.run_pending()
+
+        self._set(end)
+
+    def set_time(self, timestamp, scheduler=None):
+        """
+        Advances the clock to the given time (seconds since the epoch), see advance().
+        """
+        self.advance(max(0.0, timestamp - self.time()), scheduler=scheduler)
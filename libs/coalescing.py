@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Merges outbound messages to the same address that are sent close together into one message, so a
+plugin answering with many lines costs one send to the protocol instead of one per line.
+
+A message to an external address is held for <window> seconds. Messages to the same address that
+come in meanwhile are appended to it, separated by newlines. When the window is over the merged
+message is handed to deliver(). If it is longer than <max_length> it is pasted (see the paste
+service) in a background thread, and if that does not make it short enough it is delivered as a
+few messages that are each at most <max_length> long. Messages to the address that come in while
+the paste runs wait for it and are then delivered as they are. A single message is never split
+or pasted.
+
+Only messages that would be sent the same way are merged: the same sender, recipient and
+send_to_all (and so the same outbound lane). A message that differs from the ones held for its
+address releases them first and is then held on its own, so the order to the address is kept.
+
+on_message_sent is fired for the merged message that is sent, not for each message it was made of.
+
+Internal messages (tuple addresses) and exceptions are never held.
+"""
+
+import heapq
+import threading
+
+def run_in_thread(job):
+    threading.Thread(target=job, name="Coalescer - Pastes merged messages", daemon=True).start()
+
+class Coalescer:
+    def __init__(self, window, deliver=None, max_length=400, paste=None, on_error=None, background=run_in_thread):
+        """
+        window - Seconds a message is held waiting for more, 0 disables coalescing.
+        deliver - Called with every message that is let through, in order. Called with the lock of the coalescer held.
+        paste - Called with the merged text when it is too long, returns the text to send instead.
+        on_error - Called with the text of an error raised by paste.
+        background - Called with a function that pastes, runs it in a thread by default.
+        """
+        self._window = window
+        self._deliver = deliver
+        self._max_length = max_length
+        self._paste = paste
+        self._on_error = on_error
+        self._background = background
+
+        # (sequence number, messages) being held, per destination (backend, address)
+        self._held = dict()
+        # Messages that came in while the messages before them are pasted, per destination
+        self._pasting = dict()
+        # Number of held messages, read by other threads through len()
+        self._count = 0
+        # Heap of (deadline, sequence number, destination)
+        self._deadlines = []
+        self._sequence = 0
+        # Reentrant, background may run the paste right away
+        self._mutex = threading.RLock()
+
+    def set_deliver(self, deliver):
+        self._deliver = deliver
+
+    def enabled(self):
+        return self._window > 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, message, now):
+        """
+        Holds the message, or delivers it (after what is held for its address) if it can not be held.
+        """
+        destination = message.get_destination()
+        with self._mutex:
+            held = self._held.get(destination)
+            if held != None and self._mergeable(held[1][0], message) and self._holdable(message):
+                held[1].append(message)
+                self._count += 1
+                return
+
+            # Keep the order of messages to the address, what is held goes first
+            self._release(destination)
+            if destination in self._pasting:
+                self._pasting[destination].append(message)
+                self._count += 1
+            elif self._holdable(message):
+                self._hold(destination, [message], now + self._window)
+            else:
+                self._deliver(message)
+
+    def _holdable(self, message):
+        return self.enabled() and not message.is_internal() and type(message.get_text()) == str
+
+    @staticmethod
+    def _mergeable(first, message):
+        """
+        The merged message is a clone of the first one, so the fields it keeps must be the same.
+        """
+        return (first.get_sender() == message.get_sender()
+                and first.get_recipient() == message.get_recipient()
+                and first.get_send_to_all() == message.get_send_to_all())
+
+    # _mutex must be held
+    def _hold(self, destination, messages, deadline):
+        self._sequence += 1
+        self._held[destination] = (self._sequence, messages)
+        self._count += len(messages)
+        heapq.heappush(self._deadlines, (deadline, self._sequence, destination))
+
+    # _mutex must be held. Drops deadlines of messages that have been released already.
+    def _drop_stale(self):
+        while len(self._deadlines) > 0:
+            _, sequence, destination = self._deadlines[0]
+            held = self._held.get(destination)
+            if held != None and held[0] == sequence:
+                return
+            heapq.heappop(self._deadlines)
+
+    def next_deadline(self):
+        """
+        When the next held message is due, None if nothing is held.
+        """
+        with self._mutex:
+            self._drop_stale()
+            if len(self._deadlines) == 0:
+                return None
+            return self._deadlines[0][0]
+
+    def due(self, now):
+        """
+        Delivers the merged messages whose window is over.
+        """
+        with self._mutex:
+            self._drop_stale()
+            while len(self._deadlines) > 0 and self._deadlines[0][0] <= now:
+                _, _, destination = heapq.heappop(self._deadlines)
+                self._release(destination)
+                self._drop_stale()
+
+    def flush(self):
+        """
+        Delivers all held messages merged, regardless of their windows.
+        """
+        with self._mutex:
+            for destination in list(self._held):
+                self._release(destination)
+            self._deadlines = []
+
+    # _mutex must be held
+    def _release(self, destination):
+        held = self._held.pop(destination, None)
+        if held == None:
+            return
+        messages = held[1]
+        self._count -= len(messages)
+        if len(messages) == 1:
+            self._deliver(messages[0])
+            return
+
+        text = "\n".join(m.get_text() for m in messages)
+        if len(text) <= self._max_length:
+            self._deliver(self._merge(messages, text))
+        elif self._paste != None:
+            self._pasting[destination] = []
+            self._background(lambda: self._paste_and_deliver(destination, messages, text))
+        else:
+            self._deliver_chunks(messages)
+
+    def _paste_and_deliver(self, destination, messages, text):
+        try:
+            pasted = self._paste(text)
+        except Exception as e:
+            pasted = text
+            if self._on_error != None:
+                self._on_error("Could not paste {} coalesced messages: {}".format(len(messages), e))
+
+        with self._mutex:
+            if len(pasted) <= self._max_length:
+                self._deliver(self._merge(messages, pasted))
+            else:
+                self._deliver_chunks(messages)
+
+            # What came in meanwhile has waited long enough
+            waiting = self._pasting.pop(destination)
+            self._count -= len(waiting)
+            for m in waiting:
+                self._deliver(m)
+
+    # _mutex must be held
+    def _deliver_chunks(self, messages):
+        """
+        Merges the messages into as few messages as possible that are at most max_length long.
+        """
+        chunk = []
+        length = 0
+        for m in messages:
+            added = len(m.get_text()) + (1 if len(chunk) > 0 else 0)
+            if len(chunk) > 0 and length + added > self._max_length:
+                self._deliver(self._merge(chunk, "\n".join(c.get_text() for c in chunk)))
+                chunk = []
+                added = len(m.get_text())
+                length = 0
+            chunk.append(m)
+            length += added
+        self._deliver(self._merge(chunk, "\n".join(c.get_text() for c in chunk)))
+
+    def _merge(self, messages, text):
+        if len(messages) == 1 and messages[0].get_text() == text:
+            return messages[0]
+        # The merged message is answered and traced like the first one
+        merged = messages[0].clone()
+        merged.set_text(text)
+        return merged
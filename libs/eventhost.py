@@ -4,40 +4,60 @@
 import threading
 import inspect
 import copy
+import asyncio
+import functools
+import traceback
+
+from libs.inflight import run_in_thread
+
+# Runs a coroutine handler to completion when there is no event loop to schedule it on
+def _run_coroutine(_target, **kwargs):
+    return asyncio.run(_target(**kwargs))
+
+# Event keyword values of these types are passed to every listener without copying
+_IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None), frozenset)
+
+# Returns the names of the arguments a function takes, without 'self'
+# Wrappers are not looked through, it is the wrapper that gets called.
+def _argument_names(obj):
+    return frozenset(name for name, p in inspect.signature(obj, follow_wrapped=False).parameters.items()
+                     if name != 'self' and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY))
 
 class EventHost:
     class callback:
-        def __init__(self, target, prefilter, preprocessor):
+        def __init__(self, target, prefilter, preprocessor, route=None, owner=None):
             self.target = target
             self.prefilter = prefilter
             self.preprocessor = preprocessor
+            self.route = route
+            # The plugin that added the listener, its running handlers are tracked under it. Not compared.
+            self.owner = owner
+            self.is_coroutine = inspect.iscoroutinefunction(target)
 
-        def check_args_helper(self, obj, event_prototype):
+        def check_args_helper(self, obj, event_signature):
             if obj == None:
                 return
 
-            args = inspect.getargspec(obj).args
+            args = _argument_names(obj)
 
-            if 'self' in args:
-                args.remove('self')
-
-            if sorted(args) != sorted(inspect.getargspec(event_prototype).args):
+            if args != event_signature:
                 raise Exception("Event handler {} parameter mismatch: expected {}, got {}.".format(obj,
-                    inspect.getargspec(event_prototype).args, args))
+                    sorted(event_signature), sorted(args)))
 
         # check for matching argument lists
-        def check_args(self, event_prototype):
-            self.check_args_helper(self.target, event_prototype)
-            self.check_args_helper(self.prefilter, event_prototype)
-            self.check_args_helper(self.preprocessor, event_prototype)
+        # event_signature is the frozenset of argument names of the event prototype
+        def check_args(self, event_signature):
+            self.check_args_helper(self.target, event_signature)
+            self.check_args_helper(self.prefilter, event_signature)
+            self.check_args_helper(self.preprocessor, event_signature)
 
         def __eq__(self, other):
             return hash(self) == hash(other)
 
         def __hash__(self):
-            return hash((self.target, self.prefilter, self.preprocessor))
+            return hash((self.target, self.prefilter, self.preprocessor, self.route))
 
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, executor=None, submit_timeout=None, validate=__debug__, inflight=None, profiler=None):
         # per-event list of callbacks
         # _events[event_name] = [callback1, callback2, ...]
         self._events = dict()
@@ -49,6 +69,21 @@ class EventHost:
         # probably a dumb way to implement this
         self._event_prototypes = dict()
 
+        # per-event frozenset of the argument names of the prototype, computed once in create_event
+        self._event_signatures = dict()
+
+        # Whether fire_event compares its keywords to the signature of the event.
+        # Off by default when running optimized (python3 -O).
+        self._validate = validate
+
+        # per-event router and index of callbacks by route
+        # a router is called once per fire_event with the event kwargs and returns a route (or None).
+        # Only callbacks without a route and the callbacks registered for that route are considered.
+        # _routers[event_name] = router
+        # _routes[event_name] = {None: [callback1, ...], route: [callback2, ...], ...}
+        self._routers = dict()
+        self._routes = dict()
+
         # per-event list of callbacks for unavailable events (e.g not yet created)
         # when an event becomes available (e.g created), transfer all callbacks from
         #   waitingHandlers[] to events[]
@@ -59,94 +94,174 @@ class EventHost:
 
         if self._logger == None:
             class mocklogger:
-                def write(self, message):
+                def write(self, message, *args):
                     pass
 
             self._logger = mocklogger()
 
+        # Optional libs.workerpool.WorkerPool. If set, callbacks are run by the pool,
+        # otherwise every callback gets a thread of its own. fire_event returns futures either way.
+        self._executor = executor
+        self._submit_timeout = submit_timeout
+
+        # Optional libs.inflight.InFlight that every future returned by fire_event is added to
+        self._inflight = inflight
+
+        # Optional libs.profiler.Profiler that may wrap the handlers while it profiles
+        self._profiler = profiler
+
+        # asyncio event loop that coroutine handlers (async def) are scheduled on, if any.
+        # Without a loop they are run to completion like any other handler.
+        self._loop = None
+
+    def set_loop(self, loop):
+        self._loop = loop
+
+    # Returns the keywords to give the listeners, and the names of the keywords whose values have to be
+    # deep copied for every listener. Immutable values and values that can be frozen (like JanteMessage,
+    # with freeze(), is_frozen() and clone()) are shared by all listeners. The listeners get a frozen
+    # clone, the caller keeps its own object to change. A listener that wants to change a frozen value
+    # has to change a clone of it.
+    def _share_keywords(self, kwargs):
+        shared = dict(kwargs)
+        unshared = list()
+        for key, value in kwargs.items():
+            if isinstance(value, _IMMUTABLE_TYPES):
+                continue
+
+            if getattr(value, 'freeze', None) != None:
+                if not value.is_frozen():
+                    shared[key] = value.clone()
+                    shared[key].freeze()
+            else:
+                unshared.append(key)
+        return shared, unshared
+
+    def _log_failure(self, future):
+        if future.cancelled():
+            return
+        e = future.exception()
+        if e != None:
+            self._logger.write('Event handler raised an exception:\n{}'.format(
+                ''.join(traceback.format_exception(type(e), e, e.__traceback__))))
+
+    def shutdown(self):
+        if self._executor != None:
+            self._executor.shutdown()
+
     # add a callback as a waiting listener
-    def _add_waiting_event_listener(self, event_name, target, prefilter=None, preprocessor=None):
+    def _add_waiting_event_listener(self, event_name, cb):
         with self._events_mutex:
             # if the given event has no waiting list, create it
             if not event_name in self._waitingEventListeners:
                 self._waitingEventListeners[event_name] = list()
 
-            self._waitingEventListeners[event_name] += [EventHost.callback(target, prefilter,
-                preprocessor)]
+            self._waitingEventListeners[event_name] += [cb]
+
+    # add a callback to an existing event, _events_mutex must be held
+    def _add_active_event_listener(self, event_name, cb):
+        cb.check_args(self._event_signatures[event_name])
+
+        if __debug__:
+            self._logger.write('New event listener: {} -> {}.'.format(event_name, cb.target))
+
+        self._events[event_name] += [cb]
+        self._routes[event_name].setdefault(cb.route, list()).append(cb)
 
     # create an event
-    def create_event(self, event_name, prototype):
-        for arg in inspect.getargspec(prototype).args:
+    def create_event(self, event_name, prototype, router=None):
+        """
+        router is an optional function taking the same keywords as the prototype. It is called once
+        every time the event is fired and returns the route of the event, or None.
+        """
+        signature = _argument_names(prototype)
+
+        for arg in signature:
             if arg[0] == '_':
                 raise Exception("Event keywords must not contain leading underscore: \"{}.{}\".".format(event_name, arg))
 
         with self._events_mutex:
             self._logger.write('Event created: {}'.format(event_name))
             self._events[event_name] = list()
+            self._routes[event_name] = {None: list()}
+            self._routers[event_name] = router
             self._event_prototypes[event_name] = prototype
+            self._event_signatures[event_name] = signature
 
             # transfer any waiting handlers
             if event_name in self._waitingEventListeners:
                 for cb in self._waitingEventListeners[event_name]:
-                    self.add_event_listener(event_name, cb.target, cb.prefilter, cb.preprocessor)
+                    self._add_active_event_listener(event_name, cb)
 
                 del self._waitingEventListeners[event_name]
 
     # destroy an event
     def destroy_event(self, event_name):
         with self._events_mutex:
-            events_names = list(self._events[event_name])
-            
+            if not event_name in self._events:
+                return
+
+            callbacks = self._events[event_name]
+
+            del self._events[event_name]
+            del self._routes[event_name]
+            del self._routers[event_name]
+            del self._event_prototypes[event_name]
+            del self._event_signatures[event_name]
+
         self._logger.write('Event destroyed: {}.'.format(event_name))
 
         # transfer any active listeners
-        # TODO possible race conditions
-        if event_name in self._events:
-            for cb in event_names:
-                self._add_waiting_event_listener(event_name, cb.target, cb.prefilter,
-                        cb.preprocessor)
-            
-            with self._events_mutex:
-                del self._events[event_name]
-                del self._event_prototypes[event_name]
+        for cb in callbacks:
+            self._add_waiting_event_listener(event_name, cb)
 
     # register a callback for an event
-    def add_event_listener(self, event_name, target, prefilter=None, preprocessor=None):
+    def add_event_listener(self, event_name, target, prefilter=None, preprocessor=None, route=None, owner=None):
+        """
+        If route is given the callback is only considered when the router of the event returns that route.
+        owner is the name of the plugin adding the listener, see libs.inflight.InFlight.add.
+        """
+        cb = EventHost.callback(target, prefilter, preprocessor, route, owner)
         self._events_mutex.acquire()
         
         if not event_name in self._events:
             self._events_mutex.release()
-            self._add_waiting_event_listener(event_name, target, prefilter, preprocessor)
+            self._add_waiting_event_listener(event_name, cb)
         else:
-            cb = EventHost.callback(target, prefilter, preprocessor)
-            cb.check_args(self._event_prototypes[event_name])
-
-            if __debug__:
-                self._logger.write('New event listener: {} -> {}.'.format(event_name, target))
+            try:
+                self._add_active_event_listener(event_name, cb)
+            finally:
+                self._events_mutex.release()
 
-
-            self._events[event_name] += [cb]
-            self._events_mutex.release()
     # unregister a callback for an event
-    def remove_event_listener(self, event_name, target, prefilter=None, preprocessor=None):
-        cb = EventHost.callback(target, prefilter, preprocessor)
+    def remove_event_listener(self, event_name, target, prefilter=None, preprocessor=None, route=None):
+        cb = EventHost.callback(target, prefilter, preprocessor, route)
 
         with self._events_mutex:
             if event_name in self._events and cb in self._events[event_name]:
                 self._events[event_name].remove(cb)
+                self._routes[event_name][route].remove(cb)
+                if route != None and len(self._routes[event_name][route]) == 0:
+                    del self._routes[event_name][route]
+
+    # returns True if the event exists and has at least one listener
+    def has_listeners(self, event_name):
+        with self._events_mutex:
+            return event_name in self._events and len(self._events[event_name]) > 0
 
     # fire an event
-    def fire_event(self, _event_name, _eventLogEnabled=True, **kwargs):
+    # _routed_only skips the listeners without a route, used to shed load
+    def fire_event(self, _event_name, _eventLogEnabled=True, _routed_only=False, **kwargs):
         with self._events_mutex:
             if not _event_name in self._events:
                 raise Exception("No such event \"{}\".".format(_event_name))
 
-            # inspect parameters supplied to fire_event, comparing them to registered prototype
-            protoargs = inspect.getargspec(self._event_prototypes[_event_name]).args
-            missing = [val for val in protoargs if val not in kwargs.keys()]
-            superfluous = [val for val in kwargs.keys() if val not in protoargs]
+            # compare parameters supplied to fire_event to the signature of the registered prototype
+            signature = self._event_signatures[_event_name]
 
-            if len(missing) > 0 or len(superfluous) > 0:
+            if self._validate and kwargs.keys() != signature:
+                missing = sorted(signature - kwargs.keys())
+                superfluous = sorted(kwargs.keys() - signature)
                 message = list()
 
                 if len(missing) > 0:
@@ -158,20 +273,51 @@ class EventHost:
                 raise Exception("fire_event({}) error: {}.".format(_event_name, ", ".join(message)))
 
             if _eventLogEnabled:
-                self._logger.write('Firing event: {}.'.format(_event_name))
-
-            newthreads = list()
-
-            # run each callback in a new thread
-            for cb in self._events[_event_name]:
-                if cb.prefilter == None or cb.prefilter(**kwargs) == True:
-                    args = copy.deepcopy(kwargs)
-
-                    if cb.preprocessor != None:
-                        args = cb.preprocessor(**args)
-
-                    t = threading.Thread(target=cb.target, kwargs=args, name="{} - {}".format(_event_name, cb.target))
-                    t.start()
-                    newthreads.append(t)
-
-            return newthreads
+                self._logger.write('Firing event: {}.', _event_name)
+
+            router = self._routers[_event_name]
+            routes = self._routes[_event_name]
+
+            callbacks = [] if _routed_only else list(routes[None])
+            if router != None:
+                route = router(**kwargs)
+                if route != None and route in routes:
+                    callbacks += routes[route]
+
+        newwork = list()
+
+        if len(callbacks) > 0:
+            kwargs, unshared = self._share_keywords(kwargs)
+
+        # run each callback in the worker pool, or in a new thread if there is no pool.
+        # coroutine callbacks are scheduled on the event loop if there is one.
+        for cb in callbacks:
+            if cb.prefilter == None or cb.prefilter(**kwargs) == True:
+                args = dict(kwargs)
+                for key in unshared:
+                    args[key] = copy.deepcopy(kwargs[key])
+
+                if cb.preprocessor != None:
+                    args = cb.preprocessor(**args)
+
+                target = cb.target
+                loop = self._loop
+                if cb.is_coroutine and loop != None:
+                    future = asyncio.run_coroutine_threadsafe(cb.target(**args), loop)
+                else:
+                    if cb.is_coroutine:
+                        target = functools.partial(_run_coroutine, cb.target)
+                    elif self._profiler != None and self._profiler.active():
+                        target = self._profiler.wrap(target, cb.target)
+
+                    if self._executor != None:
+                        future = self._executor.submit(_event_name, target, args, timeout=self._submit_timeout)
+                    else:
+                        future = run_in_thread(target, args, "{} - {}".format(_event_name, cb.target))
+
+                future.add_done_callback(self._log_failure)
+                if self._inflight != None:
+                    self._inflight.add(future, _event_name, cb.target, plugin=cb.owner)
+                newwork.append(future)
+
+        return newwork
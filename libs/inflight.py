@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keeps track of the event handlers and jobs that are running.
+
+Work is added as a concurrent.futures.Future and removed by its completion callback, so nothing
+has to be pruned. join() blocks on a condition variable until the work is done instead of polling.
+"""
+
+import time
+import inspect
+import threading
+import collections
+import concurrent.futures
+
+def settle(future, result):
+    """
+    Sets the result of future. A handler that hands its work off (e.g to a worker process) returns
+    a future of its own, future is then done when that one is, without holding the thread meanwhile.
+    """
+    if not isinstance(result, concurrent.futures.Future):
+        future.set_result(result)
+        return
+
+    def done(handed_off):
+        # future is running already and can not be cancelled
+        if handed_off.cancelled():
+            future.set_exception(concurrent.futures.CancelledError())
+        elif handed_off.exception() != None:
+            future.set_exception(handed_off.exception())
+        else:
+            future.set_result(handed_off.result())
+    result.add_done_callback(done)
+
+def run_in_thread(target, kwargs, name):
+    """
+    Runs target(**kwargs) in a thread of its own. Returns a future for the result, see settle().
+    """
+    future = concurrent.futures.Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            settle(future, target(**kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name).start()
+    return future
+
+def describe(target):
+    """
+    Returns (plugin, handler) names for a callable. Wrappers made with functools.wraps are looked through.
+    """
+    target = inspect.unwrap(target)
+
+    owner = getattr(target, '__self__', None)
+    if owner != None:
+        plugin = type(owner).__name__
+        return plugin, '{}.{}'.format(plugin, target.__name__)
+
+    name = getattr(target, '__qualname__', str(target))
+    return getattr(target, '__module__', None) or name, name
+
+class InFlight:
+    class work:
+        def __init__(self, future, event, plugin, handler):
+            self.future = future
+            self.event = event
+            self.plugin = plugin
+            self.handler = handler
+            self.started = time.monotonic()
+
+        def age(self):
+            return time.monotonic() - self.started
+
+        def __str__(self):
+            return '{} for "{}" (running for {:.1f}s)'.format(self.handler, self.event, self.age())
+
+    def __init__(self, metrics=None):
+        """
+        metrics - Optional libs.metrics.Metrics. If set, the time each piece of work took is observed
+                  as "event.<event>" and "listener.<handler>", and failures are counted as "errors.<handler>".
+        """
+        self._work = dict()
+        self._condition = threading.Condition()
+        self._metrics = metrics
+
+    def add(self, future, event, target=None, name=None, plugin=None):
+        """
+        Tracks a future until it is done. The handler is named after target (see describe()) or name.
+        plugin is who the work belongs to, by default it is described from target.
+        Returns the future.
+        """
+        if target != None:
+            described, handler = describe(target)
+        else:
+            described, handler = None, name if name != None else event
+        plugin = plugin if plugin != None else described
+
+        with self._condition:
+            self._work[future] = InFlight.work(future, event, plugin, handler)
+
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._condition:
+            work = self._work.pop(future)
+            self._condition.notify_all()
+
+        if self._metrics != None:
+            age = work.age()
+            self._metrics.observe('event.{}'.format(work.event), age)
+            self._metrics.observe('listener.{}'.format(work.handler), age)
+            if not future.cancelled() and future.exception() != None:
+                self._metrics.increment('errors.{}'.format(work.handler))
+
+    def get(self, future):
+        """
+        Returns what is known about the work of a future, None if it is done.
+        """
+        with self._condition:
+            return self._work.get(future)
+
+    def __len__(self):
+        with self._condition:
+            return len(self._work)
+
+    def running(self, plugins=None):
+        """
+        Returns the work that is not done, the oldest first.
+        Only the work of the given plugins if <plugins> is a collection of plugin names.
+        """
+        with self._condition:
+            return sorted(self._select(plugins), key=lambda w: w.started)
+
+    # _condition must be held
+    def _select(self, plugins):
+        if plugins == None:
+            return list(self._work.values())
+        return [w for w in self._work.values() if w.plugin in plugins]
+
+    def count_by_event(self):
+        with self._condition:
+            return collections.Counter(w.event for w in self._work.values())
+
+    def count_by_plugin(self):
+        with self._condition:
+            return collections.Counter(w.plugin for w in self._work.values() if w.plugin != None)
+
+    def wait_below(self, count, timeout=None):
+        """
+        Blocks until less than count pieces of work are running or the timeout runs out.
+        Returns True if they are.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self._work) < count, timeout)
+
+    def join(self, timeout=None, plugins=None):
+        """
+        Blocks until all work (or all work of the given plugins) is done or the timeout runs out.
+        Returns True if the work is done.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self._select(plugins)) == 0, timeout)
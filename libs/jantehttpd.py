@@ -4,7 +4,7 @@
 import threading
 import re
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import urllib.parse
 import hashlib
 import random
@@ -123,7 +123,9 @@ class WebJanteRequestHandler(BaseHTTPRequestHandler):
 
 class JanteHTTPD:
     def __init__(self, port, password, requestcallback, logger, _keyfile='ssl/key.pem', _certfile='ssl/cert.pem'):
-        self.httpd = HTTPServer(('', port), WebJanteRequestHandler)
+        # Every request is handled in a thread of its own, so a slow route (e.g /profile) does not block the others
+        self.httpd = ThreadingHTTPServer(('', port), WebJanteRequestHandler)
+        self.httpd.daemon_threads = True
         self.httpd.socket = ssl.wrap_socket(self.httpd.socket, keyfile=_keyfile, certfile=_certfile, server_side=True)
         self.httpd.jantehttpd = self
 
@@ -8,13 +8,16 @@ from abc import ABCMeta, abstractmethod
 import threading
 import libs
 
-import datetime
-import sys
+import asyncio
+
+from ..jantelog import LogWriter
 
 class BasicIO:
     def __init__(self, bot):
         self._bot = bot
         self._mutex = threading.Lock()
+        self._log_writer = None
+        self._log_closed = False
     # Sends a message to the recipient
     
     @abstractmethod
@@ -25,22 +28,37 @@ class BasicIO:
     @abstractmethod
     def recieve(self):
         pass
+
+    # Used by the asyncio core. IOs with a native asyncio client should override these,
+    # by default the blocking methods are run in the event loop's default executor.
+    async def async_send(self, message):
+        return await asyncio.get_running_loop().run_in_executor(None, self.send, message)
+
+    async def async_recieve(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.recieve)
         
-    def log(self, text):
-        text = str(text)
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")#datetime.datetime.now().strftime('%H:%M')
-        splittext = text.split("\n") 
-        splittext = list(filter(None,splittext))
-        ans = "{}\n".format(timestamp)
-        #sys.stderr.write(str(splittext))
-        for t in splittext:
-            ans += "{}{}\n".format((len(timestamp) + 1) * " ", t)
+    def _get_log_writer(self):
+        with self._mutex:
+            if self._log_writer == None:
+                self._log_writer = LogWriter.from_config(self._bot.get_config())
+                if self._log_closed:
+                    self._log_writer.close()
+            return self._log_writer
+
+    # Only queues the text, it is formatted with args and written by a background thread
+    def log(self, text, *args):
+        self._get_log_writer().write(text, args)
+
+    # Closing is for good, later texts are written by the caller (see LogWriter.write)
+    def close_log(self):
         with self._mutex:
-            sys.stderr.write(ans)
-        sys.stderr.flush()
+            self._log_closed = True
+            writer = self._log_writer
+        if writer != None:
+            writer.close()
 
     def error(self, message):
-        return self.log("ERROR:" + message)
+        return self.log("ERROR:{}", message)
     
     def exit(self, quitmessage):
         pass
@@ -5,8 +5,12 @@
 from .localio import LocalIO
 from .localcursesio import LocalCursesIO
 from .testingio import TestingIO
+from .. import jantelog
 
 import traceback
+import threading
+import asyncio
+import queue
 import sys
 
 def missing_io(name):
@@ -33,34 +37,169 @@ except:
 class IOManager:
     """
     Wrapper for the different IO classes. Mainly to remove io imports and creation from bot.py
+
+    Can run several IOs (backends) at once, e.g IRC and XMPP in one bot that loads its plugins and
+    data once. Every backend then reads messages in a thread of its own. Received messages are
+    tagged with the name of their backend and responses to them are sent through it, messages
+    without a (known) backend go through the first one. A send_to_all message without a backend
+    is sent through every backend, see expand(). Logging goes through the first backend.
     """
-    def __init__(self, type_, bot): 
-        """
-        type_ is a string describing the IO
+    # Longest time recieve() blocks when there are several backends, so the bot notices that it is shut down
+    RECIEVE_TIMEOUT = 0.1
+    # Seconds a backend thread waits after its first failed read, doubled for every failure in a row
+    RETRY_DELAY = 0.1
+    MAX_RETRY_DELAY = 30.0
 
+    def __init__(self, types, bot): 
+        """
+        types is a string describing the IO, or a list of them to run several backends.
+        A backend is named after its type, or "type:name" names it, e.g to run two IOs of the same type.
+        None is the TestingIO.
         """
         self._bot = bot
+        self._log_level = jantelog.level_from_name(
+                bot.get_config().get('logging', 'level', fallback='info'))
+
+        if not type(types) == list:
+            types = [types]
+
+        # Backends by name, in the order they were given
+        self._ios = dict()
+        for spec in types:
+            type_, _, name = (spec if spec != None else "testing").partition(":")
+            name = name if name != "" else type_
+            if name in self._ios:
+                raise ValueError('Two IO backends are named "{}", name them with "type:name".'.format(name))
+            self._ios[name] = self._create(type_)
+
+        self._names = list(self._ios)
+        self._type = self._names[0]
+        self._io = self._ios[self._type]
+
+        # Messages read by the backend threads, when there are several backends
+        self._inbound = queue.Queue()
+        self._threads = None
+        self._stopped = threading.Event()
+        self._mutex = threading.Lock()
+
+    def _create(self, type_):
         if type_ == "xmpp":
-            self._io = janteio.xmpp.xmppio.XMPPIO(self._bot)
+            return janteio.xmpp.xmppio.XMPPIO(self._bot)
         elif type_ == "irc":
-            self._io = janteio.ircio.IRCIO(self._bot)
+            return janteio.ircio.IRCIO(self._bot)
         elif type_ == "old":
-            self._io = LocalIO(self._bot)
+            return LocalIO(self._bot)
         elif type_ == "local":
-            self._io = LocalCursesIO(self._bot)
+            return LocalCursesIO(self._bot)
         elif type_ == "discord": 
-            self._io = janteio.discord.discordio.discordIO(self._bot)
-        elif type_ == None:
-            self._io = TestingIO(self._bot) 
+            return janteio.discord.discordio.discordIO(self._bot)
+        elif type_ == "testing":
+            return TestingIO(self._bot) 
         else:
-            self._io = LocalCursesIO(self._bot)
-    def log(self, text):
-        self._io.log(text)
+            return LocalCursesIO(self._bot)
+    def get_type(self):
+        """
+        Name of the first backend.
+        """
+        return self._type
+    def get_types(self):
+        return list(self._names)
+    def is_logging(self, level):
+        return level >= self._log_level
+    def log(self, text, *args, level=jantelog.INFO):
+        """
+        text is formatted with args by the IO, only if the level is logged.
+        """
+        if level >= self._log_level:
+            self._io.log(text, *args)
+    def _read(self, name, io):
+        delay = IOManager.RETRY_DELAY
+        while not self._stopped.is_set():
+            try:
+                message = io.recieve()
+            except:
+                self._io.error("IO backend {} failed to recieve, retrying in {:.1f}s:\n{}".format(name, delay, traceback.format_exc()))
+                # A backend that keeps failing must not spin or flood the log
+                self._stopped.wait(delay)
+                delay = min(delay * 2, IOManager.MAX_RETRY_DELAY)
+                continue
+            delay = IOManager.RETRY_DELAY
+            if message != None:
+                message.set_backend(name)
+                self._inbound.put(message)
+    def _start_threads(self):
+        with self._mutex:
+            if self._threads != None:
+                return
+            self._threads = []
+            for name, io in self._ios.items():
+                t = threading.Thread(target=self._read, args=(name, io), name="Recieve {} - Reads messages from the backend".format(name), daemon=True)
+                t.start()
+                self._threads.append(t)
     def recieve(self):
-        return self._io.recieve()
+        if len(self._names) == 1:
+            message = self._io.recieve()
+            if message != None:
+                message.set_backend(self._type)
+            return message
+
+        self._start_threads()
+        try:
+            return self._inbound.get(timeout=IOManager.RECIEVE_TIMEOUT)
+        except queue.Empty:
+            return None
+    def backend_of(self, message):
+        """
+        Name of the backend the message is sent through, the first one if it has none or an unknown one.
+        """
+        backend = message.get_backend()
+        return backend if backend in self._ios else self._type
+    def expand(self, message):
+        """
+        Returns the messages to send for a message, each with the backend it is sent through.
+        A send_to_all message without a backend gets a copy for every backend.
+        """
+        if message.get_backend() == None and message.get_send_to_all() and not message.is_internal() and len(self._names) > 1:
+            copies = [message.clone() for _ in self._names[1:]]
+            for backend, m in zip(self._names, [message] + copies):
+                m.set_backend(backend)
+            return [message] + copies
+
+        backend = self.backend_of(message)
+        if message.get_backend() != backend:
+            message.set_backend(backend)
+        return [message]
+    def _route(self, message):
+        return self._ios.get(message.get_backend(), self._io)
     def send(self, message):
-        return self._io.send(message)
+        return self._route(message).send(message)
+    async def async_recieve(self):
+        if len(self._names) == 1:
+            message = await self._io.async_recieve()
+            if message != None:
+                message.set_backend(self._type)
+            return message
+        # The backends are read by their threads, wait for one of them without blocking the loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.recieve)
+    async def async_send(self, message):
+        return await self._route(message).async_send(message)
+    def get_io(self, name=None):
+        """
+        The backend with the given name, the first one by default.
+        """
+        return self._io if name == None else self._ios[name]
+    def stop(self):
+        """
+        Stops the threads reading the backends. They finish after their current read.
+        """
+        self._stopped.set()
     def exit(self, message):
-        return self._io.exit(message)
+        for io in self._ios.values():
+            io.exit(message)
+    def close_log(self):
+        for io in self._ios.values():
+            close_log = getattr(io, 'close_log', None)
+            if close_log != None:
+                close_log()
     def error(self, message):
         return self._io.error(message)
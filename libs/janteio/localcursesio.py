@@ -12,6 +12,7 @@ import traceback
 from .basicio import BasicIO
 
 from ..jantemessage import JanteMessage
+from ..jantelog import format_text
 
 KEY_ESCAPE = '\x1b'
 KEY_BACKSPACE = 263
@@ -176,7 +177,8 @@ class LocalCursesIO(BasicIO):
         with self.output_buffer_mutex:
             for line in ('ERROR:' + str(text).strip()).split('\n'):
                 self.output_buffer.append(line)
-    def log(self, text):
+    def log(self, text, *args):
+        text = format_text(text, args)
         with self.output_buffer_mutex:
-            for line in ('LOG:' + str(text).strip()).split('\n'):
+            for line in ('LOG:' + text.strip()).split('\n'):
                 self.output_buffer.append(line)
@@ -9,6 +9,8 @@ import time
 
 from .basicio import BasicIO
 
+from ..jantelog import format_text
+
 from ..jantemessage import JanteMessage
 
 class LocalIO(BasicIO):
@@ -33,7 +35,8 @@ class LocalIO(BasicIO):
         time.sleep(1)
         return JanteMessage(input(""), str(os.environ.get('USER')), "#Local", "#Local")
 
-    def log(self, message):
+    def log(self, message, *args):
+        message = format_text(message, args)
         with self._mutex:
             sys.stdout.write("\n")
             sys.stderr.write("LOG:{}\n".format(message))
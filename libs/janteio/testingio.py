@@ -1,10 +1,37 @@
 from .basicio import BasicIO
 import sys
+import queue
+import collections
 
 class TestingIO(BasicIO):
+    # Longest time recieve() blocks, so the bot notices that it is shut down
+    RECIEVE_TIMEOUT = 0.1
+
+    # Number of sent messages that are kept, see get_sent()
+    SENT_SIZE = 100
+
     def __init__(self, bot):
         super().__init__(bot)
-    def log(self, text):
+        self._inbound = queue.Queue()
+        self._sent = collections.deque(maxlen=TestingIO.SENT_SIZE)
+    def inject(self, message):
+        """
+        Makes recieve() return the message, as if it was read from a chat.
+        """
+        self._inbound.put(message)
+    def send(self, message):
+        self._sent.append(message)
+    def get_sent(self):
+        """
+        The last messages that were sent through this IO.
+        """
+        return list(self._sent)
+    def recieve(self):
+        try:
+            return self._inbound.get(timeout=TestingIO.RECIEVE_TIMEOUT)
+        except queue.Empty:
+            return None
+    def log(self, text, *args):
         pass
     def error(self, text):
         sys.stderr.write(text)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Logging for the IOs.
+
+Log calls only put the text (and the arguments to format it with) on a queue, a background
+thread formats and writes the lines in batches and flushes once per batch. The log can also be
+written to a file that is rotated when it grows too large (file, file.1, file.2, ...). Once the
+writer is closed, texts are written right away by the caller.
+
+Levels are checked before anything is formatted:
+
+    if bot.is_logging(jantelog.DEBUG): ...
+    bot.debug('Sending message to "{}"', address)   # only formatted if debug is logged
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import datetime
+import threading
+
+DEBUG = 10
+INFO = 20
+ERROR = 40
+
+_LEVELS = {'debug': DEBUG, 'info': INFO, 'error': ERROR}
+
+def level_from_name(name):
+    """
+    Returns the level called <name> (debug, info or error).
+    """
+    return _LEVELS[name.strip().lower()]
+
+def format_text(text, args=()):
+    """
+    Formats a log text with its arguments, text.format(*args).
+    """
+    text = str(text)
+    if len(args) == 0:
+        return text
+    try:
+        return text.format(*args)
+    except Exception:
+        # Whatever the arguments do when formatted, it must not stop the writer thread
+        return "{} {}".format(text, args)
+
+class LogWriter:
+    def __init__(self, stream=None, filename=None, max_bytes=1024 * 1024, backup_count=3, batch_size=256):
+        """
+        stream          - Written to, defaults to stderr.
+        filename        - Also written to if given, rotated when it grows past <max_bytes>.
+        backup_count    - Number of rotated files that are kept.
+        batch_size      - Most records written at once.
+        """
+        self._stream = stream if stream != None else sys.stderr
+        self._filename = filename
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._batch_size = batch_size
+        self._file = None
+
+        # Formatting the timestamp is only done once a minute
+        self._minute = None
+        self._timestamp = None
+
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        # Taken by the writer thread and by the callers that write after close()
+        self._mutex = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="LogWriter - Writes the log")
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def from_config(config):
+        """
+        Creates a writer from the [logging] section of the bot settings.
+        """
+        filename = config.get('logging', 'file', fallback='').strip()
+        return LogWriter(filename=filename if filename != '' else None,
+                         max_bytes=config.getint('logging', 'max_bytes', fallback=1024 * 1024),
+                         backup_count=config.getint('logging', 'backup_count', fallback=3),
+                         batch_size=config.getint('logging', 'batch_size', fallback=256))
+
+    def write(self, text, args=()):
+        """
+        Queues a text to be formatted with args and written. Never blocks, unless the writer is closed.
+        """
+        if not self._closed:
+            self._queue.put((time.time(), text, args))
+        else:
+            # Written at once, e.g the last lines of a shutdown. The writer thread may still be busy
+            # with what was queued before, the mutex keeps the lines whole.
+            with self._mutex:
+                self._emit(self._format((time.time(), text, args)))
+                self._close_file()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until everything written so far is written out.
+        """
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _format(self, record):
+        t, text, args = record
+
+        minute = int(t // 60)
+        if minute != self._minute:
+            self._minute = minute
+            self._timestamp = datetime.datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M")
+
+        indent = (len(self._timestamp) + 1) * " "
+        lines = [line for line in format_text(text, args).split("\n") if line != ""]
+        return "{}\n{}".format(self._timestamp, "".join("{}{}\n".format(indent, line) for line in lines))
+
+    def _open(self):
+        if self._file == None:
+            self._file = open(self._filename, 'ab')
+        return self._file
+
+    def _close_file(self):
+        if self._file != None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+
+        for i in range(self._backup_count - 1, 0, -1):
+            source = "{}.{}".format(self._filename, i)
+            if os.path.exists(source):
+                os.replace(source, "{}.{}".format(self._filename, i + 1))
+
+        if self._backup_count > 0:
+            os.replace(self._filename, "{}.1".format(self._filename))
+        else:
+            os.remove(self._filename)
+
+    def _emit(self, text):
+        try:
+            self._stream.write(text)
+            self._stream.flush()
+        except (OSError, ValueError):
+            pass
+
+        if self._filename == None:
+            return
+
+        data = text.encode('utf-8')
+        try:
+            f = self._open()
+            if f.tell() > 0 and f.tell() + len(data) > self._max_bytes:
+                self._rotate()
+                f = self._open()
+            f.write(data)
+            f.flush()
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [r for r in batch if type(r) == tuple]
+            if len(records) > 0:
+                with self._mutex:
+                    self._emit("".join(map(self._format, records)))
+
+            for r in batch:
+                if isinstance(r, threading.Event):
+                    r.set()
+
+            if None in batch:
+                with self._mutex:
+                    self._close_file()
+                return
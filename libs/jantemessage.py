@@ -6,7 +6,11 @@ Used to send messages within Jante. Contains information about who sent the mess
 
 Remade to be PEP8 compliant on 2019-05-17
 """
-import copy
+class FrozenMessageError(AttributeError):
+    """
+    Raised when a frozen message is changed. Clone the message and change the clone instead.
+    """
+    pass
 
 class JanteMessage():
     """
@@ -20,14 +24,19 @@ class JanteMessage():
         address         - Address of the sender. Internal messages are sent with a tuple instead of a string.
         is_in_group     - Is the message from a groupchat?
         send_to_all     - Should the message be sent to all channels?
+
+    A message handed to event listeners is frozen so all listeners can share it without copying.
+    Listeners that want to change it have to change a clone().
     """
-    def __init__(self, text="", sender="", recipient="", address="", is_in_group=True, send_to_all=False):
+    __slots__ = ('_text', '_sender', '_recipient', '_address', '_is_in_group', '_send_to_all',
+                 '_alias', '_alias_resolver', '_frozen', '_received', '_trace', '_backend')
 
-        assert type(text) == str or issubclass(type(text), BaseException) , "'text' must be of type string or exception."
-        assert type(sender) == str, "'sender' must be of type string."
-        assert type(recipient) == str, "'recipient' must be of type string."
-        assert type(is_in_group) == bool, "'is_in_group' must be of type bool"
-        assert type(send_to_all) == bool, "'send_to_all' must be of type bool"
+    def __init__(self, text="", sender="", recipient="", address="", is_in_group=True, send_to_all=False):
+        if __debug__:
+            # One cheap check for the common case, _check_types tells what was wrong
+            if not (type(sender) is str and type(recipient) is str and type(is_in_group) is bool
+                    and type(send_to_all) is bool and (type(text) is str or isinstance(text, BaseException))):
+                JanteMessage._check_types(text, sender, recipient, is_in_group, send_to_all)
 
         self._text = text
         self._sender = sender
@@ -36,6 +45,36 @@ class JanteMessage():
         self._is_in_group = is_in_group
         self._send_to_all = send_to_all
         self._alias = None
+        self._alias_resolver = None
+        self._frozen = False
+        # time.monotonic() when the bot read the message that this message is (a response to) from the IO
+        self._received = None
+        # Id of the libs.tracing trace of the message it is (a response to), or None
+        self._trace = None
+        # Name of the IO backend the message (it is a response to) was read from, see IOManager
+        self._backend = None
+
+    @staticmethod
+    def _check_types(text, sender, recipient, is_in_group, send_to_all):
+        assert type(text) == str or issubclass(type(text), BaseException) , "'text' must be of type string or exception."
+        assert type(sender) == str, "'sender' must be of type string."
+        assert type(recipient) == str, "'recipient' must be of type string."
+        assert type(is_in_group) == bool, "'is_in_group' must be of type bool"
+        assert type(send_to_all) == bool, "'send_to_all' must be of type bool"
+
+    def freeze(self):
+        """
+        Makes the message read only. Returns the message.
+        """
+        self._frozen = True
+        return self
+
+    def is_frozen(self):
+        return self._frozen
+
+    def _check_mutable(self):
+        if self._frozen:
+            raise FrozenMessageError("The message is frozen, change a clone() of it instead.")
     
     def is_internal(self):
         """
@@ -44,46 +83,159 @@ class JanteMessage():
         return type(self._address) == tuple
     
     def set_text(self, text):
+        self._check_mutable()
         assert type(text) == str, "'text' must be of type string"
         self._text = text
         return self
         
     def set_alias(self, alias):
+        self._check_mutable()
         self._alias = alias
+        self._alias_resolver = None
+        return self
+
+    def set_alias_resolver(self, resolver):
+        """
+        Lets the alias be looked up the first time get_alias() is called, by calling resolver(sender).
+        Messages whose alias is never asked for never pay for the lookup.
+        Copies of the message keep the resolver. A pickled message only keeps it if the resolver
+        has a true 'picklable' attribute (see libs.processpool.AliasResolver), else the alias is
+        looked up when the message is pickled.
+        """
+        self._check_mutable()
+        self._alias = None
+        self._alias_resolver = resolver
         return self
         
+    def has_alias(self):
+        """
+        True if the alias is set or will be looked up by get_alias().
+        """
+        return self._alias != None or self._alias_resolver != None
+
     def get_alias(self):
+        # Resolving is allowed on frozen messages, the alias is only looked up late
+        if self._alias_resolver != None:
+            self._alias = self._alias_resolver(self._sender)
+            self._alias_resolver = None
         return self._alias 
         
     def set_recipient(self,recipient):
+        self._check_mutable()
         assert type(recipient) == str, "'recipient' must be of type string."
         self._recipient = recipient
         return self
     def set_sender(self, sender):
+        self._check_mutable()
         assert type(sender) == str, "'user' must be of type string"
         self._sender = sender
         return self
         
     def set_address(self, address):
+        self._check_mutable()
         self._address = address
         return self
         
     def set_is_in_group(self, is_in_group):
+        self._check_mutable()
         assert type(is_in_group) == bool, "'is_in_group' must be of type bool"
         self._is_in_group = is_in_group
         return self
         
     def set_send_to_all(self, send_to_all):
+        self._check_mutable()
         assert type(send_to_all) == bool, "'sendToAll' must be of type bool"
         self._send_to_all = send_to_all
         return self
         
     def respond(self, text, sender):
         m = JanteMessage(text, sender, self._sender, self._address, self._is_in_group, self._send_to_all)
+        m._received = self._received
+        m._trace = self._trace
+        m._backend = self._backend
         return m
 
     def clone(self):
-        return copy.copy(self)
+        """
+        Returns a copy of the message that is not frozen.
+        """
+        m = JanteMessage(self._text, self._sender, self._recipient, self._address, self._is_in_group, self._send_to_all)
+        m._alias = self._alias
+        m._alias_resolver = self._alias_resolver
+        m._received = self._received
+        m._trace = self._trace
+        m._backend = self._backend
+        return m
+
+    def to_tuple(self):
+        """
+        Compact form of the message, see from_tuple(). The alias is resolved.
+        """
+        return (self._text, self._sender, self._recipient, self._address, self._is_in_group,
+                self._send_to_all, self.get_alias())
+
+    @classmethod
+    def from_tuple(cls, data, received=None, trace=None, backend=None):
+        m = cls(*data[:6])
+        m._alias = data[6]
+        m._received = received
+        m._trace = trace
+        m._backend = backend
+        return m
+
+    def __reduce__(self):
+        resolver = self._alias_resolver
+        if resolver != None and not getattr(resolver, 'picklable', False):
+            self.get_alias()
+            resolver = None
+        return (JanteMessage._from_state, ((self._text, self._sender, self._recipient, self._address, self._is_in_group,
+                self._send_to_all, self._alias), resolver, self._received, self._trace, self._backend))
+
+    @classmethod
+    def _from_state(cls, data, resolver, received, trace, backend):
+        m = cls.from_tuple(data, received, trace, backend)
+        m._alias_resolver = resolver
+        return m
+
+    def __deepcopy__(self, memo):
+        # The alias is not looked up for a copy
+        return self.clone()
+
+    def set_received(self, received):
+        """
+        Sets when the message was read from the IO, as time.monotonic(). Responses keep the time.
+        """
+        self._check_mutable()
+        self._received = received
+
+    def get_received(self):
+        return self._received
+
+    def set_trace(self, trace):
+        """
+        Sets the id of the trace of the message, see libs/tracing.py. Responses and clones keep it.
+        """
+        self._check_mutable()
+        self._trace = trace
+
+    def get_trace(self):
+        return self._trace
+
+    def set_backend(self, backend):
+        """
+        Sets the name of the IO backend the message was read from. Responses are sent through the same backend.
+        """
+        self._check_mutable()
+        self._backend = backend
+
+    def get_backend(self):
+        return self._backend
+
+    def get_destination(self):
+        """
+        (backend, address), the same address can mean different chats in different backends.
+        """
+        return (self._backend, self._address)
 
     def get_text(self):
         return self._text
@@ -110,4 +262,4 @@ class JanteMessage():
         return ans
     
     def __repr__(self):
-        return 'jantemessage{}'.format(str(self.__dict__))
+        return 'jantemessage{}'.format(str({name: getattr(self, name) for name in JanteMessage.__slots__}))
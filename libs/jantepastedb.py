@@ -3,7 +3,8 @@
 
 import uuid
 import random
-import time
+
+from libs.clock import Clock
 def smartpost(content, limit=5):
     """
     If the content has fewer rows than the specified limit the function returns 'content' without modifying it.
@@ -53,11 +54,13 @@ class JantePasteDB:
                   # deleting _database[key] (and _ttl[key])
     _last = None
     # keygen = a function that generates "random" keys (names) for pastes
-    def __init__(self, keygen=None):
+    # clock = libs.clock.Clock that the TTLs are measured with, the real time by default
+    def __init__(self, keygen=None, clock=None):
         if keygen == None:
             keygen = JantePasteDB.readable_keygen
 
         self._keygen = keygen
+        self._clock = clock if clock != None else Clock()
 
     @staticmethod
     def uuid4_keygen(data):
@@ -90,7 +93,7 @@ class JantePasteDB:
 
     # remove dead entries on ttl expiration
     def _purge(self):
-        now = time.time()
+        now = self._clock.time()
 
         for key in list(JantePasteDB._database.keys()):
             if JantePasteDB._ttl[key] <= now:
@@ -115,7 +118,7 @@ class JantePasteDB:
 
         # store the entry
         JantePasteDB._database[key] = data
-        JantePasteDB._ttl[key] = time.time() + ttl
+        JantePasteDB._ttl[key] = self._clock.time() + ttl
 
         JantePasteDB._last = data
 
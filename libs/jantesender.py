@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sends the messages that plugins have added to the bot.
+
+The sender blocks on the outbound queue instead of polling it. Messages to external
+addresses are rate limited per address and per IO backend with token buckets. A message that
+has to wait stays in the queue (libs/outboundqueue.py), which hands out the next message that may
+be sent by its lanes, so messages to other addresses can be sent in the meantime and the lanes
+decide who gets the next token. The order of messages to the same address is kept. Internal
+messages (tuple addresses) are never delayed.
+
+Optionally, messages to the same address that are put close together are merged into one before
+they are queued, see libs/coalescing.py.
+"""
+
+import time
+import asyncio
+import traceback
+
+from libs import ratelimit
+from libs.clock import Clock
+from libs.coalescing import Coalescer
+
+class JanteSender:
+    # Longest time the sender blocks without checking if it should stop
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, bot, io, message_queue, address_rate=2.0, address_burst=5, protocol_rate=20.0, protocol_burst=20, metrics=None, tracer=None, clock=None, coalescer=None):
+        """
+        message_queue is a libs.outboundqueue.OutboundQueue, measuring time with the same clock.
+        address_rate and protocol_rate are in messages per second, 0 disables the limit.
+        coalescer is an optional libs.coalescing.Coalescer that merges messages before they are queued,
+        the sender makes it deliver to the queue.
+        metrics is an optional libs.metrics.Metrics, the time from reading a message to sending
+        the responses to it is observed as "receive_to_send".
+        tracer is an optional libs.tracing.Tracer, sending a traced message is recorded as a span.
+        clock is the libs.clock.Clock the rate limits are measured with, the real time by default.
+        """
+        self._bot = bot
+        self._io = io
+        self._queue = message_queue
+        self._metrics = metrics
+        self._tracer = tracer
+        self._clock = clock if clock != None else Clock()
+        self._coalescer = coalescer if coalescer != None else Coalescer(0)
+        self._coalescer.set_deliver(self._queue.put)
+        self._stopped = False
+
+        # Set when the sender runs on an asyncio event loop, see attach_loop()
+        self._loop = None
+        self._wakeup = None
+
+        self._address_limiter = ratelimit.RateLimiter(address_rate, address_burst)
+        self._protocol_limiter = ratelimit.RateLimiter(protocol_rate, protocol_burst)
+
+
+    def put(self, message):
+        # Messages to the same chat are kept in order by destination (backend, address), so a message
+        # without a backend must get the one it is sent through before it is held or queued
+        for m in self._io.expand(message):
+            if self._coalescer.enabled():
+                self._coalescer.add(m, self._clock.monotonic())
+            else:
+                self._queue.put(m)
+
+        if self._coalescer.enabled():
+            # The sender might have to wake up earlier to release held messages
+            self._queue.interrupt()
+
+        loop = self._loop
+        if loop != None:
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    def qsize(self):
+        return self._queue.qsize() + len(self._coalescer)
+
+    def attach_loop(self, loop):
+        """
+        Makes put() wake up run_async() on the given event loop.
+        Must be called from the thread running the loop.
+        """
+        self._wakeup = asyncio.Event()
+        self._loop = loop
+
+    def detach_loop(self):
+        self._loop = None
+
+    def stop(self):
+        self._stopped = True
+        # A simulated clock does not time out by itself
+        self._queue.interrupt()
+
+    def _limits(self, message):
+        # put() has given the message its backend
+        return [(self._address_limiter, message.get_destination()),
+                (self._protocol_limiter, message.get_backend())]
+
+    def _wait_time(self, message):
+        """
+        Seconds until the rate limits allow the message to be sent. Internal messages never wait.
+        """
+        address = message.get_address()
+        if address == None or address == "" or type(address) == tuple:
+            return 0
+        return ratelimit.wait_time(self._limits(message), self._clock.monotonic())
+
+    def _take(self, message):
+        """
+        Takes the tokens for a message that has left the queue. Returns False if it can not be sent.
+        """
+        address = message.get_address()
+
+        if address == None or address == "":
+            self._bot.error("ATTEMPTED TO SEND MESSAGE WITHOUT ADDRESS.")
+            return False
+
+        if type(address) != tuple:
+            ratelimit.consume(self._limits(message), self._clock.monotonic())
+        return True
+
+    def _release_coalesced(self, now):
+        if self._coalescer.enabled():
+            self._coalescer.due(now)
+
+    def _timeout(self, now):
+        """
+        Returns how long the sender may block waiting for new messages.
+        """
+        deadlines = [JanteSender.POLL_INTERVAL + now]
+        deadline = self._coalescer.next_deadline()
+        if deadline != None:
+            deadlines.append(deadline)
+        return max(0, min(deadlines) - now)
+
+    def _poll(self):
+        """
+        Returns (the next message that may be sent now, None) or (None, seconds until one may be sent or None).
+        """
+        self._release_coalesced(self._clock.monotonic())
+        while True:
+            message, wait = self._queue.pop_ready(self._wait_time)
+            if message == None:
+                if self._queue.qsize() == 0:
+                    self._address_limiter.prune(self._clock.monotonic())
+                return None, wait
+            if self._take(message):
+                return message, None
+
+    def _step(self, timeout):
+        """
+        Waits at most timeout seconds for a message that may be sent, and sends it.
+        """
+        self._release_coalesced(self._clock.monotonic())
+        message = self._queue.get_ready(self._wait_time, timeout)
+        if message != None and self._take(message):
+            self._deliver(message)
+        elif message == None and self._queue.qsize() == 0:
+            self._address_limiter.prune(self._clock.monotonic())
+
+    def _prepare(self, message):
+        """
+        Returns True if the message has to be handed to the IO.
+        """
+        if message.is_internal():
+            self._bot.debug('Internal message sent with id "{}"', message.get_address())
+            return False
+
+        self._bot.debug('Sending message to address "{}"', message.get_address())
+
+        if issubclass(type(message.get_text()), BaseException):
+            # Errors should be formatted correctly before they are sent to external sources
+            message.set_text("{}-exception::{}: {}".format(message.get_sender(), type(message.get_text()).__name__, message.get_text().args[0]))
+        return True
+
+    def _sent(self, message):
+        received = message.get_received()
+        if self._metrics != None and received != None:
+            self._metrics.observe('receive_to_send', time.monotonic() - received)
+
+        self._bot.fire_event('on_message_sent', message=message)
+
+    def _send_failed(self, message):
+        self._bot.error('Could not send message to "{}":\n{}'.format(message.get_address(), traceback.format_exc()))
+
+    def _record_span(self, message, name, start):
+        if self._tracer != None and message.get_trace() != None:
+            self._tracer.record(message.get_trace(), name, start)
+
+    def _deliver(self, message):
+        if self._prepare(message):
+            start = time.monotonic()
+            try:
+                self._io.send(message)
+            except:
+                self._send_failed(message)
+                return
+            self._record_span(message, 'send', start)
+
+        self._sent(message)
+
+    async def _deliver_async(self, message):
+        if self._prepare(message):
+            start = time.monotonic()
+            try:
+                await self._io.async_send(message)
+            except:
+                self._send_failed(message)
+                return
+            self._record_span(message, 'send', start)
+
+        self._sent(message)
+
+    def run(self):
+        while not self._stopped:
+            if self._bot.is_muted():
+                time.sleep(0.1)
+                continue
+
+            self._step(self._timeout(self._clock.monotonic()))
+
+    async def run_async(self):
+        """
+        Same as run(), for the asyncio core. attach_loop() must have been called.
+        """
+        while not self._stopped:
+            if self._bot.is_muted():
+                await asyncio.sleep(0.1)
+                continue
+
+            message, wait = self._poll()
+            if message == None:
+                self._wakeup.clear()
+                # A message put before the clear would not wake us up
+                message, wait = self._poll()
+            if message == None:
+                timeout = self._timeout(self._clock.monotonic())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout if wait == None else min(timeout, wait))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._deliver_async(message)
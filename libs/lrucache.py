@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A bounded, thread safe cache that drops the least recently used entries first.
+
+    cache = LRUCache(size=1024)
+    alias = cache.get_or_load(sender, lookup)
+    cache.invalidate(sender)    # when the value of sender changes
+"""
+
+import threading
+import collections
+
+class LRUCache:
+    def __init__(self, size=1024):
+        """
+        size - Number of entries that are kept, 0 disables the cache.
+        """
+        self._size = size
+        self._entries = collections.OrderedDict()
+        # Increased on every invalidation, so values loaded before it are not stored after it
+        self._generation = 0
+        self._mutex = threading.Lock()
+
+    def get_or_load(self, key, load):
+        """
+        Returns the cached value of key, or calls load(key), caches and returns what it returns.
+        load is called without holding the lock, so two threads might load the same key.
+        """
+        with self._mutex:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            generation = self._generation
+
+        value = load(key)
+
+        with self._mutex:
+            if self._size > 0 and generation == self._generation:
+                self._entries[key] = value
+                while len(self._entries) > self._size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key=None):
+        """
+        Drops the entry of key, or all entries if key is None.
+        """
+        with self._mutex:
+            self._generation += 1
+            if key == None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._mutex:
+            return len(self._entries)
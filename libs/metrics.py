@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Counters, latency histograms and gauges of the bot.
+
+Latencies are counted in fixed buckets so recording one is cheap and the memory used does
+not grow with the number of observations. Percentiles are estimated as the upper bound of the
+bucket they fall in.
+
+    metrics.increment('fired.on_message')
+    with metrics.timer('command.dict'):
+        ...
+    metrics.set_gauge('message_queue', queue.qsize)
+    metrics.snapshot()  # {'counters': {...}, 'latencies': {...}, 'gauges': {...}}
+"""
+
+import time
+import bisect
+import threading
+import contextlib
+import collections
+
+class Histogram:
+    # Upper bounds of the buckets in seconds, the last bucket has no upper bound
+    BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(Histogram.BOUNDS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(Histogram.BOUNDS, seconds)] += 1
+
+    def percentile(self, p):
+        """
+        Returns an upper bound of the <p>th percentile (0-100), None if nothing has been observed.
+        """
+        if self.count == 0:
+            return None
+
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n > 0:
+                return Histogram.BOUNDS[i] if i < len(Histogram.BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count > 0 else None,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'max': self.max}
+
+class Metrics:
+    def __init__(self):
+        self._counters = collections.Counter()
+        self._histograms = dict()
+        self._gauges = dict()
+        self._mutex = threading.Lock()
+
+    def increment(self, name, n=1):
+        with self._mutex:
+            self._counters[name] += n
+
+    def observe(self, name, seconds):
+        """
+        Adds a latency, in seconds, to the histogram called <name>.
+        """
+        with self._mutex:
+            histogram = self._histograms.get(name)
+            if histogram == None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        Observes how long the with block takes, also when it raises an exception.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start)
+
+    def set_gauge(self, name, function):
+        """
+        function() is called for the value of the gauge when a snapshot is taken.
+        """
+        with self._mutex:
+            self._gauges[name] = function
+
+    def remove_gauge(self, name):
+        with self._mutex:
+            self._gauges.pop(name, None)
+
+    def get_latency(self, name):
+        """
+        Returns a copy of the dict of the histogram called <name>, or None.
+        """
+        with self._mutex:
+            histogram = self._histograms.get(name)
+            return histogram.to_dict() if histogram != None else None
+
+    def snapshot(self, prefix=""):
+        """
+        Returns everything, or everything whose name starts with <prefix>, as a dict that can be serialized to JSON.
+        """
+        with self._mutex:
+            counters = {k: v for k, v in self._counters.items() if k.startswith(prefix)}
+            latencies = {k: h.to_dict() for k, h in self._histograms.items() if k.startswith(prefix)}
+            gauges = [(k, f) for k, f in self._gauges.items() if k.startswith(prefix)]
+
+        # Gauges may take locks of their own
+        values = dict()
+        for name, function in gauges:
+            try:
+                values[name] = function()
+            except Exception as e:
+                values[name] = str(e)
+
+        return {'counters': counters, 'latencies': latencies, 'gauges': values}
+
+def _milliseconds(seconds):
+    return "-" if seconds == None else "{:.1f}ms".format(seconds * 1000)
+
+def format_snapshot(snapshot):
+    """
+    Returns a snapshot as lines of text, for chat.
+    """
+    lines = []
+    if len(snapshot['latencies']) > 0:
+        lines.append("Latencies (count, mean, p90, max):")
+        for name, h in sorted(snapshot['latencies'].items()):
+            lines.append("  {}: {}, {}, {}, {}".format(name, h['count'], _milliseconds(h['mean']),
+                                                       _milliseconds(h['p90']), _milliseconds(h['max'])))
+    if len(snapshot['counters']) > 0:
+        lines.append("Counters:")
+        for name, n in sorted(snapshot['counters'].items()):
+            lines.append("  {}: {}".format(name, n))
+    if len(snapshot['gauges']) > 0:
+        lines.append("Gauges:")
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append("  {}: {}".format(name, value))
+    return "\n".join(lines) if len(lines) > 0 else "Nothing recorded."
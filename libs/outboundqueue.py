@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The queue of messages waiting to be sent.
+
+Messages are sorted into lanes: internal messages (tuple addresses), interactive replies, error
+reports and bulk messages (send_to_all). The lanes share the sender by weight, a lane with weight 4
+gets four messages through for every one of a lane with weight 1 when both have messages waiting.
+Within a lane the addresses take turns, so a plugin dumping many lines to one channel does not hold
+up replies to anyone else. The order of messages to the same address within a lane is kept.
+
+Messages that are rate limited stay in the queue: the sender asks for the next message that may be
+sent now (get_ready()), so the lanes and turns also decide who gets the next token of a rate limit.
+
+With a libs.metrics.Metrics the time each message waited is observed as "outbound_wait.<lane>".
+The queue measures time with the same libs.clock.Clock as the rate limits that wait() reports on.
+"""
+
+import threading
+import collections
+
+from libs.clock import Clock
+
+LANES = ('internal', 'interactive', 'errors', 'bulk')
+
+DEFAULT_WEIGHTS = {'internal': 8, 'interactive': 4, 'errors': 2, 'bulk': 1}
+
+def lane_of(message):
+    if message.is_internal():
+        return 'internal'
+    if issubclass(type(message.get_text()), BaseException):
+        return 'errors'
+    if message.get_send_to_all():
+        return 'bulk'
+    return 'interactive'
+
+def parse_weights(text):
+    """
+    Parses "internal:8 interactive:4 ..." into a dict, lanes that are not mentioned keep their default weight.
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in text.split():
+        lane, weight = part.split(":")
+        if not lane in LANES:
+            raise ValueError('Unknown lane "{}", the lanes are {}.'.format(lane, ", ".join(LANES)))
+        if float(weight) <= 0:
+            raise ValueError('The weight of lane "{}" must be positive.'.format(lane))
+        weights[lane] = float(weight)
+    return weights
+
+class OutboundQueue:
+    class lane:
+        def __init__(self, weight):
+            self.weight = weight
+            # Waiting (time queued, message) per destination (backend, address), in the order they are served
+            self.queues = collections.OrderedDict()
+            self.count = 0
+            # Virtual time of the lane, the lane with the lowest is served next
+            self.finish = 0.0
+
+    def __init__(self, weights=None, metrics=None, clock=None):
+        """
+        clock is the libs.clock.Clock the waits of get_ready() are measured with, the real time by default.
+        """
+        weights = weights if weights != None else DEFAULT_WEIGHTS
+        self._clock = clock if clock != None else Clock()
+        self._lanes = collections.OrderedDict((name, OutboundQueue.lane(weights.get(name, 1))) for name in LANES)
+        self._metrics = metrics
+        self._count = 0
+        # Virtual time of the last message that was handed out
+        self._now = 0.0
+        # Increased by interrupt() to make get_ready() return early
+        self._interrupts = 0
+        self._condition = threading.Condition()
+
+    def qsize(self):
+        with self._condition:
+            return self._count
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def depth(self, lane):
+        with self._condition:
+            return self._lanes[lane].count
+
+    def put(self, message):
+        lane = self._lanes[lane_of(message)]
+        destination = message.get_destination()
+
+        with self._condition:
+            if lane.count == 0:
+                # A lane that has been idle does not get to catch up on the turns it did not need
+                lane.finish = max(lane.finish, self._now)
+            if not destination in lane.queues:
+                lane.queues[destination] = collections.deque()
+            lane.queues[destination].append((self._clock.monotonic(), message))
+            lane.count += 1
+            self._count += 1
+
+            self._condition.notify()
+
+    # _condition must be held. Returns (the next message that wait() allows, None) or (None, the shortest wait).
+    def _pop_ready(self, wait):
+        shortest = None
+        # Lanes with the lowest virtual time first, sorted() keeps the order of LANES on ties
+        for name, lane in sorted(((name, lane) for name, lane in self._lanes.items() if lane.count > 0),
+                                 key=lambda item: item[1].finish):
+            for destination, queue in lane.queues.items():
+                seconds = wait(queue[0][1])
+                if seconds <= 0:
+                    return self._pop(name, lane, destination), None
+                shortest = seconds if shortest == None else min(shortest, seconds)
+        return None, shortest
+
+    # _condition must be held
+    def _pop(self, name, lane, destination):
+        self._now = lane.finish
+        lane.finish += 1.0 / lane.weight
+
+        queue = lane.queues[destination]
+        queued, message = queue.popleft()
+        lane.count -= 1
+        self._count -= 1
+
+        # The address goes to the back of the line
+        if len(queue) == 0:
+            del lane.queues[destination]
+        else:
+            lane.queues.move_to_end(destination)
+
+        if self._metrics != None:
+            self._metrics.observe('outbound_wait.' + name, self._clock.monotonic() - queued)
+        return message
+
+    def get(self, timeout=None):
+        """
+        Returns the next message. Returns None if the timeout runs out.
+        """
+        return self.get_ready(lambda message: 0, timeout)
+
+    def get_nowait(self):
+        """
+        Returns the next message, or None if there is none.
+        """
+        return self.pop_ready(lambda message: 0)[0]
+
+    def pop_ready(self, wait):
+        """
+        wait(message) tells how many seconds the message has to wait before it may be sent. Only the
+        first waiting message of every address is asked. Returns (the next message that may be sent
+        now, None), or (None, the shortest wait) if there is none, the wait is None if the queue is empty.
+        """
+        with self._condition:
+            return self._pop_ready(wait)
+
+    def interrupt(self):
+        """
+        Makes a waiting get_ready() return None now.
+        """
+        with self._condition:
+            self._interrupts += 1
+            self._condition.notify_all()
+
+    def get_ready(self, wait, timeout=None):
+        """
+        Like pop_ready(), but waits at most timeout seconds for a message that may be sent.
+        Returns None if there is none by then, or if interrupt() is called.
+        """
+        end = self._clock.monotonic() + timeout if timeout != None else None
+        with self._condition:
+            interrupts = self._interrupts
+            while True:
+                message, shortest = self._pop_ready(wait)
+                if message != None:
+                    return message
+
+                remaining = end - self._clock.monotonic() if end != None else None
+                if shortest != None and (remaining == None or shortest < remaining):
+                    remaining = shortest
+                if (remaining != None and remaining <= 0) or self._interrupts != interrupts:
+                    return None
+                self._clock.wait(self._condition, remaining)
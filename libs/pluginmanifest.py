@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reads the manifest.ini of a plugin.
+
+The manifest tells what a plugin provides without importing it: its commands, the events it
+listens to, the services it offers and its web routes. With lazy loading the bot only reads the
+manifests at startup and imports and constructs a plugin the first time one of those is needed.
+
+Example, plugins/dict2/manifest.ini:
+
+    [plugin]
+    modules = dict
+    commands = dict
+    command_setting = dict.command
+    events =
+    services =
+    routes =
+"""
+
+import os
+import configparser
+
+class PluginManifest:
+    FILENAME = "manifest.ini"
+
+    def __init__(self, name, path, config):
+        """
+        name    - Name of the plugin, the name of its folder.
+        path    - Path of the folder of the plugin.
+        config  - The parsed manifest.
+        """
+        self.name = name
+        self.path = path
+
+        def values(option):
+            return config.get('plugin', option, fallback="").replace(",", " ").split()
+
+        self.modules = values('modules')
+        self.commands = values('commands')
+        self.events = values('events')
+        self.services = values('services')
+        self.routes = values('routes')
+
+        # A command that can be renamed in the settings of the plugin, as <section>.<option>
+        setting = config.get('plugin', 'command_setting', fallback=None)
+        if setting != None:
+            section, option = setting.split(".", 1)
+            settings = configparser.ConfigParser()
+            settings.read(os.path.join(path, "settings.ini"))
+            command = settings.get(section, option, fallback=None)
+            if command != None:
+                self.commands = [command]
+
+        if len(self.modules) == 0:
+            raise ValueError('The manifest of plugin "{}" does not list any modules.'.format(name))
+
+    def __repr__(self):
+        return 'PluginManifest({})'.format(self.name)
+
+def read_manifest(name, path):
+    """
+    Returns the manifest of the plugin in folder <path>, or None if it does not have one.
+    """
+    filename = os.path.join(path, PluginManifest.FILENAME)
+    if not os.path.isfile(filename):
+        return None
+
+    config = configparser.ConfigParser()
+    config.read(filename)
+    return PluginManifest(name, path, config)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs event handlers in worker processes, for handlers that are heavy on the CPU and would
+otherwise hold the GIL from every other handler.
+
+A handler that runs in a process must be a function defined at module level so it can be pickled,
+and its arguments (e.g a JanteMessage) are pickled as well. In the worker process get_bot() returns
+a proxy of the bot: messages given to its add_message() and calls to its services are sent back
+to the bot process and run there.
+
+    def heavy(message):
+        bot = processpool.get_bot()
+        bot.add_message(message.respond(expensive(message.get_text()), bot.get_nick()))
+
+    bot.add_event_listener('on_message', heavy, process=True)
+"""
+
+import inspect
+import functools
+import threading
+import multiprocessing
+import concurrent.futures
+from multiprocessing.managers import BaseManager
+
+class _Bridge:
+    """
+    The part of the bot the worker processes may use. Lives in the bot process.
+    """
+    def __init__(self, bot):
+        self._bot = bot
+
+    def add_message(self, message):
+        self._bot.add_message(message)
+
+    def call_service(self, service, function, args, kwargs):
+        return self._bot.get_service(service).get_function(function)(*args, **kwargs)
+
+    def get_commands(self):
+        return self._bot.get_commands()
+
+    def get_nick(self):
+        return self._bot.get_nick()
+
+    def resolve_alias(self, sender):
+        return self._bot.resolve_alias(sender)
+
+    def get_command_prefix(self):
+        return self._bot.get_command_prefix()
+
+    def log(self, text, *args):
+        self._bot.log(text, *args)
+
+    def error(self, text):
+        self._bot.error(text)
+
+class BotProxy:
+    """
+    What get_bot() returns in a worker process. Every call is run by the bot process.
+    """
+    class service:
+        def __init__(self, bridge, name):
+            self._bridge = bridge
+            self._name = name
+
+        def __getattr__(self, function):
+            def call(*args, **kwargs):
+                return self._bridge.call_service(self._name, function, args, kwargs)
+            return call
+
+    def __init__(self, bridge):
+        self._bridge = bridge
+
+    def add_message(self, message):
+        self._bridge.add_message(message)
+
+    def get_service(self, name):
+        return BotProxy.service(self._bridge, name)
+
+    def get_commands(self):
+        return self._bridge.get_commands()
+
+    def get_nick(self):
+        return self._bridge.get_nick()
+
+    def resolve_alias(self, sender):
+        return self._bridge.resolve_alias(sender)
+
+    def get_command_prefix(self):
+        return self._bridge.get_command_prefix()
+
+    def log(self, text, *args):
+        self._bridge.log(text, *args)
+
+    def error(self, text):
+        self._bridge.error(text)
+
+# Set by _init_worker in the worker processes
+_bot = None
+
+def get_bot():
+    """
+    Returns the proxy of the bot in a worker process, None in the bot process.
+    """
+    return _bot
+
+class AliasResolver:
+    """
+    The alias resolver of messages (see JanteMessage.set_alias_resolver), calls resolve(sender).
+    A message handed to a worker process keeps its alias unresolved, it is looked up through the
+    proxy of the bot only if the handler asks for it.
+    """
+    picklable = True
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __call__(self, sender):
+        return self._resolve(sender)
+
+    def __reduce__(self):
+        return (AliasResolver, (_resolve_alias,))
+
+def _resolve_alias(sender):
+    return _bot.resolve_alias(sender)
+
+def _init_worker(address, authkey):
+    global _bot
+
+    class Manager(BaseManager):
+        pass
+    Manager.register('bridge')
+
+    manager = Manager(address=address, authkey=authkey)
+    manager.connect()
+    _bot = BotProxy(manager.bridge())
+
+def _call(target, kwargs):
+    return target(**kwargs)
+
+class ProcessPool:
+    """
+    Started the first time it is used, worker processes are expensive to start.
+    """
+    def __init__(self, bot, workers=2):
+        self._bot = bot
+        self._workers = workers
+        self._executor = None
+        self._server = None
+        self._mutex = threading.Lock()
+
+    # _mutex must be held
+    def _start(self):
+        bridge = _Bridge(self._bot)
+
+        # A manager class of its own, registered types are shared by all instances of a class
+        class Manager(BaseManager):
+            pass
+        Manager.register('bridge', callable=lambda: bridge)
+
+        authkey = multiprocessing.current_process().authkey
+        self._server = Manager(authkey=authkey).get_server()
+        threading.Thread(target=self._server.serve_forever, daemon=True,
+                         name="ProcessPoolBridge - Runs the calls of the worker processes").start()
+
+        # Forking a process with running threads is not safe, the workers are spawned
+        self._executor = concurrent.futures.ProcessPoolExecutor(self._workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(self._server.address, authkey))
+
+    def submit(self, target, kwargs):
+        with self._mutex:
+            if self._executor == None:
+                self._start()
+            return self._executor.submit(_call, target, kwargs)
+
+    def wrap(self, target):
+        """
+        Returns a listener with the signature of target that runs target in a worker process.
+        It returns the future of the call without waiting for it, the thread (or pool worker)
+        that called it is free while the process works, see libs.inflight.settle.
+        """
+        signature = inspect.signature(target)
+
+        def run_in_process(*args, **kwargs):
+            return self.submit(target, signature.bind(*args, **kwargs).arguments)
+
+        functools.update_wrapper(run_in_process, target)
+        run_in_process.__signature__ = signature
+        return run_in_process
+
+    def shutdown(self):
+        with self._mutex:
+            if self._executor != None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+            stop_event = getattr(self._server, 'stop_event', None)
+            if stop_event != None:
+                stop_event.set()
+            self._server = None
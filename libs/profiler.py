@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profiles the event handlers of a plugin while the bot is running.
+
+A session collects cProfile statistics of the handlers that match, until it is stopped or has
+seen a number of calls. Each call is profiled on its own and added to the statistics of the session,
+so handlers running in different threads at the same time do not disturb each other.
+
+While no session runs the only cost for a handler is the check of active() in EventHost.fire_event.
+"""
+
+import io
+import pstats
+import cProfile
+import inspect
+import threading
+
+class Profiler:
+    class session:
+        def __init__(self, name, matches, calls, on_done):
+            self.name = name
+            self.matches = matches
+            self.calls_left = calls
+            self.on_done = on_done
+            self.calls = 0
+            self.stats = None
+
+    def __init__(self):
+        self._session = None
+        self._mutex = threading.Lock()
+
+    def active(self):
+        return self._session != None
+
+    def start(self, name, matches, calls=None, on_done=None):
+        """
+        Starts profiling the handlers for which matches(target) is True.
+        The session ends after <calls> calls, or when stop() is called. on_done(report) is called when it ends.
+        Returns the session, raises RuntimeError if a session is already running.
+        """
+        with self._mutex:
+            if self._session != None:
+                raise RuntimeError('Already profiling "{}".'.format(self._session.name))
+            self._session = Profiler.session(name, matches, calls, on_done)
+            return self._session
+
+    def stop(self, session=None, top=20):
+        """
+        Ends the session (or the running session, whatever it is) and returns its report.
+        Returns None if the session has already ended.
+        """
+        with self._mutex:
+            if self._session == None or (session != None and session is not self._session):
+                return None
+            session, self._session = self._session, None
+
+        report = Profiler.report(session, top)
+        if session.on_done != None:
+            session.on_done(report)
+        return report
+
+    def wrap(self, target, listener):
+        """
+        Returns target, wrapped so it is profiled if listener matches the running session.
+        Coroutine handlers are not profiled.
+        """
+        session = self._session
+        if session == None or inspect.iscoroutinefunction(target) or not session.matches(listener):
+            return target
+
+        def profiled(**kwargs):
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(target, **kwargs)
+            finally:
+                self._add(session, profile)
+
+        return profiled
+
+    def _add(self, session, profile):
+        with self._mutex:
+            if session is not self._session:
+                return
+
+            session.calls += 1
+            if session.stats == None:
+                session.stats = pstats.Stats(profile)
+            else:
+                session.stats.add(profile)
+
+            done = session.calls_left != None and session.calls >= session.calls_left
+
+        if done:
+            self.stop(session)
+
+    @staticmethod
+    def report(session, top=20):
+        """
+        Returns the <top> functions the handlers spent the most time in, with the time spent in the
+        functions they call.
+        """
+        if session.stats == None:
+            return 'Profiled "{}": no handler was called.'.format(session.name)
+
+        out = io.StringIO()
+        session.stats.stream = out
+        session.stats.strip_dirs().sort_stats('cumulative').print_stats(top)
+
+        lines = [line for line in out.getvalue().split("\n") if line.strip() != ""]
+        return 'Profiled "{}", {} calls:\n{}'.format(session.name, session.calls, "\n".join(lines))
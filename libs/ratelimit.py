@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token bucket rate limiting.
+
+A bucket holds at most <burst> tokens and is refilled with <rate> tokens per second.
+Sending something costs one token. A RateLimiter keeps one bucket per key, e.g. per address.
+"""
+
+class TokenBucket:
+    def __init__(self, rate, burst, now):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = now
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+
+    def wait_time(self, now):
+        """
+        Returns the number of seconds until a token is available. 0 if one is available now.
+        """
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    def consume(self, now):
+        self._refill(now)
+        self._tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self._tokens >= self._burst
+
+class RateLimiter:
+    """
+    Keeps a token bucket per key. A rate of 0 or lower means that nothing is limited.
+    """
+    def __init__(self, rate, burst):
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._buckets = dict()
+
+    def is_limited(self):
+        return self._rate > 0
+
+    def _bucket(self, key, now):
+        if not key in self._buckets:
+            self._buckets[key] = TokenBucket(self._rate, self._burst, now)
+        return self._buckets[key]
+
+    def wait_time(self, key, now):
+        if not self.is_limited():
+            return 0
+        return self._bucket(key, now).wait_time(now)
+
+    def consume(self, key, now):
+        if self.is_limited():
+            self._bucket(key, now).consume(now)
+
+    def prune(self, now):
+        """
+        Forgets buckets that are full, they behave exactly like new ones.
+        """
+        for key in [k for k, b in self._buckets.items() if b.is_full(now)]:
+            del self._buckets[key]
+
+def wait_time(limits, now):
+    """
+    limits is a list of (RateLimiter, key) pairs.
+    Returns the number of seconds until all of them have a token available.
+    """
+    return max([limiter.wait_time(key, now) for limiter, key in limits] + [0])
+
+def consume(limits, now):
+    for limiter, key in limits:
+        limiter.consume(key, now)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs jobs at given times.
+
+Jobs are kept in a heap ordered by deadline. The scheduler thread sleeps until the first deadline
+(or until a new job is added) and only wakes up the jobs that are due. On the asyncio core the
+scheduler runs as a task on the event loop instead, see attach_loop() and run_async().
+
+Three kinds of jobs:
+    one-shot    - runs once, after a delay or at a given time.
+    interval    - runs every <interval> seconds.
+    cron        - runs at the times matching a cron-like specification, e.g "*/5 * * * *".
+"""
+
+import math
+import heapq
+import asyncio
+import datetime
+import threading
+import traceback
+
+from libs.clock import Clock
+
+class CronSpec:
+    """
+    A cron-like specification with five fields: minute hour day-of-month month day-of-week.
+    Each field is "*", a number, a range "a-b", a step "*/n" or "a-b/n", or a comma separated list of those.
+    Day of week is 0-6 with 0 (or 7) being Sunday. Like cron, if both day of month and day of week
+    are restricted a day matches if either of them does.
+    """
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, spec):
+        fields = spec.split()
+        if len(fields) != 5:
+            raise ValueError('Cron specification "{}" must have five fields.'.format(spec))
+
+        self._spec = spec
+        parsed = [CronSpec._parse_field(f, low, high) for f, (low, high) in zip(fields, CronSpec._RANGES)]
+        self._minutes, self._hours, self._days, self._months, weekdays = parsed
+
+        # cron weekdays count from sunday, datetime.weekday() from monday
+        self._weekdays = set((d - 1) % 7 for d in weekdays)
+
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/")
+                step = int(step)
+                if step < 1:
+                    raise ValueError('Step must be positive in "{}".'.format(field))
+
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = map(int, part.split("-"))
+            else:
+                start = end = int(part)
+
+            if start < low or end > high or start > end:
+                raise ValueError('"{}" is out of the range {}-{}.'.format(field, low, high))
+
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt):
+        day = dt.day in self._days
+        weekday = dt.weekday() in self._weekdays
+
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, timestamp):
+        """
+        Returns the first timestamp after the given one that matches the specification.
+        """
+        dt = datetime.datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+
+        # Five years is more than enough for any specification that can match at all
+        limit = dt + datetime.timedelta(days=5 * 366)
+        while dt < limit:
+            if not dt.month in self._months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif not dt.hour in self._hours:
+                dt = dt.replace(minute=0) + datetime.timedelta(hours=1)
+            elif not dt.minute in self._minutes:
+                dt += datetime.timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+
+        raise ValueError('Cron specification "{}" never matches.'.format(self._spec))
+
+    def __str__(self):
+        return self._spec
+
+class Job:
+    def __init__(self, fn, deadline, interval=None, cron=None, name=None, inline=False):
+        self._fn = fn
+        self._deadline = deadline
+        self._interval = interval
+        self._cron = cron
+        self._name = name if name != None else str(fn)
+        self._inline = inline
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        The job will not run again. Does not stop a run that has already started.
+        """
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def get_name(self):
+        return self._name
+
+    def get_deadline(self):
+        return self._deadline
+
+    def is_inline(self):
+        return self._inline
+
+    def run(self):
+        return self._fn()
+
+    # Moves the deadline to the next run. Returns False if the job should not run again.
+    def _advance(self, now):
+        if self._interval != None:
+            # Skip runs that were missed instead of running them all at once
+            self._deadline += self._interval * max(1, int((now - self._deadline) // self._interval) + 1)
+            return True
+        if self._cron != None:
+            self._deadline = self._cron.next_after(now)
+            return True
+        return False
+
+    def __repr__(self):
+        return 'Job({}, deadline={})'.format(self._name, self._deadline)
+
+class Scheduler:
+    def __init__(self, executor=None, logger=None, clock=None):
+        """
+        executor    - Called with a due job, should run it (for example job.run() in a worker).
+                      Jobs added with inline=True, and all jobs if there is no executor,
+                      are run on the scheduler thread.
+        logger      - Object with a write method, used to report jobs that raised an exception.
+        clock       - libs.clock.Clock that tells the time, the real time by default.
+        """
+        self._executor = executor
+        self._logger = logger
+        self._clock = clock if clock != None else Clock()
+        self._heap = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+        # Set when the scheduler runs on an asyncio event loop, see attach_loop()
+        self._loop = None
+        self._wakeup = None
+
+    def _add(self, job):
+        # A NaN deadline compares false with everything and would stop the heap from ever getting past it
+        if math.isnan(job.get_deadline()):
+            raise ValueError('The job "{}" has no valid time to run at.'.format(job.get_name()))
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._heap, (job.get_deadline(), self._sequence, job))
+            # Wake the thread up in case this job is due before the one it is waiting for
+            self._condition.notify()
+        self._wake_loop()
+        return job
+
+    def _wake_loop(self):
+        loop = self._loop
+        if loop != None:
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    def call_later(self, delay, fn, name=None, inline=False):
+        return self._add(Job(fn, self._clock.time() + delay, name=name, inline=inline))
+
+    def call_at(self, timestamp, fn, name=None, inline=False):
+        return self._add(Job(fn, timestamp, name=name, inline=inline))
+
+    def every(self, interval, fn, first_delay=None, name=None, inline=False):
+        if interval <= 0:
+            raise ValueError("The interval must be positive.")
+        if first_delay == None:
+            first_delay = interval
+        return self._add(Job(fn, self._clock.time() + first_delay, interval=interval, name=name, inline=inline))
+
+    def cron(self, spec, fn, name=None, inline=False):
+        cron = CronSpec(spec)
+        return self._add(Job(fn, cron.next_after(self._clock.time()), cron=cron, name=name, inline=inline))
+
+    def pending(self):
+        """
+        Returns the jobs that have not been cancelled, the next one first.
+        """
+        with self._condition:
+            return [job for _, _, job in sorted(self._heap) if not job.is_cancelled()]
+
+    def _run(self, job):
+        try:
+            if job.is_inline() or self._executor == None:
+                job.run()
+            else:
+                self._executor(job)
+        except:
+            if self._logger != None:
+                self._logger.write('Scheduled job "{}" failed:\n{}'.format(job.get_name(), traceback.format_exc()))
+
+    # _condition must be held. Throws away cancelled jobs at the top so they do not wake the thread up.
+    def _prune(self):
+        while len(self._heap) > 0 and self._heap[0][2].is_cancelled():
+            heapq.heappop(self._heap)
+
+    # _condition must be held. Returns the jobs that are due and moves the repeating ones to their next run.
+    def _pop_due(self, now):
+        due = []
+        while len(self._heap) > 0 and self._heap[0][0] <= now:
+            job = heapq.heappop(self._heap)[2]
+            if job.is_cancelled():
+                continue
+            due.append(job)
+
+            if job._advance(now):
+                self._sequence += 1
+                heapq.heappush(self._heap, (job.get_deadline(), self._sequence, job))
+        return due
+
+    def _due(self):
+        """
+        Waits until jobs are due and returns them. Returns an empty list when stopped.
+        """
+        with self._condition:
+            while not self._stopped:
+                self._prune()
+
+                if len(self._heap) == 0:
+                    self._condition.wait()
+                    continue
+
+                now = self._clock.time()
+                if self._heap[0][0] > now:
+                    self._clock.wait(self._condition, self._heap[0][0] - now)
+                    continue
+
+                return self._pop_due(now)
+            return []
+
+    def next_deadline(self):
+        """
+        Returns the time the next job is due, None if there are no jobs.
+        """
+        with self._condition:
+            self._prune()
+            return self._heap[0][0] if len(self._heap) > 0 else None
+
+    def run_pending(self):
+        """
+        Runs the jobs that are due on the calling thread, for schedulers that are not started.
+        Returns the number of jobs that were run.
+        """
+        with self._condition:
+            due = self._pop_due(self._clock.time())
+        for job in due:
+            self._run(job)
+        return len(due)
+
+    def run(self):
+        while not self._stopped:
+            for job in self._due():
+                self._run(job)
+
+    def attach_loop(self, loop):
+        """
+        Makes adding a job wake up run_async() on the given event loop.
+        Must be called from the thread running the loop.
+        """
+        self._wakeup = asyncio.Event()
+        self._loop = loop
+
+    def detach_loop(self):
+        self._loop = None
+
+    async def run_async(self):
+        """
+        Same as run(), as a task on the event loop. attach_loop() must have been called.
+        Due jobs are run on the loop, so the executor should hand them to a worker.
+        """
+        while not self._stopped:
+            # A job added after the clear sets it again
+            self._wakeup.clear()
+            self.run_pending()
+
+            deadline = self.next_deadline()
+            timeout = max(0, deadline - self._clock.time()) if deadline != None else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, name="Scheduler - Runs scheduled jobs"):
+        self._thread = threading.Thread(target=self.run, name=name)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._wake_loop()
@@ -16,6 +16,12 @@ class ServiceManager:
             
         self._services[service_name] = serv
         
+    def withdraw_service(self, service_name):
+        """
+        Removes a service, e.g when the plugin offering it is unloaded.
+        """
+        self._services.pop(service_name, None)
+
     def __getattr__(self, name):
         return self.get_service(name)
     
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Traces what happens to an inbound message, from reading it to sending the responses.
+
+Every message read from the IO starts a trace. Its id is carried by the message and by the
+responses to it (JanteMessage.respond and clone keep it), and the stages it passes record spans
+into the trace: the admission queue, configure_alias, firing the event, each handler, the outbound
+queue and the send. Only the most recent traces are kept, in a ring buffer.
+
+Plugins may record spans of their own:
+
+    with bot.get_tracer().span(message.get_trace(), 'paste'):
+        link = paste(text)
+"""
+
+import time
+import itertools
+import threading
+import contextlib
+import collections
+
+class Trace:
+    def __init__(self, trace_id, description, start):
+        self.id = trace_id
+        self.description = description
+        self.start = start
+        self.end = start
+        # (name, start, end) as time.monotonic(), in the order they were recorded
+        self.spans = []
+
+    def duration(self):
+        return self.end - self.start
+
+    def to_dict(self):
+        return {'id': self.id,
+                'description': self.description,
+                'duration': self.duration(),
+                'spans': [{'name': name, 'offset': start - self.start, 'duration': end - start}
+                          for name, start, end in sorted(self.spans, key=lambda s: s[1])]}
+
+    def __str__(self):
+        lines = ['Trace {} ({:.1f}ms) "{}":'.format(self.id, self.duration() * 1000, self.description)]
+        for name, start, end in sorted(self.spans, key=lambda s: s[1]):
+            lines.append('  +{:.1f}ms {} {:.1f}ms'.format((start - self.start) * 1000, name, (end - start) * 1000))
+        return "\n".join(lines)
+
+class Tracer:
+    def __init__(self, size=128):
+        """
+        size - Number of traces that are kept, 0 disables tracing.
+        """
+        self._size = size
+        self._traces = collections.OrderedDict()
+        self._ids = itertools.count(1)
+        self._mutex = threading.Lock()
+
+    def start(self, description, start=None):
+        """
+        Starts a trace and returns its id, None if tracing is disabled.
+        """
+        if self._size <= 0:
+            return None
+
+        trace = Trace(next(self._ids), description, start if start != None else time.monotonic())
+        with self._mutex:
+            self._traces[trace.id] = trace
+            while len(self._traces) > self._size:
+                self._traces.popitem(last=False)
+        return trace.id
+
+    def record(self, trace_id, name, start, end=None):
+        """
+        Records a span, times are time.monotonic(). Does nothing if the trace is not kept (any more).
+        """
+        if trace_id == None:
+            return
+        if end == None:
+            end = time.monotonic()
+
+        with self._mutex:
+            trace = self._traces.get(trace_id)
+            if trace != None:
+                trace.spans.append((name, start, end))
+                trace.end = max(trace.end, end)
+
+    @contextlib.contextmanager
+    def span(self, trace_id, name):
+        """
+        Records the with block as a span of the trace. trace_id may be None.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(trace_id, name, start)
+
+    def get(self, trace_id):
+        with self._mutex:
+            return self._traces.get(trace_id)
+
+    def slowest(self, n=5):
+        """
+        Returns the <n> slowest of the recent traces, the slowest first.
+        """
+        with self._mutex:
+            return sorted(self._traces.values(), key=lambda t: t.duration(), reverse=True)[:n]
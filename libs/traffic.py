@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Records the messages the bot reads from its IO so they can be replayed later, see bench/replay.py.
+
+The log has one JSON array per message: [seconds since the recording started, text, sender,
+address, is_in_group]. Files ending in .gz are compressed.
+
+A bot appends to the log of the last time it ran. Every recording starts with a line
+{"session": <wall-clock time>}, and read_traffic() plays the sessions one after the other without
+the time in between, so the offsets it yields never go back.
+
+    recorder = TrafficRecorder("traffic.log.gz")
+    recorder.record(message)
+    recorder.close()
+
+    for offset, message in read_traffic("traffic.log.gz"):
+        ...
+"""
+
+import gzip
+import json
+import time
+import threading
+
+from libs.jantemessage import JanteMessage
+
+def _open(filename, mode):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "t", encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
+
+class TrafficRecorder:
+    def __init__(self, filename):
+        self._file = _open(filename, "a")
+        self._start = time.monotonic()
+        self._mutex = threading.Lock()
+        self._file.write(json.dumps({"session": round(time.time(), 3)}) + "\n")
+
+    def record(self, message):
+        """
+        Writes a message to the log. Messages with internal (tuple) addresses and exception texts are skipped.
+        """
+        if message.is_internal() or type(message.get_text()) != str:
+            return
+
+        line = json.dumps([round(time.monotonic() - self._start, 3), message.get_text(), message.get_sender(),
+                           message.get_address(), message.is_in_group()], ensure_ascii=False, separators=(",", ":"))
+        with self._mutex:
+            if self._file != None:
+                self._file.write(line + "\n")
+
+    def flush(self):
+        with self._mutex:
+            if self._file != None:
+                self._file.flush()
+
+    def close(self):
+        with self._mutex:
+            if self._file != None:
+                self._file.close()
+                self._file = None
+
+def read_traffic(filename):
+    """
+    Yields (seconds since the recording started, JanteMessage) for each recorded message.
+    A session starts where the one before it ended.
+    """
+    # Offset of the session that is read, and the last offset yielded
+    base = 0.0
+    last = 0.0
+    with _open(filename, "r") as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            record = json.loads(line)
+            if type(record) == dict:
+                base = last
+                continue
+            offset, text, sender, address, is_in_group = record
+            last = base + offset
+            yield last, JanteMessage(text, sender=sender, address=address, is_in_group=is_in_group)
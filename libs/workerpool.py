@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A fixed size pool of worker threads used to run event handlers.
+
+Work is submitted with a key (normally the event name). The number of pending
+jobs is bounded and every key can be capped to a number of jobs that may run at
+the same time. Jobs over the cap are deferred until one of the running jobs with
+the same key finishes. Deferred jobs still count against the bound, so a flood of one
+event makes submit() block (or raise) instead of piling up.
+"""
+
+import threading
+import queue
+import collections
+
+from concurrent.futures import Future
+
+from libs.inflight import settle
+
+class WorkerPool:
+    def __init__(self, workers=8, queue_size=256, max_per_key=0, name="WorkerPool"):
+        """
+        workers         - Number of threads in the pool.
+        queue_size      - Number of jobs that may wait for a worker, deferred jobs included. submit() blocks when full.
+        max_per_key     - Number of jobs with the same key that may run at once. 0 means no cap.
+        """
+        assert workers > 0, "A worker pool needs at least one worker."
+        assert queue_size > 0, "The queue must be able to hold at least one job."
+
+        self._max_per_key = max_per_key
+        self._slots = threading.Semaphore(queue_size)
+        self._queue = queue.Queue()
+        self._mutex = threading.Lock()
+        self._running = collections.Counter()
+        self._deferred = collections.defaultdict(collections.deque)
+        self._shutdown_called = False
+
+        self._workers = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name="{} - worker {}".format(name, i), daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def submit(self, key, fn, kwargs=None, block=True, timeout=None):
+        """
+        Schedules fn(**kwargs) and returns a concurrent.futures.Future for it.
+
+        Raises queue.Full if no slot became available in time.
+        """
+        if self._shutdown_called:
+            raise RuntimeError("Can not submit work to a pool that has been shut down.")
+
+        if not self._slots.acquire(block, timeout):
+            raise queue.Full("Worker pool queue is full, could not schedule \"{}\".".format(key))
+
+        future = Future()
+        self._queue.put((key, fn, kwargs or dict(), future))
+        return future
+
+    def _run(self, fn, kwargs, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            # A job that hands its work off returns a future, the worker does not wait for it
+            settle(future, fn(**kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item == None:
+                return
+
+            key = item[0]
+            with self._mutex:
+                if self._max_per_key and self._running[key] >= self._max_per_key:
+                    self._deferred[key].append(item)
+                    continue
+                self._running[key] += 1
+
+            # Keep working on deferred jobs with the same key so the cap is respected
+            while item != None:
+                # The job stops waiting, give its slot back
+                self._slots.release()
+                self._run(*item[1:])
+
+                with self._mutex:
+                    if len(self._deferred[key]) > 0:
+                        item = self._deferred[key].popleft()
+                    else:
+                        del self._deferred[key]
+                        self._running[key] -= 1
+                        if self._running[key] == 0:
+                            del self._running[key]
+                        item = None
+
+    def running(self):
+        """
+        Returns a dict with the number of running jobs per key.
+        """
+        with self._mutex:
+            return dict(self._running)
+
+    def shutdown(self):
+        """
+        Stops the workers once the jobs that are already queued have been run.
+        """
+        if self._shutdown_called:
+            return
+        self._shutdown_called = True
+
+        for _ in self._workers:
+            self._queue.put(None)
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-def import_all(config):
+def plugin_directories(config):
+    """
+    Returns the names of the plugin folders that should be loaded according to the black- and whitelist.
+    """
     import os
-    
-    for module in os.listdir(os.path.dirname(__file__)):
+
+    directories = []
+    for module in sorted(os.listdir(os.path.dirname(__file__))):
         # If using blacklist and module is blacklisted
         if config.getboolean('plugins', 'use_blacklist') and module in config['plugins']['blacklist']:
             continue
@@ -14,6 +18,22 @@ def import_all(config):
         
         if module == "plugintemplate.py" or module == "parsingplugintemplate.py" or module =='__init__.py':
             continue
+
+        if module.startswith('__') or not os.path.isdir(os.path.join(os.path.dirname(__file__), module)):
+            continue
+
+        directories.append(module)
+    return directories
+
+def import_all(config, skip=()):
+    """
+    Imports the plugins in all plugin folders except the ones in <skip>.
+    """
+    import os
+    
+    for module in plugin_directories(config):
+        if module in skip:
+            continue
         
         for submod in os.listdir(os.path.dirname(__file__) + "/" + module):
             if not submod[-3:] == '.py' or submod == '__init__.py':
@@ -21,6 +41,3 @@ def import_all(config):
             
             ans = "{}.{}".format(module, submod[:-3])
             __import__(ans, globals(), locals(), level=1)
-    
-    del module
-    del os
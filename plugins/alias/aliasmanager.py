@@ -73,7 +73,14 @@ class AliasManagerPlugin(ParsingPluginTemplate):
         self._regex = "^\s*[aA][dD]{2}\s+([\w\-\_]+)\s+[tT][oO]\s+([\w\-\_]+)\s*$"
         self._mutex = threading.Lock()        
         
-        self._manager = AliasStorageManager(self._bot.get_base_data_path(), self._config.get('alias', 'filename', fallback='aliases'))
+        # Read once, get_alias() is called for every message that asks for its alias
+        self._alias_prefix = self._config.get('alias', 'alias_prefix', fallback="#")
+        self._real_name_prefix = self._config.get('alias', 'real_name_prefix', fallback="@")
+
+        self._manager = AliasStorageManager(self._bot.get_base_data_path(), self._config.get('alias', 'filename', fallback='aliases'),
+                                            on_change=self._bot.invalidate_alias)
+        # Aliases cached by an earlier instance of the plugin might have other prefixes
+        self._bot.invalidate_alias()
             
         self._pendingaccepts = []
 
@@ -86,6 +93,15 @@ class AliasManagerPlugin(ParsingPluginTemplate):
         
         self._bot.offer_service("alias", aliasing_service) 
 
+    def get_handoff_state(self):
+        # Invites that have not been accepted yet only live in memory
+        with self._mutex:
+            return list(self._pendingaccepts)
+
+    def set_handoff_state(self, state):
+        with self._mutex:
+            self._pendingaccepts = state
+
     def parse(self, message):
         #TODO port to jargparse
         if not self._bot.get_config().getboolean('global', 'use_aliases'):
@@ -119,7 +135,7 @@ class AliasManagerPlugin(ParsingPluginTemplate):
                 return 'Created alias "{}". It is now your alias.'.format(opt[1].strip())
             
             if opt[0] == '--owners':
-                owners = self._manager.getOwners(opt[1])
+                owners = self._manager.get_owners(opt[1])
                 if len(owners) == 0:
                     return 'Alias "{}" does not exists.'.format(opt[1])
                 return "{}.".format(", ".join(owners))
@@ -143,7 +159,7 @@ class AliasManagerPlugin(ParsingPluginTemplate):
                     pa = self._pendingaccepts[i]
                     if pa[0] == account:
                         if pa[1] == opt[1]:
-                            if self._manager.addAlias(opt[1], pa[2], account):
+                            if self._manager.add_alias(opt[1], pa[2], account):
                                 return 'Successfully added alias "{}" to account "{}".'.format(opt[1], account)
                                 del self._pendingaccepts[i]
                             else:
@@ -161,7 +177,7 @@ class AliasManagerPlugin(ParsingPluginTemplate):
             alias = matching.group(2)
             #print(alias)
             account = matching.group(1)
-            owners = self._manager.getOwners(alias)
+            owners = self._manager.get_owners(alias)
             if not message.get_sender() in owners:
                 if len(owners) == 0:
                     return "Alias \"{}\" does not exists.".format(alias) 
@@ -177,6 +193,6 @@ class AliasManagerPlugin(ParsingPluginTemplate):
             raise ValueError("Sender must be a string. Was a {}.".format(type(sender)))
         ans = self._manager.get_alias(sender)
         if ans == None:
-            return "{}{}".format(self._config.get('alias', 'real_name_prefix', fallback="@"), sender)
-        return "{}{}".format(self._config.get('alias', 'alias_prefix', fallback="#"), ans) 
+            return "{}{}".format(self._real_name_prefix, sender)
+        return "{}{}".format(self._alias_prefix, ans)
         
@@ -23,7 +23,11 @@ class AliasStorageManager():
         a.addAlias("fb", "baarfoo", "foobar") # True
     """
     
-    def __init__(self, base_path, filename):
+    def __init__(self, base_path, filename, on_change=None):
+        """
+        on_change - Called with the account whenever the alias of an account changes.
+        """
+        self._on_change = on_change
         
         if base_path == None:
             self._path_accountaliases = "/tmp/accountaliases.json"
@@ -76,6 +80,7 @@ class AliasStorageManager():
             self._aliasowners[alias] =  [account]
             self._accountaliases[account] = alias
         self.save()
+        self._changed(account)
         return True
         
     # Checks if alias exists    
@@ -94,13 +99,18 @@ class AliasStorageManager():
     # Returns True if account successfully added to alias
     # False otherwise
     def add_alias(self, alias, opaccount, accounttoadd):
-        if not opaccount in self.getOwners(alias):
+        if not opaccount in self.get_owners(alias):
             return False
         with self._mutex:
             self._accountaliases[accounttoadd] = alias
             self._aliasowners[alias] += [accounttoadd]
         self.save()
+        self._changed(accounttoadd)
         return True
+
+    def _changed(self, account):
+        if self._on_change != None:
+            self._on_change(account)
         
     def save(self):
         with self._mutex:
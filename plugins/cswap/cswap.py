@@ -44,6 +44,12 @@ class CSwapPlugin(PluginTemplate):
         
         self.last = message.get_text()
     
+    def get_handoff_state(self):
+        return self.last
+
+    def set_handoff_state(self, state):
+        self.last = state
+    
     def __spoon_wrapper(self, message):
         return spoon(message.get_text())
     
@@ -6,8 +6,39 @@ Created 14-04-2018
 """
 
 from plugins.plugintemplate import PluginTemplate
+from libs import processpool
 import libs.nlp.similar
 
+def respond(message):
+    """
+    Runs suggest() in a worker process, see non_commandtracker in the [processes] settings.
+    """
+    suggest(processpool.get_bot(), message)
+
+def suggest(bot, message):
+    """
+    Suggests commands similar to the one that was not found.
+    """
+    prefix = bot.get_command_prefix()
+
+    text = message.get_text().strip()
+
+    text = text[len(prefix):]
+    command = text.split(" ")[0]
+    
+    if __debug__:
+        bot.log('NonCommandTracker::Found a non-existing command: "{}."'.format(command))
+
+    return_message_text = 'Command "{prefix}{command}" was not found. Try using "{prefix}commands" for a list of commands.'.format(command=command, prefix=prefix)
+
+    #if self._config.getboolean('non-commandtracker', 'suggestCommands'):
+    commands = '", "{prefix}'.join(libs.nlp.similar.possibilities(command, list(bot.get_commands().keys()))).format(prefix=prefix)
+    return_message_text += '\nCould you have ment: "{prefix}{commands}"?'.format(commands=commands, prefix=prefix)
+
+    ans = message.respond(RuntimeError(return_message_text), bot.get_nick())
+
+    bot.add_message(ans)
+
 class NonCommandTracker(PluginTemplate):
     def __init__(self, bot):
         self._config = bot.get_config()
@@ -25,24 +56,11 @@ class NonCommandTracker(PluginTemplate):
 
             return True
 
-        self._bot.add_event_listener('on_message', self.respond, prefilter=ffilter)
+        # Comparing against every command is heavy on the CPU, but reaching the bot from a worker process costs more
+        if self._config.getboolean('processes', 'non_commandtracker', fallback=False):
+            self._bot.add_event_listener('on_message', respond, prefilter=ffilter, process=True)
+        else:
+            self._bot.add_event_listener('on_message', self.respond, prefilter=ffilter)
 
     def respond(self, message):
-
-        text = message.get_text().strip()
-
-        text = text[1:]
-        command = text.split(" ")[0]
-        
-        if __debug__:
-            self.log('Found a non-existing command: "{}."'.format(command))
-
-        return_message_text = 'Command "{prefix}{command}" was not found. Try using "{prefix}commands" for a list of commands.'.format(command=command, prefix=self._config['global']['prefix'])
-
-        #if self._config.getboolean('non-commandtracker', 'suggestCommands'):
-        commands = '", "{prefix}'.join(libs.nlp.similar.possibilities(command, list(self._bot.get_commands().keys()))).format(prefix=self._config['global']['prefix'])
-        return_message_text += '\nCould you have ment: "{prefix}{commands}"?'.format(commands=commands, prefix=self._config['global']['prefix'])
-
-        ans = message.respond(RuntimeError(return_message_text), self._bot.get_nick())
-
-        self._bot.add_message(ans)
+        suggest(self._bot, message)
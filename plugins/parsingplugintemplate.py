@@ -7,9 +7,11 @@ A basic template that allow parsing.
 Plugins that has functionallity that use user input will benifit from this template.
 
 Classes that inherit from this method is expected to have a method called 'parse' which accepts a JanteMessage object.
+'parse' may also be a coroutine (async def parse), it is then run on the event loop of the asyncio core.
 """
 
 import re
+import inspect
 import traceback
 from abc import ABCMeta, abstractmethod
 
@@ -20,7 +22,10 @@ class ParsingPluginTemplate(PluginTemplate):
     def __init__(self, bot, description="This plugin does not yet have a description", command=None):
         
         if command != None:
-            bot.add_command_listener(command, self.parsewrap, strip_preamble=True)
+            if inspect.iscoroutinefunction(self.parse):
+                bot.add_command_listener(command, self.async_parsewrap, strip_preamble=True)
+            else:
+                bot.add_command_listener(command, self.parsewrap, strip_preamble=True)
         else:
             raise Exception("A parsingbotplugin called super constructor without a command.")
         
@@ -33,11 +38,26 @@ class ParsingPluginTemplate(PluginTemplate):
             result = self.parse(message)
         
         except Exception as e:
-            errormsg = traceback.format_exc()
-            post_link = self.error_with_post('{}\nError while parsing in plugin "{}."'.format(errormsg, self.__class__.__name__))
-            
-            self.send_message(message.respond(Exception('Error in "{}"-plugin parse method. See {}'.format(self.__class__.__name__, post_link)), self.__class__.__name__))
+            self._parse_failed(message)
             return
+        self._send_result(message, result)
+
+    async def async_parsewrap(self, message):
+        try:
+            result = await self.parse(message)
+
+        except Exception as e:
+            self._parse_failed(message)
+            return
+        self._send_result(message, result)
+
+    def _parse_failed(self, message):
+        errormsg = traceback.format_exc()
+        post_link = self.error_with_post('{}\nError while parsing in plugin "{}."'.format(errormsg, self.__class__.__name__))
+
+        self.send_message(message.respond(Exception('Error in "{}"-plugin parse method. See {}'.format(self.__class__.__name__, post_link)), self.__class__.__name__))
+
+    def _send_result(self, message, result):
         # If the message was ment for a user but is empty, report it as an error just in case.
         if not message.is_internal() and result == "":
             self.send_message(message.respond(RuntimeError("{} returned an empty string.".format(self.__class__.__name__)), self.__class__.__name__))
@@ -19,7 +19,7 @@ class JantePastePlugin(ParsingPluginTemplate):
         
         super(JantePastePlugin, self).__init__(bot,command=self._config.get('paste', 'command', fallback='paste'), description='A pastebin designed to be used with the janteweb feature. Offers the pasting service.')
         
-        self.paste_db = JantePasteDB()
+        self.paste_db = JantePasteDB(clock=bot.get_clock())
         bot.register_web_route('/paste', self.webparse)
         
         pasting_service = Service("""
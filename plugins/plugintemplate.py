@@ -4,6 +4,10 @@
 @Author Felix Hedenström
 A base plugin. Contains the most basic features a plugin can have.
 Does not automatically support parsing, which means such functionallity has to be manually added or any plugin inheriting directly from PluginTemplate should not be directly interactive, e.g. a logger or something that only sends things to users without being able to recieve.
+
+Messages given to event handlers are shared by all handlers of the event and frozen, changing one
+raises FrozenMessageError. A handler that wants to change a message (e.g its text) changes a
+message.clone() instead. Plugins that changed the received message in place have to clone it first.
 """
 
 
@@ -21,6 +25,19 @@ class PluginTemplate(object):
     
     def get_description(self):
         return self._description
+
+    def get_handoff_state(self):
+        """
+        Called when the plugin is reloaded, after its handlers have finished.
+        Whatever is returned is given to set_handoff_state() of the new instance of the plugin.
+        """
+        return None
+
+    def set_handoff_state(self, state):
+        """
+        Called on the new instance of a reloaded plugin with the state of the old instance.
+        """
+        pass
     
     def error(self, text):
         self._bot.error(self._format_log(text))
@@ -36,7 +53,7 @@ class PluginTemplate(object):
     def debuglog(self, *text):
         if __debug__:
             for t in text:
-                self.log("DEBUG::{}".format(self._format_log(t)))
+                self._bot.debug("DEBUG::{}::{}", self.__class__.__name__, t)
     def debug(self, *text):
         self.debuglog(text)
         
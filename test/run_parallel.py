@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs every test module in a process of its own, a number of them at a time.
+The bots of the tests have data folders of their own, so the modules do not disturb each other.
+
+Usage (from the test folder): python3 run_parallel.py [-j jobs] [module ...]
+"""
+
+import os
+import sys
+import glob
+import argparse
+import subprocess
+import concurrent.futures
+
+def run(module):
+    result = subprocess.run([sys.executable, "-m", "unittest", module],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    return module, result.returncode, result.stdout
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Runs the test modules in parallel.", prog="run_parallel")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Modules that run at once.")
+    parser.add_argument("modules", nargs="*", help="Modules to run, all test_*.py by default.")
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    modules = args.modules or sorted(os.path.splitext(f)[0] for f in glob.glob("test_*.py"))
+
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+        for module, returncode, output in executor.map(run, modules):
+            if returncode != 0:
+                failed.append(module)
+                sys.stdout.write(output)
+            print("{:<30} {}".format(module, "ok" if returncode == 0 else "FAILED"))
+
+    if len(failed) > 0:
+        print("Failed: {}".format(", ".join(failed)))
+    return 1 if len(failed) > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,98 @@
+import sys
+import queue
+import threading
+import unittest
+
+sys.path.append("..")
+
+from libs.admission import AdmissionQueue
+from libs.jantemessage import JanteMessage
+
+import util.base_test
+
+class TestAdmissionQueue(unittest.TestCase):
+    def test_round_robin(self):
+        q = AdmissionQueue()
+        for i in range(3):
+            q.put(("a", i), "a", "#c")
+        q.put(("b", 0), "b", "#c")
+
+        self.assertEqual([q.get(0) for _ in range(4)], [("a", 0), ("b", 0), ("a", 1), ("a", 2)])
+        self.assertEqual(q.get(0), None)
+
+    def test_per_sender_limit(self):
+        q = AdmissionQueue(max_per_sender=2)
+        self.assertTrue(q.put(1, "a", "#c"))
+        self.assertTrue(q.put(2, "a", "#c"))
+        self.assertFalse(q.put(3, "a", "#c"))
+        self.assertTrue(q.put(4, "b", "#c"))
+        self.assertEqual(q.get_shed_counts(), {"chatter": 1})
+
+    def test_command_pushes_out_chatter(self):
+        q = AdmissionQueue(size=2)
+        q.put("chatter", "a", "#c")
+        q.put("other chatter", "b", "#c")
+        self.assertTrue(q.put("!command", "c", "#c", important=True))
+
+        self.assertEqual([q.get(0), q.get(0)], ["other chatter", "!command"])
+        self.assertEqual(q.get_shed_counts(), {"chatter": 1})
+
+    def test_commands_only(self):
+        q = AdmissionQueue(size=1)
+        q.put("!a", "a", "#c", important=True)
+        self.assertFalse(q.put("!b", "b", "#c", important=True))
+        self.assertEqual(q.get_shed_counts(), {"commands": 1})
+
+    def test_per_channel_limit(self):
+        q = AdmissionQueue(max_per_channel=1)
+        q.put(1, "a", "#c")
+        self.assertFalse(q.put(2, "b", "#c"))
+        self.assertTrue(q.put(3, "b", "#d"))
+        self.assertEqual(q.qsize(), 2)
+
+class TestOverload(util.base_test.BaseTest):
+    def setUp(self):
+        self._config['admission']['overload_handlers'] = "0"
+        super().setUp()
+
+    def test_chatter_is_shed(self):
+        bot = self.get_bot()
+        bot._dispatch_message(JanteMessage("hello", sender="a", address="#c"))
+        bot._dispatch_message(JanteMessage("!echo hello", sender="a", address="#c"))
+        # Looks like a command, but there is none
+        bot._dispatch_message(JanteMessage("!nosuchcommand", sender="a", address="#c"))
+
+        self.assertTrue(bot.is_overloaded())
+        self.assertEqual(bot._admission.get_shed_counts(), {"chatter": 2, "chatter_listeners": 1})
+
+    def test_only_commands_are_important(self):
+        bot = self.get_bot()
+        self.assertTrue(bot._is_command(JanteMessage("!echo hello", sender="a", address="#c")))
+        self.assertFalse(bot._is_command(JanteMessage("!nosuchcommand", sender="a", address="#c")))
+        self.assertFalse(bot._is_command(JanteMessage("hello", sender="a", address="#c")))
+
+class TestHandlerLimit(util.base_test.BaseTest):
+    def setUp(self):
+        self._config['admission']['max_handlers'] = "1"
+        super().setUp()
+
+    def test_commands_wait_for_handlers(self):
+        release = threading.Event()
+        started = queue.Queue()
+
+        def block(message):
+            started.put(message.get_text())
+            release.wait(5)
+
+        self.get_bot().add_command_listener('block', block)
+        self.inject(JanteMessage("!block 1", sender="a", address="#c"))
+        self.inject(JanteMessage("!block 2", sender="b", address="#c"))
+
+        self.assertEqual(started.get(timeout=5), "!block 1")
+        with self.assertRaises(queue.Empty):
+            started.get(timeout=0.2)
+        release.set()
+        self.assertEqual(started.get(timeout=5), "!block 2")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,11 @@ class TestAlias(util.base_test.BaseTest):
 
     def test_no_alias(self):
         self._config['global']['use_aliases'] = "True"
-        
-        #Evaluator does not have enough functionallity to properly test alias
-        #self.assertEqual(self.eval("!alias --my-alias", sender="alice"), "@alice")
+        self.assertEqual(self.eval("!alias --my-alias", sender="alice"), "@alice")
+
+    def test_cached_alias_changes(self):
+        self._config['global']['use_aliases'] = "True"
+
+        self.assertEqual(self.eval("!alias --my-alias", sender="carol"), "@carol")
+        self.assertEqual(self.eval("!alias --create carolsalias", sender="carol"), 'Created alias "carolsalias". It is now your alias.')
+        self.assertEqual(self.eval("!alias --my-alias", sender="carol"), "#carolsalias")
@@ -0,0 +1,25 @@
+import asyncio
+
+import util.base_test
+
+class TestAsyncCore(util.base_test.BaseTest):
+    def setUp(self):
+        self._config['global']['core'] = "asyncio"
+        super().setUp()
+
+    def test_sync_plugin(self):
+        self.assertEqual(self.eval("!echo test"), "test")
+
+    def test_coroutine_listener(self):
+        async def shout(message):
+            await asyncio.sleep(0)
+            return message.get_text().upper()
+
+        self.get_bot().add_command_listener('shout', shout, strip_preamble=True, direct_reply=True)
+
+        self.assertEqual(self.eval("!shout hello"), "HELLO")
+
+    def test_no_service_threads(self):
+        # Dispatch and the scheduler run on the loop
+        self.assertEqual(self.eval("!echo test"), "test")
+        self.assertEqual(self.get_bot()._service_threads, [])
@@ -1,6 +1,33 @@
 import util.base_test
 
+from libs.workerpool import WorkerPool
+
 class TestBot(util.base_test.BaseTest):
     def test_base(self):
         self.assertEqual(1, 1)
 
+
+    def test_timer_tick_only_while_listened(self):
+        bot = self.get_bot()
+        def tick_names():
+            return [job.get_name() for job in bot.get_scheduler().pending() if job.get_name() == "on_timer_tick"]
+
+        def on_timer_tick(timeval):
+            pass
+
+        self.assertEqual(tick_names(), [])
+        bot.add_event_listener('on_timer_tick', on_timer_tick)
+        self.assertEqual(tick_names(), ["on_timer_tick"])
+        bot.remove_event_listener('on_timer_tick', on_timer_tick)
+        self.assertEqual(tick_names(), [])
+
+class TestPoolDispatch(util.base_test.BaseTest):
+    def setUp(self):
+        self._config['events']['dispatch'] = "pool"
+        self._config['events']['max_per_event'] = "4"
+        super().setUp()
+
+    def test_handlers_run_in_pool(self):
+        self.assertIsInstance(self.get_bot()._executor, WorkerPool)
+        self.assertEqual(self.eval("!echo test"), "test")
+        self.assertIsInstance(self.eval("!thisisnotacommandimprettysure"), RuntimeError)
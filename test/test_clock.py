@@ -0,0 +1,94 @@
+import sys
+import queue
+import threading
+import unittest
+import configparser
+
+sys.path.append("..")
+
+from libs.clock import SimulatedClock
+from libs.scheduler import Scheduler
+from libs.jantepastedb import JantePasteDB
+
+from util.evaluator import Evaluator
+
+class TestSimulatedClock(unittest.TestCase):
+    def test_advance(self):
+        clock = SimulatedClock(start=1000.0)
+        self.assertEqual(clock.time(), 1000.0)
+        clock.advance(2.5)
+        self.assertEqual(clock.time(), 1002.5)
+        self.assertEqual(clock.monotonic(), 2.5)
+
+    def test_sleep(self):
+        clock = SimulatedClock()
+        woke = threading.Event()
+
+        def sleeper():
+            clock.sleep(10)
+            woke.set()
+
+        threading.Thread(target=sleeper).start()
+        clock.advance(5)
+        self.assertFalse(woke.wait(0.05))
+        clock.advance(5)
+        self.assertTrue(woke.wait(1))
+
+    def test_a_day_of_jobs(self):
+        clock = SimulatedClock()
+        scheduler = Scheduler(clock=clock)
+        runs = []
+        scheduler.every(60, lambda: runs.append(clock.time()))
+        scheduler.call_later(3600, lambda: runs.append("once"))
+
+        clock.advance(24 * 60 * 60, scheduler=scheduler)
+
+        self.assertEqual(len(runs), 24 * 60 + 1)
+        self.assertEqual(runs[0], clock.time() - 24 * 60 * 60 + 60)
+        self.assertEqual(runs.count("once"), 1)
+
+    def test_started_scheduler(self):
+        clock = SimulatedClock()
+        scheduler = Scheduler(clock=clock)
+        done = threading.Event()
+        scheduler.call_later(30, done.set)
+        scheduler.start()
+        try:
+            clock.advance(10)
+            self.assertFalse(done.wait(0.05))
+            clock.advance(20)
+            self.assertTrue(done.wait(1))
+        finally:
+            scheduler.stop()
+
+    def test_paste_ttl(self):
+        clock = SimulatedClock()
+        db = JantePasteDB(clock=clock)
+        key = db.post("text", ttl=3600)
+
+        clock.advance(3599)
+        self.assertTrue(db.contains(key))
+        clock.advance(1)
+        self.assertFalse(db.contains(key))
+
+class TestBotClock(unittest.TestCase):
+    def test_scheduled_jobs(self):
+        config = configparser.ConfigParser()
+        config.read('test-settings.ini')
+        clock = SimulatedClock()
+
+        evaluator = Evaluator(config, clock=clock)
+        try:
+            bot = evaluator.get_bot()
+            runs = queue.Queue()
+            bot.schedule_interval(3600, lambda: runs.put(clock.time()))
+
+            clock.advance(24 * 3600, scheduler=bot.get_scheduler())
+            for _ in range(24):
+                runs.get(timeout=1)
+            self.assertTrue(runs.empty())
+        finally:
+            evaluator.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
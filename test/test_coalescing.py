@@ -0,0 +1,147 @@
+import sys
+import queue
+import unittest
+import configparser
+
+sys.path.append("..")
+
+from libs.coalescing import Coalescer
+from libs.jantemessage import JanteMessage
+
+from util.evaluator import Evaluator
+
+def message(text, address="#c"):
+    return JanteMessage(text, sender="Jante", address=address)
+
+class TestCoalescer(unittest.TestCase):
+    def setUp(self):
+        self._delivered = []
+
+    def coalescer(self, window, **kwargs):
+        return Coalescer(window, deliver=self._delivered.append, **kwargs)
+
+    def delivered(self):
+        texts = [m.get_text() for m in self._delivered]
+        self._delivered.clear()
+        return texts
+
+    def test_merge(self):
+        coalescer = self.coalescer(1.0)
+        for text in ["a", "b", "c"]:
+            coalescer.add(message(text), 0.0)
+        coalescer.add(message("other", address="#d"), 0.5)
+        self.assertEqual(self.delivered(), [])
+
+        self.assertEqual(coalescer.next_deadline(), 1.0)
+        coalescer.due(1.0)
+        self.assertEqual(self.delivered(), ["a\nb\nc"])
+        self.assertEqual(len(coalescer), 1)
+        coalescer.due(1.5)
+        self.assertEqual(self.delivered(), ["other"])
+
+    def test_disabled(self):
+        coalescer = self.coalescer(0)
+        coalescer.add(message("a"), 0.0)
+        self.assertEqual(self.delivered(), ["a"])
+
+    def test_internal_keeps_order(self):
+        coalescer = self.coalescer(1.0)
+        coalescer.add(message("a"), 0.0)
+        coalescer.add(message("internal", address=("testing", 1)), 0.1)
+        self.assertEqual(self.delivered(), ["internal"])
+
+        coalescer.add(message(ValueError("no")), 0.2)
+        self.assertEqual(self.delivered()[0], "a")
+
+    def test_stale_deadline(self):
+        coalescer = self.coalescer(1.0)
+        coalescer.add(message("a"), 0.0)
+        coalescer.add(message(ValueError("no")), 0.5)
+        coalescer.add(message("b"), 0.9)
+        self.delivered()
+
+        # The deadline of "a" is gone, "b" gets its whole window
+        self.assertEqual(coalescer.next_deadline(), 1.9)
+        coalescer.due(1.0)
+        self.assertEqual(self.delivered(), [])
+        coalescer.due(1.9)
+        self.assertEqual(self.delivered(), ["b"])
+
+    def test_paste_in_background(self):
+        jobs = []
+        coalescer = self.coalescer(1.0, max_length=10, paste=lambda text: "pasted", background=jobs.append)
+        for text in ["aaaaaa", "bbbbbb"]:
+            coalescer.add(message(text), 0.0)
+        coalescer.flush()
+        coalescer.add(message("after"), 0.5)
+        self.assertEqual(self.delivered(), [])
+
+        jobs[0]()
+        self.assertEqual(self.delivered(), ["pasted", "after"])
+        self.assertEqual(len(coalescer), 0)
+
+    def test_only_alike_are_merged(self):
+        coalescer = self.coalescer(1.0)
+        coalescer.add(message("a"), 0.0)
+        coalescer.add(message("b"), 0.0)
+        everyone = message("everyone").set_send_to_all(True)
+        coalescer.add(everyone, 0.1)
+        coalescer.add(message("c"), 0.2)
+
+        # The broadcast releases what was held before it and is not folded into a reply
+        self.assertEqual(self.delivered(), ["a\nb", "everyone"])
+        self.assertEqual(len(coalescer), 1)
+        coalescer.flush()
+        self.assertEqual(self.delivered(), ["c"])
+
+    def test_unmergeable_waits_for_paste(self):
+        jobs = []
+        coalescer = self.coalescer(1.0, max_length=10, paste=lambda text: "pasted", background=jobs.append)
+        for text in ["aaaaaa", "bbbbbb"]:
+            coalescer.add(message(text), 0.0)
+        coalescer.add(message("everyone").set_send_to_all(True), 0.5)
+        self.assertEqual(self.delivered(), [])
+
+        jobs[0]()
+        self.assertEqual(self.delivered(), ["pasted", "everyone"])
+
+    def test_chunks(self):
+        errors = []
+
+        def paste(text):
+            raise RuntimeError("no paste service")
+
+        coalescer = self.coalescer(1.0, max_length=10, paste=paste, on_error=errors.append, background=lambda job: job())
+        for text in ["aaaa", "bbbb", "cccc", "dddddddddddd"]:
+            coalescer.add(message(text), 0.0)
+        coalescer.flush()
+
+        self.assertEqual(self.delivered(), ["aaaa\nbbbb", "cccc", "dddddddddddd"])
+        self.assertEqual(len(errors), 1)
+
+class TestBotCoalescing(unittest.TestCase):
+    def test_burst(self):
+        config = configparser.ConfigParser()
+        config.read('test-settings.ini')
+        config.set('sender', 'coalesce_window', '0.1')
+
+        evaluator = Evaluator(config)
+        try:
+            bot = evaluator.get_bot()
+            sent = queue.Queue()
+
+            def listener(message):
+                sent.put(message)
+
+            bot.add_event_listener('on_message_sent', listener, prefilter=lambda message: message.get_address() == "#coalesce")
+
+            for i in range(5):
+                bot.add_message(message("line {}".format(i), address="#coalesce"))
+
+            self.assertEqual(sent.get(timeout=2).get_text(), "\n".join("line {}".format(i) for i in range(5)))
+            self.assertTrue(sent.empty())
+        finally:
+            evaluator.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import util.base_test
 
 class TestEcho(util.base_test.BaseTest):
+    shared_bot = True
+
     def test_base(self):
         self.assertEqual(self.eval("!echo test"), "test")
     def test_capitalization(self):
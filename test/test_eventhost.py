@@ -0,0 +1,94 @@
+import sys
+import unittest
+import concurrent.futures
+
+sys.path.append("..")
+
+from libs.eventhost import EventHost
+
+class TestEventHost(unittest.TestCase):
+    def setUp(self):
+        self._host = EventHost()
+        self._calls = []
+
+        def on_text(text): pass
+        self._host.create_event("on_text", on_text, router=lambda text: text.split(" ")[0])
+
+    def _wait(self, work):
+        concurrent.futures.wait(work)
+
+    def test_route(self):
+        def a(text): self._calls.append(("a", text))
+        def b(text): self._calls.append(("b", text))
+        def anything(text): self._calls.append(("*", text))
+
+        self._host.add_event_listener("on_text", a, route="a")
+        self._host.add_event_listener("on_text", b, route="b")
+        self._host.add_event_listener("on_text", anything)
+
+        self._wait(self._host.fire_event("on_text", text="a foo"))
+        self._wait(self._host.fire_event("on_text", text="c bar"))
+
+        self.assertEqual(sorted(self._calls), [("*", "a foo"), ("*", "c bar"), ("a", "a foo")])
+
+    def test_remove_route(self):
+        def a(text): self._calls.append(text)
+
+        self._host.add_event_listener("on_text", a, route="a")
+        self._host.remove_event_listener("on_text", a, route="a")
+
+        self.assertEqual(self._host.fire_event("on_text", text="a foo"), [])
+
+    def test_waiting_route(self):
+        def later(text): self._calls.append(text)
+        def on_later(text): pass
+
+        self._host.add_event_listener("on_later", later, route="x")
+        self._host.create_event("on_later", on_later, router=lambda text: text)
+
+        self._wait(self._host.fire_event("on_later", text="x"))
+        self._wait(self._host.fire_event("on_later", text="y"))
+
+        self.assertEqual(self._calls, ["x"])
+
+    def test_validate(self):
+        with self.assertRaises(Exception):
+            self._host.fire_event("on_text", txt="a")
+
+    def test_no_validate(self):
+        host = EventHost(validate=False)
+        def on_text(text): pass
+        host.create_event("on_text", on_text)
+
+        self.assertEqual(host.fire_event("on_text", txt="a"), [])
+
+    def test_listener_signature(self):
+        def wrong(txt): pass
+
+        with self.assertRaises(Exception):
+            self._host.add_event_listener("on_text", wrong)
+
+    def test_shared_message(self):
+        from libs.jantemessage import JanteMessage, FrozenMessageError
+
+        def on_message(message): pass
+        self._host.create_event("on_message", on_message)
+
+        seen = []
+        def a(message): seen.append(message)
+        def b(message): seen.append(message)
+        self._host.add_event_listener("on_message", a)
+        self._host.add_event_listener("on_message", b)
+
+        m = JanteMessage("hello", sender="alice", address="#chat")
+        self._wait(self._host.fire_event("on_message", message=m))
+
+        self.assertIs(seen[0], seen[1])
+        with self.assertRaises(FrozenMessageError):
+            seen[0].set_text("changed")
+        self.assertEqual(seen[0].clone().set_text("changed").get_text(), "changed")
+
+        # The caller's message is not frozen, the listeners got a frozen clone of it
+        self.assertIsNot(seen[0], m)
+        self.assertEqual(m.set_text("mine").get_text(), "mine")
+        self.assertEqual(seen[0].get_text(), "hello")
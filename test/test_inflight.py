@@ -0,0 +1,59 @@
+import sys
+import threading
+import unittest
+import concurrent.futures
+
+sys.path.append("..")
+
+from libs.inflight import InFlight, run_in_thread, describe
+
+class Plugin:
+    def handler(self, message):
+        pass
+
+class TestInFlight(unittest.TestCase):
+    def test_done_work_is_removed(self):
+        inflight = InFlight()
+        future = concurrent.futures.Future()
+        inflight.add(future, "on_message", name="handler")
+
+        self.assertEqual(len(inflight), 1)
+        self.assertEqual(inflight.count_by_event(), {"on_message": 1})
+
+        future.set_result(None)
+        self.assertEqual(len(inflight), 0)
+
+    def test_count_by_plugin(self):
+        inflight = InFlight()
+        plugin = Plugin()
+        for _ in range(3):
+            inflight.add(concurrent.futures.Future(), "on_message", plugin.handler)
+
+        self.assertEqual(inflight.count_by_plugin(), {"Plugin": 3})
+        self.assertEqual(inflight.running()[0].handler, "Plugin.handler")
+
+    def test_join(self):
+        inflight = InFlight()
+        release = threading.Event()
+        inflight.add(run_in_thread(release.wait, {}, "waiting"), "on_message", name="waiting")
+
+        self.assertFalse(inflight.join(timeout=0.05))
+        release.set()
+        self.assertTrue(inflight.join(timeout=2))
+
+    def test_run_in_thread_exception(self):
+        future = run_in_thread(lambda: 1 / 0, {}, "failing")
+        self.assertIsInstance(future.exception(timeout=2), ZeroDivisionError)
+
+    def test_describe_wrapper(self):
+        import functools
+        plugin = Plugin()
+
+        @functools.wraps(plugin.handler)
+        def wrapper(message):
+            pass
+
+        self.assertEqual(describe(wrapper), ("Plugin", "Plugin.handler"))
+
+if __name__ == '__main__':
+    unittest.main()
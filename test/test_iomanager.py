@@ -0,0 +1,86 @@
+import sys
+import time
+import threading
+import pickle
+import unittest
+import configparser
+
+sys.path.append("..")
+
+from libs.jantemessage import JanteMessage
+from libs.janteio.iomanager import IOManager
+
+from util.evaluator import Evaluator
+
+class TestBackendMessage(unittest.TestCase):
+    def test_backend_is_kept(self):
+        m = JanteMessage("hi", sender="a", address="#c")
+        m.set_backend("irc")
+
+        self.assertEqual(m.respond("ho", "Jante").get_backend(), "irc")
+        self.assertEqual(m.clone().get_destination(), ("irc", "#c"))
+        self.assertEqual(pickle.loads(pickle.dumps(m)).get_backend(), "irc")
+
+class TestSeveralBackends(unittest.TestCase):
+    def setUp(self):
+        config = configparser.ConfigParser()
+        config.read('test-settings.ini')
+        self._evaluator = Evaluator(config, iotype=["testing:a", "testing:b"])
+        self._bot = self._evaluator.get_bot()
+
+    def tearDown(self):
+        self._evaluator.shutdown()
+
+    def wait_for_sent(self, backend, n=1):
+        io = self._bot._io.get_io(backend)
+        deadline = time.monotonic() + 5
+        while len(io.get_sent()) < n and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return [m.get_text() for m in io.get_sent()]
+
+    def test_replies_go_back(self):
+        # The same address in both backends is two different chats
+        self._evaluator.inject(JanteMessage("!echo from a", sender="tester", address="#c"), backend="a")
+        self._evaluator.inject(JanteMessage("!echo from b", sender="tester", address="#c"), backend="b")
+
+        self.assertEqual(self.wait_for_sent("a"), ["from a"])
+        self.assertEqual(self.wait_for_sent("b"), ["from b"])
+
+    def test_default_backend(self):
+        self.assertEqual(self._bot._io.get_types(), ["a", "b"])
+        self._bot.add_message(JanteMessage("no backend", sender="Jante", address="#c"))
+
+        self.assertEqual(self.wait_for_sent("a"), ["no backend"])
+
+    def test_send_to_all(self):
+        self._bot.add_message(JanteMessage("everyone", sender="Jante", address="#c", send_to_all=True))
+        self.assertEqual(self.wait_for_sent("a"), ["everyone"])
+        self.assertEqual(self.wait_for_sent("b"), ["everyone"])
+
+        # A broadcast that answers a message stays in the backend of that message
+        m = JanteMessage("only b", sender="Jante", address="#c", send_to_all=True)
+        m.set_backend("b")
+        self._bot.add_message(m)
+        self.assertEqual(self.wait_for_sent("b", 2), ["everyone", "only b"])
+        self.assertEqual(self.wait_for_sent("a"), ["everyone"])
+
+    def test_failing_backend_backs_off(self):
+        io = IOManager(["testing:a", "testing:b"], self._bot)
+        calls = []
+        def recieve():
+            calls.append(time.monotonic())
+            raise OSError("gone")
+        io.get_io("b").recieve = recieve
+
+        threading.Thread(target=io._read, args=("b", io.get_io("b")), daemon=True).start()
+        time.sleep(0.5)
+        io.stop()
+        # 0.1 + 0.2 seconds of waiting leaves room for three or four reads, not thousands
+        self.assertLess(len(calls), 6)
+
+    def test_names_must_differ(self):
+        with self.assertRaises(ValueError):
+            IOManager(["testing", "testing"], self._bot)
+
+if __name__ == '__main__':
+    unittest.main()
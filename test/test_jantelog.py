@@ -0,0 +1,127 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.append("..")
+
+from libs import jantelog
+from libs.jantelog import LogWriter
+
+class TestLogWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_format(self):
+        stream = io.StringIO()
+        writer = LogWriter(stream=stream)
+        writer.write("Sending to {}\n\nnext line", ("#a",))
+        writer.flush()
+        writer.close()
+
+        lines = stream.getvalue().split("\n")
+        self.assertEqual(lines[1].strip(), "Sending to #a")
+        self.assertEqual(lines[2].strip(), "next line")
+        self.assertEqual(len(lines), 4)
+
+    def test_no_args_is_not_formatted(self):
+        stream = io.StringIO()
+        writer = LogWriter(stream=stream)
+        writer.write("{not a field}")
+        writer.close()
+
+        self.assertIn("{not a field}", stream.getvalue())
+
+    def test_formatted_in_writer(self):
+        formatted = []
+        class Lazy:
+            def __format__(self, spec):
+                formatted.append(True)
+                return "lazy"
+
+        writer = LogWriter(stream=io.StringIO())
+        writer.write("{}", (Lazy(),))
+        writer.close()
+        self.assertEqual(formatted, [True])
+
+    def test_rotation(self):
+        filename = os.path.join(self.directory, "jante.log")
+        writer = LogWriter(stream=io.StringIO(), filename=filename, max_bytes=200, backup_count=2)
+        for i in range(30):
+            writer.write("line {}", (i,))
+            writer.flush()
+        writer.close()
+
+        self.assertTrue(os.path.exists(filename + ".1"))
+        self.assertTrue(os.path.exists(filename + ".2"))
+        self.assertFalse(os.path.exists(filename + ".3"))
+        self.assertLessEqual(os.path.getsize(filename), 200)
+        with open(filename) as f:
+            self.assertIn("line 29", f.read())
+
+    def test_failing_format(self):
+        class Broken:
+            def __format__(self, spec):
+                raise RuntimeError("broken")
+
+        stream = io.StringIO()
+        writer = LogWriter(stream=stream)
+        writer.write("{}", (Broken(),))
+        writer.write("after")
+        writer.close()
+        self.assertIn("after", stream.getvalue())
+
+    def test_write_after_close(self):
+        filename = os.path.join(self.directory, "jante.log")
+        stream = io.StringIO()
+        writer = LogWriter(stream=stream, filename=filename)
+        writer.close()
+        writer.write("shutting down")
+
+        self.assertIn("shutting down", stream.getvalue())
+        with open(filename) as f:
+            self.assertIn("shutting down", f.read())
+
+    def test_write_after_close_while_busy(self):
+        started = threading.Event()
+        release = threading.Event()
+        class SlowStream(io.StringIO):
+            def write(self, text):
+                started.set()
+                release.wait(5)
+                return super().write(text)
+
+        stream = SlowStream()
+        writer = LogWriter(stream=stream)
+        writer.write("first")
+        started.wait(5)
+        # The join times out, the writer thread is still writing
+        writer.close(timeout=0.05)
+
+        threading.Timer(0.05, release.set).start()
+        writer.write("shutting down")
+        self.assertIn("first", stream.getvalue())
+        self.assertIn("shutting down", stream.getvalue())
+
+    def test_rotation_counts_bytes(self):
+        filename = os.path.join(self.directory, "jante.log")
+        writer = LogWriter(stream=io.StringIO(), filename=filename, max_bytes=200, backup_count=1)
+        for i in range(10):
+            writer.write("åäö {}", (i,))
+            writer.flush()
+        writer.close()
+
+        self.assertLessEqual(os.path.getsize(filename), 200)
+
+    def test_levels(self):
+        self.assertEqual(jantelog.level_from_name("Debug"), jantelog.DEBUG)
+        self.assertLess(jantelog.INFO, jantelog.ERROR)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import sys
+import copy
+import pickle
+import unittest
+
+sys.path.append("..")
+
+from libs.jantemessage import JanteMessage
+
+class PicklableResolver:
+    picklable = True
+    calls = []
+
+    def __call__(self, sender):
+        PicklableResolver.calls.append(sender)
+        return "@" + sender
+
+class TestJanteMessage(unittest.TestCase):
+    def setUp(self):
+        self._m = JanteMessage("hello", sender="alice", recipient="Jante", address="#chat", is_in_group=False)
+
+    def test_respond(self):
+        r = self._m.respond("hi", "Jante")
+        self.assertEqual((r.get_text(), r.get_sender(), r.get_recipient(), r.get_address(), r.is_in_group()),
+                         ("hi", "Jante", "alice", "#chat", False))
+
+    def test_clone(self):
+        self._m.set_alias("#a")
+        c = self._m.freeze().clone()
+        self.assertFalse(c.is_frozen())
+        self.assertEqual(c.to_tuple(), self._m.to_tuple())
+
+    def test_lazy_alias(self):
+        calls = []
+        def resolver(sender):
+            calls.append(sender)
+            return "@" + sender
+
+        self._m.set_alias_resolver(resolver)
+        self.assertEqual(calls, [])
+        self.assertEqual(self._m.get_alias(), "@alice")
+        self.assertEqual(self._m.get_alias(), "@alice")
+        self.assertEqual(calls, ["alice"])
+
+    def test_pickle(self):
+        self._m.set_alias_resolver(lambda sender: "@" + sender)
+        m = pickle.loads(pickle.dumps(self._m))
+        self.assertEqual(m.to_tuple(), ("hello", "alice", "Jante", "#chat", False, False, "@alice"))
+
+    def test_copies_stay_unresolved(self):
+        PicklableResolver.calls.clear()
+        self._m.set_alias_resolver(PicklableResolver())
+        copies = [pickle.loads(pickle.dumps(self._m)), copy.deepcopy(self._m)]
+        self.assertEqual(PicklableResolver.calls, [])
+
+        self.assertEqual([m.get_alias() for m in copies], ["@alice", "@alice"])
+        self.assertEqual(PicklableResolver.calls, ["alice", "alice"])
+
+    def test_received(self):
+        self._m.set_received(12.5)
+        self.assertEqual(self._m.respond("hi", "Jante").get_received(), 12.5)
+        self.assertEqual(pickle.loads(pickle.dumps(self._m)).get_received(), 12.5)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self._m, '__dict__'))
@@ -0,0 +1,54 @@
+import util.base_test
+
+from libs.pluginmanifest import read_manifest
+
+class TestLazyPlugins(util.base_test.BaseTest):
+    def setUp(self):
+        self._config['plugins']['lazy'] = "True"
+        super().setUp()
+
+    def test_commands_are_known_before_loading(self):
+        self.assertIn("roll", self.get_bot().get_commands())
+        self.assertIn("roll", self.get_bot()._lazy_plugins)
+
+    def test_loaded_by_command(self):
+        self.assertEqual(self.eval("!echo test"), "test")
+        self.assertNotIn("echo", self.get_bot()._lazy_plugins)
+        self.assertIn("roll", self.get_bot()._lazy_plugins)
+
+    def test_commands_known_while_loading(self):
+        bot = self.get_bot()
+        seen = []
+        load = bot._Bot__load_plugin
+
+        def checking_load(plugin):
+            seen.append("echo" in bot.get_commands())
+            return load(plugin)
+
+        bot._Bot__load_plugin = checking_load
+        self.assertEqual(self.eval("!echo test"), "test")
+        self.assertTrue(len(seen) > 0 and all(seen))
+        self.assertEqual(bot.get_commands()["echo"]["owner"], "bot.add_command_listener")
+
+    def test_loaded_by_service(self):
+        self.get_bot().get_service("paste")
+        self.assertNotIn("paste", self.get_bot()._lazy_plugins)
+
+    def test_reload_not_loaded(self):
+        self.assertIn("has not been loaded yet", self.get_bot().reload_plugin("roll"))
+
+class TestEagerPlugins(util.base_test.BaseTest):
+    def test_not_lazy(self):
+        self.assertEqual(self.get_bot()._lazy_plugins, {})
+        self.assertEqual(self.eval("!echo test"), "test")
+
+class TestManifest(util.base_test.unittest.TestCase):
+    def test_read(self):
+        manifest = read_manifest("paste", "../plugins/paste")
+        self.assertEqual(manifest.modules, ["jantepaste"])
+        self.assertEqual(manifest.commands, ["paste"])
+        self.assertEqual(manifest.services, ["paste"])
+        self.assertEqual(manifest.routes, ["/paste"])
+
+    def test_no_manifest(self):
+        self.assertEqual(read_manifest("util", "util"), None)
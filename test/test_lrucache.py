@@ -0,0 +1,59 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from libs.lrucache import LRUCache
+
+class TestLRUCache(unittest.TestCase):
+    def test_load_once(self):
+        cache = LRUCache(size=2)
+        loads = []
+
+        def load(key):
+            loads.append(key)
+            return key.upper()
+
+        self.assertEqual(cache.get_or_load("a", load), "A")
+        self.assertEqual(cache.get_or_load("a", load), "A")
+        self.assertEqual(loads, ["a"])
+
+    def test_least_recently_used(self):
+        cache = LRUCache(size=2)
+        cache.get_or_load("a", str.upper)
+        cache.get_or_load("b", str.upper)
+        cache.get_or_load("a", str.upper)
+        cache.get_or_load("c", str.upper)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_or_load("b", lambda key: "reloaded"), "reloaded")
+        self.assertEqual(cache.get_or_load("c", lambda key: "reloaded"), "C")
+
+    def test_invalidate(self):
+        cache = LRUCache()
+        cache.get_or_load("a", lambda key: 1)
+        cache.get_or_load("b", lambda key: 1)
+
+        cache.invalidate("a")
+        self.assertEqual(cache.get_or_load("a", lambda key: 2), 2)
+        self.assertEqual(cache.get_or_load("b", lambda key: 2), 1)
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidated_while_loading(self):
+        cache = LRUCache()
+
+        def load(key):
+            cache.invalidate(key)
+            return "stale"
+
+        cache.get_or_load("a", load)
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled(self):
+        cache = LRUCache(size=0)
+        cache.get_or_load("a", str.upper)
+        self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import sys
+import json
+import unittest
+
+sys.path.append("..")
+
+from libs.metrics import Metrics, Histogram, format_snapshot
+
+import util.base_test
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self):
+        h = Histogram()
+        self.assertEqual(h.percentile(50), None)
+
+        for _ in range(90):
+            h.observe(0.0005)
+        for _ in range(10):
+            h.observe(0.3)
+
+        self.assertEqual(h.percentile(50), 0.001)
+        self.assertEqual(h.percentile(90), 0.001)
+        self.assertEqual(h.percentile(99), 0.5)
+        self.assertEqual(h.to_dict()['count'], 100)
+        self.assertEqual(h.to_dict()['max'], 0.3)
+
+    def test_snapshot(self):
+        m = Metrics()
+        m.increment('fired.a')
+        m.increment('fired.a')
+        with m.timer('command.a'):
+            pass
+        m.set_gauge('queue', lambda: 3)
+
+        snapshot = m.snapshot()
+        self.assertEqual(snapshot['counters'], {'fired.a': 2})
+        self.assertEqual(snapshot['latencies']['command.a']['count'], 1)
+        self.assertEqual(snapshot['gauges'], {'queue': 3})
+        json.dumps(snapshot)
+
+        self.assertEqual(m.snapshot('command.')['counters'], {})
+        self.assertIn('command.a', format_snapshot(snapshot))
+
+class TestBotMetrics(util.base_test.BaseTest):
+    def test_commands(self):
+        self.assertEqual(self.eval("!echo test"), "test")
+
+        metrics = self.get_bot().get_metrics()
+        self.assertEqual(metrics.get_latency('command.echo')['count'], 1)
+        self.assertGreaterEqual(metrics.snapshot()['counters']['fired.on_message'], 1)
+
+        self.assertIn("command.echo", self.eval("!stats"))
+        self.assertIn("inflight", self.eval("!stats"))
+        self.assertIn("listener.", self.eval("!stats listener."))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,3 +3,11 @@ import util.base_test
 class TestEcho(util.base_test.BaseTest):
     def test_base(self):
         self.assertIsInstance(self.eval("!thisisnotacommandimprettysure"), RuntimeError)
+
+class TestNonCommandsInProcess(util.base_test.BaseTest):
+    def setUp(self):
+        self._config['processes']['non_commandtracker'] = "True"
+        super().setUp()
+
+    def test_base(self):
+        self.assertIsInstance(self.eval("!thisisnotacommandimprettysure"), RuntimeError)
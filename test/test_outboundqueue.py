@@ -0,0 +1,58 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from libs.outboundqueue import OutboundQueue, parse_weights, lane_of
+from libs.jantemessage import JanteMessage
+
+def message(text, address="#c", send_to_all=False):
+    return JanteMessage(text, sender="Jante", address=address, send_to_all=send_to_all)
+
+class TestOutboundQueue(unittest.TestCase):
+    def test_lanes(self):
+        self.assertEqual(lane_of(message("a", address=("testing", 1))), 'internal')
+        self.assertEqual(lane_of(message(ValueError("a"))), 'errors')
+        self.assertEqual(lane_of(message("a", send_to_all=True)), 'bulk')
+        self.assertEqual(lane_of(message("a")), 'interactive')
+
+    def test_addresses_take_turns(self):
+        q = OutboundQueue()
+        for i in range(3):
+            q.put(message("dump {}".format(i), address="#dump"))
+        q.put(message("reply", address="#other"))
+
+        texts = [q.get_nowait().get_text() for _ in range(4)]
+        self.assertEqual(texts, ["dump 0", "reply", "dump 1", "dump 2"])
+        self.assertEqual(q.get(timeout=0), None)
+
+    def test_weights(self):
+        q = OutboundQueue(weights=parse_weights("interactive:3 bulk:1"))
+        for i in range(8):
+            q.put(message("bulk", send_to_all=True))
+            q.put(message("reply"))
+
+        texts = [q.get_nowait().get_text() for _ in range(8)]
+        self.assertEqual(texts.count("reply"), 6)
+        self.assertEqual(q.depth('bulk'), 6)
+        self.assertEqual(q.qsize(), 8)
+
+    def test_idle_lane_does_not_catch_up(self):
+        q = OutboundQueue(weights=parse_weights("interactive:1 bulk:1"))
+        for i in range(4):
+            q.put(message("reply"))
+            q.get_nowait()
+        for i in range(4):
+            q.put(message("bulk", send_to_all=True))
+            q.put(message("reply"))
+
+        texts = [q.get_nowait().get_text() for _ in range(4)]
+        self.assertEqual(texts.count("bulk"), 2)
+
+    def test_parse_weights(self):
+        self.assertEqual(parse_weights("")['internal'], 8)
+        with self.assertRaises(ValueError):
+            parse_weights("nolane:1")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+
+import util.base_test
+
+from libs import processpool
+from libs.servicemanager.service import Service
+
+def pid(message):
+    return str(os.getpid())
+
+def shout(message):
+    bot = processpool.get_bot()
+    return bot.get_service("shout").shout(message.get_text())
+
+def whoami(message):
+    return message.get_alias()
+
+class TestProcessPool(util.base_test.BaseTest):
+    def test_runs_in_other_process(self):
+        self.get_bot().add_command_listener('pid', pid, direct_reply=True, process=True)
+
+        answer = self.eval("!pid")
+        self.assertTrue(answer.isdigit())
+        self.assertNotEqual(answer, str(os.getpid()))
+
+    def test_service_call(self):
+        service = Service("Shouts.")
+        service.add_function("shout", lambda text: text.upper(), "Returns the text in upper case.")
+        self.get_bot().offer_service("shout", service)
+        self.get_bot().add_command_listener('shout', shout, strip_preamble=True, direct_reply=True, process=True)
+
+        self.assertEqual(self.eval("!shout hello"), "HELLO")
+
+class TestProcessAlias(util.base_test.BaseTest):
+    def setUp(self):
+        self._config['global']['use_aliases'] = "True"
+        super().setUp()
+
+    def test_alias_is_resolved_by_the_bot(self):
+        self.get_bot().add_command_listener('whoami', whoami, direct_reply=True, process=True)
+        self.assertEqual(self.eval("!whoami", sender="tester"), self.get_bot().resolve_alias("tester"))
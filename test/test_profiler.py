@@ -0,0 +1,60 @@
+import sys
+import queue
+import unittest
+
+sys.path.append("..")
+
+from libs.profiler import Profiler
+
+import util.base_test
+
+def work(n):
+    return sum(range(n))
+
+class TestProfiler(unittest.TestCase):
+    def test_calls(self):
+        reports = []
+        profiler = Profiler()
+        self.assertFalse(profiler.active())
+
+        profiler.start("work", lambda target: target is work, calls=2, on_done=reports.append)
+        self.assertIs(profiler.wrap(print, print), print)
+
+        profiled = profiler.wrap(work, work)
+        self.assertEqual(profiled(n=10), 45)
+        profiled(n=10)
+
+        self.assertFalse(profiler.active())
+        self.assertEqual(len(reports), 1)
+        self.assertIn("2 calls", reports[0])
+        self.assertIn("work", reports[0])
+
+    def test_stop(self):
+        profiler = Profiler()
+        session = profiler.start("nothing", lambda target: False)
+        self.assertRaises(RuntimeError, profiler.start, "other", lambda target: False)
+
+        self.assertIn("no handler was called", profiler.stop(session))
+        self.assertEqual(profiler.stop(session), None)
+
+class TestProfileCommand(util.base_test.BaseTest):
+    def test_profile(self):
+        reports = queue.Queue()
+        self.get_bot()._start_profiling("echo", 2, "messages", reports.put)
+
+        self.assertEqual(self.eval("!echo a"), "a")
+        self.assertEqual(self.eval("!echo b"), "b")
+
+        report = reports.get(timeout=5)
+        self.assertIn('Profiled "echo", 2 calls', report)
+        self.assertIn("parse", report)
+
+    def test_admins_only(self):
+        self.assertEqual(self.eval("!profile echo", sender="someone"), "Only admins may profile.")
+        self.assertIn("Usage", self.eval("!profile echo x"))
+        self.assertIn("Usage", self.eval("!profile echo nan"))
+        self.assertIn("Usage", self.eval("!profile echo -1"))
+        self.assertIn('Profiling "echo" for 1 seconds', self.eval("!profile echo 1"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from libs.ratelimit import RateLimiter
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst(self):
+        limiter = RateLimiter(1.0, 3)
+        for _ in range(3):
+            self.assertEqual(limiter.wait_time("#a", 0.0), 0)
+            limiter.consume("#a", 0.0)
+
+        self.assertAlmostEqual(limiter.wait_time("#a", 0.0), 1.0)
+        self.assertEqual(limiter.wait_time("#a", 1.0), 0)
+
+    def test_keys_are_independent(self):
+        limiter = RateLimiter(1.0, 1)
+        limiter.consume("#a", 0.0)
+
+        self.assertGreater(limiter.wait_time("#a", 0.0), 0)
+        self.assertEqual(limiter.wait_time("#b", 0.0), 0)
+
+    def test_unlimited(self):
+        limiter = RateLimiter(0, 1)
+        for _ in range(100):
+            limiter.consume("#a", 0.0)
+        self.assertEqual(limiter.wait_time("#a", 0.0), 0)
@@ -0,0 +1,63 @@
+import threading
+
+import util.base_test
+
+from libs.jantemessage import JanteMessage
+
+class TestReload(util.base_test.BaseTest):
+    def test_reload(self):
+        bot = self.get_bot()
+        self.assertEqual(self.eval("!echo test"), "test")
+
+        self.assertEqual(bot.reload_plugin("echo"), 'Reloaded "echo".')
+
+        self.assertEqual(self.eval("!echo test"), "test")
+        self.assertEqual(len(bot._events._routes['on_message']['echo']), 1)
+        self.assertIn("echo", bot.get_commands())
+
+    def test_handoff(self):
+        bot = self.get_bot()
+        self.send_message("hello world")
+
+        bot.reload_plugin("cswap")
+
+        cswap = [p for p in bot._plugins if type(p).__name__ == "CSwapPlugin"]
+        self.assertEqual(len(cswap), 1)
+        self.assertEqual(cswap[0].last, "hello world")
+
+    def test_service(self):
+        bot = self.get_bot()
+        old = bot.get_service("paste")
+
+        bot.reload_plugin("paste")
+
+        self.assertIsNot(bot.get_service("paste"), old)
+
+    def test_waits_for_later_listeners(self):
+        bot = self.get_bot()
+        started = threading.Event()
+        release = threading.Event()
+
+        # A module level handler of the echo plugin, added after it was constructed
+        def on_message(message):
+            started.set()
+            release.wait(5)
+        on_message.__module__ = "plugins.echo.helpers"
+        bot.add_event_listener('on_message', on_message)
+
+        bot.fire_event('on_message', message=JanteMessage("hello", sender="a", address="a@local"))
+        self.assertTrue(started.wait(5))
+        self.assertEqual(bot.get_inflight().count_by_plugin().get("echo"), 1)
+
+        reload = threading.Thread(target=bot.reload_plugin, args=("echo",))
+        reload.start()
+        reload.join(0.2)
+        self.assertTrue(reload.is_alive())
+
+        release.set()
+        reload.join(5)
+        self.assertFalse(reload.is_alive())
+        self.assertNotIn(on_message, [cb.target for cb in bot._events._events['on_message']])
+
+    def test_unknown(self):
+        self.assertIn("There is no plugin", self.get_bot()._reload(["nonexistent"]))
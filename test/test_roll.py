@@ -1,6 +1,8 @@
 import util.base_test
 
 class TestEcho(util.base_test.BaseTest):
+    shared_bot = True
+
     def test_default(self):
         for i in range(10):
             self.assertTrue(1 <= int(self.eval("!roll")) <= 6)
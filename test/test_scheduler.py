@@ -0,0 +1,106 @@
+import sys
+import time
+import asyncio
+import datetime
+import threading
+import unittest
+
+sys.path.append("..")
+
+from libs.scheduler import Scheduler, CronSpec
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_call_later(self):
+        done = threading.Event()
+        self.scheduler.call_later(0.05, done.set)
+        self.assertTrue(done.wait(2))
+
+    def test_order(self):
+        order = []
+        done = threading.Event()
+        self.scheduler.call_later(0.2, lambda: (order.append(2), done.set()))
+        self.scheduler.call_later(0.1, lambda: order.append(1))
+        self.assertTrue(done.wait(2))
+        self.assertEqual(order, [1, 2])
+
+    def test_every(self):
+        runs = []
+        done = threading.Event()
+
+        def job():
+            runs.append(1)
+            if len(runs) == 3:
+                done.set()
+
+        self.scheduler.every(0.02, job)
+        self.assertTrue(done.wait(2))
+
+    def test_cancel(self):
+        ran = threading.Event()
+        job = self.scheduler.call_later(0.05, ran.set)
+        job.cancel()
+        self.assertFalse(ran.wait(0.2))
+        self.assertEqual(self.scheduler.pending(), [])
+
+    def test_failing_job(self):
+        done = threading.Event()
+        self.scheduler.call_later(0.01, lambda: 1 / 0)
+        self.scheduler.call_later(0.05, done.set)
+        self.assertTrue(done.wait(2))
+
+    def test_nan_delay(self):
+        self.assertRaises(ValueError, self.scheduler.call_later, float("nan"), print)
+        self.assertEqual(self.scheduler.pending(), [])
+
+class TestSchedulerAsync(unittest.TestCase):
+    def test_run_async(self):
+        scheduler = Scheduler()
+        order = []
+
+        async def main():
+            scheduler.attach_loop(asyncio.get_running_loop())
+            task = asyncio.get_running_loop().create_task(scheduler.run_async())
+            done = asyncio.Event()
+            # Added from another thread while the task waits for nothing
+            await asyncio.sleep(0.05)
+            threading.Thread(target=scheduler.call_later, args=(0.05, lambda: (order.append(2), done.set()))).start()
+            scheduler.call_later(0.01, lambda: order.append(1))
+            await asyncio.wait_for(done.wait(), 2)
+            scheduler.stop()
+            await asyncio.wait_for(task, 2)
+            scheduler.detach_loop()
+
+        asyncio.run(main())
+        self.assertEqual(order, [1, 2])
+
+class TestCronSpec(unittest.TestCase):
+    def next_after(self, spec, dt):
+        return datetime.datetime.fromtimestamp(CronSpec(spec).next_after(dt.timestamp()))
+
+    def test_step(self):
+        dt = datetime.datetime(2020, 1, 1, 10, 7, 30)
+        self.assertEqual(self.next_after("*/15 * * * *", dt), datetime.datetime(2020, 1, 1, 10, 15))
+
+    def test_weekday(self):
+        # 2020-01-01 is a wednesday, the next monday is the 6th
+        dt = datetime.datetime(2020, 1, 1, 10, 0)
+        self.assertEqual(self.next_after("0 9 * * 1", dt), datetime.datetime(2020, 1, 6, 9, 0))
+
+    def test_month(self):
+        dt = datetime.datetime(2020, 3, 15, 12, 0)
+        self.assertEqual(self.next_after("30 8 1 6 *", dt), datetime.datetime(2020, 6, 1, 8, 30))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, CronSpec, "* * *")
+        self.assertRaises(ValueError, CronSpec, "61 * * * *")
+        self.assertRaises(ValueError, CronSpec("0 0 31 2 *").next_after, time.time())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import sys
+import time
+import unittest
+import threading
+import configparser
+
+sys.path.append("..")
+
+from libs.clock import SimulatedClock
+from libs.jantesender import JanteSender
+from libs.outboundqueue import OutboundQueue
+from libs.jantemessage import JanteMessage
+from libs.janteio.iomanager import IOManager
+
+from util.evaluator import Evaluator
+
+def message(text, address, send_to_all=False):
+    return JanteMessage(text, sender="Jante", address=address, send_to_all=send_to_all)
+
+class TestSender(unittest.TestCase):
+    """
+    Drives a sender of its own step by step on a simulated clock. The bot is only used for its events.
+    """
+    @classmethod
+    def setUpClass(cls):
+        config = configparser.ConfigParser()
+        config.read('test-settings.ini')
+        cls.evaluator = Evaluator(config)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.evaluator.shutdown()
+
+    def sender(self, **limits):
+        self._clock = SimulatedClock()
+        bot = self.evaluator.get_bot()
+        self._io = IOManager(None, bot)
+        return JanteSender(bot, self._io, OutboundQueue(clock=self._clock), clock=self._clock, **limits)
+
+    def run_sender(self, sender, seconds=0):
+        """
+        Advances the clock and sends until nothing more may be sent.
+        """
+        self._clock.advance(seconds)
+        while True:
+            before = sender.qsize()
+            sender._step(0)
+            if sender.qsize() == before:
+                return self.sent()
+
+    def sent(self):
+        return [m.get_text() for m in self._io.get_io().get_sent()]
+
+    def test_default_backend(self):
+        sender = self.sender(address_rate=1, address_burst=1, protocol_rate=0)
+        unnamed = message("a0", "#a")
+        sender.put(unnamed)
+        named = message("a1", "#a")
+        named.set_backend(self._io.get_type())
+        sender.put(named)
+        self.assertEqual(unnamed.get_destination(), named.get_destination())
+
+        # Both go to the same chat, so they share its rate limit and keep their order
+        self.assertEqual(self.run_sender(sender), ["a0"])
+        self.assertEqual(self.run_sender(sender, 1), ["a0", "a1"])
+
+    def test_deferred_in_order(self):
+        sender = self.sender(address_rate=1, address_burst=1, protocol_rate=0)
+        for text in ["a0", "a1", "a2"]:
+            sender.put(message(text, "#a"))
+        sender.put(message("b0", "#b"))
+
+        self.assertEqual(self.run_sender(sender), ["a0", "b0"])
+        self.assertEqual(sender.qsize(), 2)
+        self.assertEqual(self.run_sender(sender, 1), ["a0", "b0", "a1"])
+        self.assertEqual(self.run_sender(sender, 1), ["a0", "b0", "a1", "a2"])
+        self.assertEqual(sender.qsize(), 0)
+
+    def test_waiting_messages_first(self):
+        sender = self.sender(address_rate=0, protocol_rate=1, protocol_burst=1)
+        sender.put(message("first", "#a"))
+        sender.put(message("waiting", "#b"))
+        self.assertEqual(self.run_sender(sender), ["first"])
+
+        self._clock.advance(1)
+        sender.put(message("new", "#c"))
+        self.assertEqual(self.run_sender(sender), ["first", "waiting"])
+        self.assertEqual(self.run_sender(sender, 1), ["first", "waiting", "new"])
+
+    def test_lanes_decide_who_gets_tokens(self):
+        sender = self.sender(address_rate=0, protocol_rate=1, protocol_burst=1)
+        for i in range(30):
+            sender.put(message("bulk {}".format(i), "#everyone", send_to_all=True))
+        self.assertEqual(self.run_sender(sender), ["bulk 0"])
+
+        sender.put(message("reply", "#user"))
+        self.assertEqual(self.run_sender(sender, 1), ["bulk 0", "reply"])
+        self.assertEqual(sender.qsize(), 29)
+
+    def test_internal_not_limited(self):
+        sender = self.sender(address_rate=1, address_burst=1, protocol_rate=1, protocol_burst=1)
+        sender.put(message("external", "#a"))
+        for i in range(3):
+            sender.put(message("internal", ("testing", i)))
+
+        # Internal messages are not handed to the IO, but they are not held up either
+        self.run_sender(sender)
+        self.assertEqual(sender.qsize(), 0)
+
+    def test_waits_on_the_clock(self):
+        sender = self.sender(address_rate=0.01, address_burst=1, protocol_rate=0)
+        sender.put(message("a0", "#a"))
+        sender.put(message("a1", "#a"))
+        self.assertEqual(self.run_sender(sender), ["a0"])
+
+        # The wait for the rate limit is 100 simulated seconds, not real ones
+        step = threading.Thread(target=sender._step, args=(1000,))
+        start = time.monotonic()
+        step.start()
+        time.sleep(0.05)
+        self._clock.advance(100)
+        step.join(5)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(self.sent(), ["a0", "a1"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import sys
+import time
+import unittest
+
+sys.path.append("..")
+
+from libs.tracing import Tracer
+from libs.jantemessage import JanteMessage
+
+import util.base_test
+
+class TestTracer(unittest.TestCase):
+    def test_spans(self):
+        tracer = Tracer()
+        trace = tracer.start("!echo hi", start=10.0)
+        tracer.record(trace, 'b', 10.5, 11.0)
+        tracer.record(trace, 'a', 10.0, 10.2)
+
+        t = tracer.get(trace)
+        self.assertEqual(t.duration(), 1.0)
+        self.assertEqual([s['name'] for s in t.to_dict()['spans']], ['a', 'b'])
+        self.assertIn('!echo hi', str(t))
+
+    def test_ring_buffer(self):
+        tracer = Tracer(size=2)
+        ids = [tracer.start(str(i)) for i in range(3)]
+
+        self.assertEqual(tracer.get(ids[0]), None)
+        tracer.record(ids[0], 'dropped', 0.0)
+        self.assertEqual(len(tracer.slowest(10)), 2)
+
+    def test_disabled(self):
+        tracer = Tracer(size=0)
+        self.assertEqual(tracer.start("x"), None)
+        with tracer.span(None, 'nothing'):
+            pass
+
+    def test_message(self):
+        m = JanteMessage("hi", sender="a", address="#c")
+        m.set_trace(7)
+        self.assertEqual(m.respond("ho", "Jante").get_trace(), 7)
+        self.assertEqual(m.clone().get_trace(), 7)
+
+class TestBotTracing(util.base_test.BaseTest):
+    def test_inbound(self):
+        bot = self.get_bot()
+        self.inject(JanteMessage("!echo traced", sender="tester", address="#tracing"))
+
+        names = []
+        deadline = time.monotonic() + 5
+        while not 'send' in names and time.monotonic() < deadline:
+            time.sleep(0.01)
+            traces = bot.get_tracer().slowest(1)
+            names = [s['name'] for s in traces[0].to_dict()['spans']] if len(traces) > 0 else []
+
+        for name in ['admission_queue', 'configure_alias', 'fire_event on_message', 'add_message', 'send']:
+            self.assertIn(name, names)
+        self.assertTrue(any(name.startswith('handler') for name in names))
+
+        self.assertIn("echo traced", self.eval("!trace"))
+
+if __name__ == '__main__':
+    unittest.main()
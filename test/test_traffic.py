@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import configparser
+
+sys.path.append("..")
+
+from libs.traffic import TrafficRecorder, read_traffic
+from libs.jantemessage import JanteMessage
+
+from util.evaluator import Evaluator
+
+class TestTrafficRecorder(unittest.TestCase):
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(prefix="jante-traffic-")
+
+    def tearDown(self):
+        shutil.rmtree(self._folder, ignore_errors=True)
+
+    def round_trip(self, name):
+        filename = os.path.join(self._folder, name)
+        recorder = TrafficRecorder(filename)
+        recorder.record(JanteMessage("!echo hej", sender="a", address="#c", is_in_group=True))
+        recorder.record(JanteMessage("internal", sender="a", address=("testing", 1)))
+        recorder.record(JanteMessage("hallå", sender="b", address="b@local"))
+        recorder.close()
+
+        messages = list(read_traffic(filename))
+        self.assertEqual([m.get_text() for _, m in messages], ["!echo hej", "hallå"])
+        self.assertTrue(messages[0][1].is_in_group())
+        self.assertEqual(messages[1][1].get_address(), "b@local")
+        self.assertLessEqual(messages[0][0], messages[1][0])
+
+    def test_plain(self):
+        self.round_trip("traffic.log")
+
+    def test_gzip(self):
+        self.round_trip("traffic.log.gz")
+
+    def test_sessions(self):
+        filename = os.path.join(self._folder, "traffic.log")
+        for text in ("first", "second"):
+            recorder = TrafficRecorder(filename)
+            time.sleep(0.01)
+            recorder.record(JanteMessage(text, sender="a", address="#c"))
+            recorder.close()
+
+        offsets = [offset for offset, _ in read_traffic(filename)]
+        self.assertEqual(len(offsets), 2)
+        # The second session continues after the first instead of starting over at 0
+        self.assertGreater(offsets[1], offsets[0])
+
+class TestBotRecording(unittest.TestCase):
+    def test_inbound(self):
+        folder = tempfile.mkdtemp(prefix="jante-traffic-")
+        filename = os.path.join(folder, "traffic.log")
+
+        config = configparser.ConfigParser()
+        config.read('test-settings.ini')
+        config.set('recording', 'file', filename)
+
+        evaluator = Evaluator(config)
+        try:
+            evaluator.inject(JanteMessage("!echo recorded", sender="tester", address="#recording"))
+            # Messages sent straight to the handlers are not read from the IO and are not recorded
+            self.assertEqual(evaluator.eval("!echo not recorded"), "not recorded")
+
+            deadline = time.monotonic() + 5
+            while os.path.getsize(filename) == 0 and time.monotonic() < deadline:
+                evaluator.get_bot()._recorder.flush()
+                time.sleep(0.01)
+        finally:
+            evaluator.shutdown()
+
+        try:
+            texts = [m.get_text() for _, m in read_traffic(filename)]
+            self.assertEqual(texts, ["!echo recorded"])
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
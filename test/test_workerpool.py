@@ -0,0 +1,88 @@
+import sys
+import queue
+import threading
+import unittest
+import concurrent.futures
+
+sys.path.append("..")
+
+from libs.workerpool import WorkerPool
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self._pool = None
+
+    def tearDown(self):
+        if self._pool != None:
+            self._pool.shutdown()
+
+    def test_result(self):
+        self._pool = WorkerPool(workers=2)
+        future = self._pool.submit("event", lambda a, b: a + b, {'a': 1, 'b': 2})
+        self.assertEqual(future.result(timeout=5), 3)
+
+    def test_handed_off(self):
+        self._pool = WorkerPool(workers=1)
+        handed_off = concurrent.futures.Future()
+        future = self._pool.submit("event", lambda: handed_off)
+
+        # The only worker is free while the handed off work runs
+        self.assertEqual(self._pool.submit("event", lambda: 1).result(timeout=5), 1)
+        self.assertFalse(future.done())
+        handed_off.set_result(2)
+        self.assertEqual(future.result(timeout=5), 2)
+
+    def test_cap_per_key(self):
+        self._pool = WorkerPool(workers=4, max_per_key=1)
+        mutex = threading.Lock()
+        state = {'running': 0, 'most': 0}
+
+        def job():
+            with mutex:
+                state['running'] += 1
+                state['most'] = max(state['most'], state['running'])
+            threading.Event().wait(0.01)
+            with mutex:
+                state['running'] -= 1
+
+        futures = [self._pool.submit("event", job) for _ in range(8)]
+        for f in futures:
+            f.result(timeout=5)
+
+        self.assertEqual(state['most'], 1)
+
+    def test_deferred_jobs_hold_slots(self):
+        self._pool = WorkerPool(workers=4, queue_size=2, max_per_key=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def job():
+            started.set()
+            release.wait(5)
+
+        first = self._pool.submit("event", job)
+        started.wait(5)
+        deferred = [self._pool.submit("event", job) for _ in range(2)]
+
+        with self.assertRaises(queue.Full):
+            self._pool.submit("event", job, block=False)
+        release.set()
+        for f in [first] + deferred:
+            f.result(timeout=5)
+
+    def test_bounded_queue(self):
+        self._pool = WorkerPool(workers=1, queue_size=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def job():
+            started.set()
+            release.wait(5)
+
+        self._pool.submit("event", job)
+        started.wait(5)
+        self._pool.submit("event", job)
+
+        with self.assertRaises(queue.Full):
+            self._pool.submit("event", job, block=False)
+        release.set()
@@ -1,30 +1,58 @@
 """
 @Author Felix Hedenström
+
+Every test gets a bot of its own, with a data folder of its own. Test classes whose tests do not
+change any state (e.g only ask !echo) can set shared_bot = True to use one bot for the whole class.
 """
 
-from .evaluator import Evaluator 
+from .evaluator import Evaluator
 import unittest
-import subprocess
 import configparser
+
+def _read_config():
+    config = configparser.ConfigParser()
+    config.read('test-settings.ini')
+    return config
+
 class BaseTest(unittest.TestCase):
+    # One bot for all tests of the class, instead of one per test
+    shared_bot = False
+
+    @classmethod
+    def setUpClass(cls):
+        cls._shared_evaluator = Evaluator(_read_config()) if cls.shared_bot else None
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._shared_evaluator != None:
+            cls._shared_evaluator.shutdown()
+            cls._shared_evaluator = None
+
     def setUp(self):
-        subprocess.check_call(['mkdir -p {}'.format(self._config.get('global', 'datapath'))], shell=True)
-        self.__evaluator = Evaluator(self._config)
+        if self._shared_evaluator != None:
+            self.__evaluator = self._shared_evaluator
+        else:
+            self.__evaluator = Evaluator(self._config)
+
     def __init__(self, tests=()):
         super().__init__(tests)
-        self._config = configparser.ConfigParser() 
-        self._config.read('test-settings.ini')
+        self._config = _read_config()
 
-    
     def eval(self, text, sender=None):
         return self.__evaluator.eval(text, sender=sender)
-    
+
     def tearDown(self):
-        self.__evaluator.shutdown()
-        subprocess.check_call(['rm -rf {}'.format(self._config.get('global', 'datapath'))], shell=True)
-    
+        if self.__evaluator is not self._shared_evaluator:
+            self.__evaluator.shutdown()
+
     def send_message(self, m):
         self.__evaluator.send_message(m)
 
+    def inject(self, m):
+        """
+        Hands a message to the bot as if it was read from a chat, see Evaluator.inject.
+        """
+        self.__evaluator.inject(m)
+
     def get_bot(self):
         return self.__evaluator.get_bot()
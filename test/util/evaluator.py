@@ -1,12 +1,16 @@
 """
 @Author Felix Hedenström
 Creates a wrapper around the bot class that allows the user to test commands by talking directly to the bot.
+
+Replies are waited for on a condition variable, nothing is polled. Every evaluator gets a data folder
+of its own, so evaluators (and the tests using them) can run at the same time.
 """
 
 import sys
-from datetime import datetime, timedelta
-import time
+import shutil
+import tempfile
 import threading
+import concurrent.futures
 
 sys.path.append("..")
 
@@ -18,89 +22,106 @@ class Evaluator:
     class EvaluatorInstance:
         def __init__(self, bot, id_, timeout=None):
             self._bot = bot
-            self._message_mutex = threading.Lock()
+            self._condition = threading.Condition()
             self._id = id_
             self._timeout = timeout
 
             def message_filter(message):
-                return message.get_address() == self._id 
-          
-            self._message_filter = message_filter 
+                return message.get_address() == self._id
+
+            self._message_filter = message_filter
             self._bot.add_event_listener('on_message_sent', self.listener, prefilter=self._message_filter)
             self._messages = []
-       
+
 
         def listener(self, message):
-            with self._message_mutex:
+            with self._condition:
                 self._messages.append(message)
+                self._condition.notify_all()
 
         def has_incoming_message(self):
-            with self._message_mutex:
-                return not len(self._messages) == 0 
-        
+            with self._condition:
+                return not len(self._messages) == 0
+
         def evaluate_text(self, text, sender=None):
-            return self.evaluate(self._generate_message(text, sender=sender)) 
+            return self.evaluate(self._generate_message(text, sender=sender))
 
         def evaluate(self, m):
-            
-            # TODO use a bot function for this, probably making use of _io.recieve() 
-            
-            self._bot.fire_event('on_message', message=m)
-
-            timeout = datetime.now() + timedelta(seconds=self._timeout)
-            
-            while(not self.has_incoming_message() and datetime.now() < timeout):
-                time.sleep(0.01)
-           
-
-            if not datetime.now() < timeout:
-                return RuntimeError("Ran out of time on command {}.".format(m.get_text()))
-         
-            with self._message_mutex:
+            # TODO use a bot function for this, probably making use of _io.recieve()
+            self._bot.fire_event('on_message', message=self._bot.configure_alias(m))
+
+            with self._condition:
+                if not self._condition.wait_for(lambda: len(self._messages) > 0, self._timeout):
+                    return RuntimeError("Ran out of time on command {}.".format(m.get_text()))
+
                 inc_message = self._messages.pop()
                 self._messages = []
-            
+
             return inc_message
-        
+
         def _generate_message(self, text, sender=None):
             if sender == None:
                 sender = "testbot"
             return JanteMessage(text, sender=sender, address=self._id)
-        
-        def __del__(self):
+
+        def close(self):
             self._bot.remove_event_listener('on_message_sent', self.listener, prefilter=self._message_filter)
 
 
-    def __init__(self, config):
-         
-        
+    def __init__(self, config, clock=None, iotype=None):
+        """
+        The datapath of config is set to a new folder. The bot uses config itself, not a copy,
+        so tests can change settings while it runs. clock is handed to the bot, see libs/clock.py.
+        iotype is handed to the IOManager, the TestingIO by default.
+        """
         self._id = 0
-        self._bot = bot.Bot(None,config, testing=True)
-         
+        self._id_mutex = threading.Lock()
+
+        self._datapath = tempfile.mkdtemp(prefix="jante-test-")
+        config.set('global', 'datapath', self._datapath + "/")
+
+        self._bot = bot.Bot(iotype, config, testing=True, clock=clock)
+
         threading.Thread(target=self._bot.start).start()
-   
+
     def eval(self, text, timeout=5, return_message=False, sender=None):
-        ei = Evaluator.EvaluatorInstance(self._bot, self.generate_id(), timeout=timeout)  
-        m = ei.evaluate_text(text, sender=sender)
-        del ei
+        ei = Evaluator.EvaluatorInstance(self._bot, self.generate_id(), timeout=timeout)
+        try:
+            m = ei.evaluate_text(text, sender=sender)
+        finally:
+            ei.close()
 
         if return_message or type(m) != JanteMessage:
             return m
         else:
             return m.get_text()
-    
+
     def shutdown(self):
         self._bot._shutdown()
-    
+        shutil.rmtree(self._datapath, ignore_errors=True)
+
     def send_message(self, m):
         if not type(m) == JanteMessage:
             # The address does not matter, but needs to be present in case the plugins feel like responding
             m = JanteMessage(m, sender="testingbot", address="testingbot@local")
 
-        self._bot.fire_event('on_message', message=m)
+        # Wait for the handlers so messages sent after this one are handled after it
+        concurrent.futures.wait(self._bot.fire_event('on_message', message=m))
+
+    def inject(self, m, backend=None):
+        """
+        Hands a message to the bot through the TestingIO, so it takes the same way as a message read from a chat.
+        backend is the name of the IO when there are several.
+        """
+        self._bot._io.get_io(backend).inject(m)
+
     def generate_id(self):
-        self._id += 1
-        return ("testing", self._id)
+        with self._id_mutex:
+            self._id += 1
+            return ("testing", self._id)
+
+    def get_datapath(self):
+        return self._datapath
 
     def get_bot(self):
         return self._bot